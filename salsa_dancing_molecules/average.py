@@ -3,14 +3,15 @@
 import numpy as np
 
 
-def average(t0, array):
+def average(t0, array, variance=False):
     """Calculate time average of array.
 
     Example: average(2, [0,1,2,3,4,5]) -> [2, 2.5, 3, 3.5]
 
     Input:
-        t0: int      - timstep when steady state starts
-        array: array - array to output time average for
+        t0: int         - timstep when steady state starts
+        array: array    - array to output time average for
+        variance: bool  - also return the evolution of the variance
 
     Output:
         array        - array of evolution of the mean over time.
@@ -18,10 +19,24 @@ def average(t0, array):
                        is the average over the interval [t0,n].
                        Value of the last element corresponds to the
                        time average over interval [t0, len(array)].
+        array        - only if variance is True, array of evolution of the
+                       variance over the same intervals.
+
+    The running mean is computed from a cumulative sum of the values
+    relative to the first one, which keeps it accurate for large offsets.
+    The variance uses the Welford update, with the running means computed
+    in advance.
     """
-    array = array[t0::]
-    average = []
-    for n in array:
-        n_average = (np.sum(array[0:(len(average))]) + n) / (len(average) + 1)
-        average.append(n_average)
-    return average
+    array = np.asarray(array, dtype=float)[t0::]
+    if len(array) == 0:
+        return (array, array.copy()) if variance else array
+    counts = np.arange(1, len(array) + 1)
+    shift = array[0]
+    mean = shift + np.cumsum(array - shift) / counts
+    if not variance:
+        return mean
+
+    # Welford: M2_n = M2_(n-1) + (x_n - mean_(n-1)) * (x_n - mean_n).
+    previous_mean = np.concatenate(([shift], mean[:-1]))
+    m2 = np.cumsum((array - previous_mean) * (array - mean))
+    return mean, m2 / counts
@@ -10,15 +10,51 @@ from ase.units import kJ
 from ase.eos import EquationOfState
 import numpy as np
 import os
-from .equilibrium import get_equilibrium
+from .equilibrium import get_trajectory_equilibrium
+from .trajectory_data import (ROWS_PER_FRAME, load_trajectory_series,
+                              read_csv_series)
 
 try:
     from asap3 import Trajectory
 except ImportError:
     print("asap3 import failed. This should only happen when building docs.")
 
+# Number of volumes needed to fit the equation of state.
+MIN_EOS_POINTS = 4
 
-def get_bulk_properties(traj_list, ensemble):
+
+def get_average_energy_and_volume(traj_file, ensemble, csv_file=None,
+                                  rows_per_frame=ROWS_PER_FRAME,
+                                  first_row=0):
+    """Get the average potential energy and volume after equilibrium.
+
+    Only the energies, volumes and temperatures of the trajectory are read,
+    see load_trajectory_series. If the CSV file of the simulation is given,
+    its denser series and equilibrium are used, like in the post
+    simulation calculations.
+
+    args:
+        traj_file: str      - path to the trajectory file
+        ensemble: str       - the ensemble for the system, ei 'NVT' or 'NVE'
+        csv_file: str       - path to the CSV file, or None
+        rows_per_frame: int - sampling of the CSV file, see read_csv_series
+        first_row: int      - sampling of the CSV file, see read_csv_series
+
+    returns:
+        avg_energy: float - average potential energy (eV)
+        avg_volume: float - average volume (Å^3)
+    """
+    configs = load_trajectory_series(traj_file)
+    if csv_file is not None:
+        configs = read_csv_series(csv_file, configs, rows_per_frame,
+                                  first_row)
+    t0, _ = get_trajectory_equilibrium(traj_file, ensemble, configs,
+                                       csv_file)
+    return (np.mean(configs.potential_energy[t0:]),
+            np.mean(configs.volume[t0:]))
+
+
+def get_bulk_properties(traj_list, ensemble, averages=None):
     """Get bulk properties.
 
     Calculate lattice constant, bulk modulus and get the trajectory file with
@@ -27,32 +63,32 @@ def get_bulk_properties(traj_list, ensemble):
     args:
         traj_list:list    - list of traj files
         ensemble:str      - the ensemble for the system, ei 'NVT' or 'NVE'
+        averages:list     - average potential energy and volume of each
+                            traj file, e.g. calculated in parallel with
+                            get_average_energy_and_volume. Calculated here
+                            if not given.
 
     returns:
         result_dict: dict - dictionary containing lattice constant, bulk
                             modulus, trajectory file name and error message
 
     """
-    avg_energies = []
-    avg_volumes = []
     # for each trajectory file, calculate average potential energy and volume
     # after the equilibrium time and save these to lists.
-    if len(traj_list) > 3:
-        for traj_file in traj_list:
-            configs = Trajectory(traj_file)
-            t0, _ = get_equilibrium(configs, ensemble)
-            pot_energies = [atom.get_potential_energy() for atom in configs]
-            avg_energies.append(sum(pot_energies[t0:]) /
-                                len(pot_energies[t0:]))
-            volumes = [atom.get_volume() for atom in configs]
-            avg_volumes.append(sum(volumes[t0:]) / len(volumes[t0:]))
+    if len(traj_list) >= MIN_EOS_POINTS:
+        if averages is None:
+            averages = [get_average_energy_and_volume(traj_file, ensemble)
+                        for traj_file in traj_list]
+        avg_energies = [energy for energy, _ in averages]
+        avg_volumes = [volume for _, volume in averages]
 
         a, b, optimal_traj, error_message = calculate_bulk_properties(
                                                 traj_list,
                                                 avg_energies,
                                                 avg_volumes)
     else:
-        error_message = 'Amount of trajectory files must be 4 or more.'
+        error_message = (f'Amount of trajectory files must be '
+                         f'{MIN_EOS_POINTS} or more.')
         a, b, optimal_traj = float('Nan'), float('Nan'), None
 
     result_dict = {}
@@ -6,6 +6,9 @@ from ase.io.trajectory import Trajectory
 from .ensemble_energies import (get_mean_square_of_kin,
                                 get_square_of_mean_kin)
 from .average import average
+from .trajectory_data import (get_kinetic_energies, get_masses,
+                              get_number_of_atoms, get_temperatures)
+from .uncertainty import function_standard_error
 
 
 def get_NVE_heat_capacity(traj, t0):
@@ -27,20 +30,64 @@ def calculate_NVE_heat_capacity(config, t0):
 
     Imput:
         config: ase.io.trajectory.Trajectory -traj-file containing atom objects
+                or TrajectorySeries
         t0: int                              -timestep when equilibrium starts
 
     Output:
         int - time average heat capacity, time average over equalibrium
     """
-    a = config[-1]
-    N = len(a)
-    mass = sum(a.get_masses())*units._amu  # change mass from u to kg
-    temperatures = [atom.get_temperature() for atom in config]
+    N = get_number_of_atoms(config, -1)
+    mass = sum(get_masses(config, -1))*units._amu  # change mass from u to kg
+    temperatures = get_temperatures(config)
     # equilibrium time average
     T = average(t0, temperatures)[-1]
     square_of_mean = get_square_of_mean_kin(config, t0)[-1]
     mean_square = get_mean_square_of_kin(config, t0)[-1]
 
+    return NVE_heat_capacity_from_averages(N, mass, T, square_of_mean,
+                                           mean_square)
+
+
+def calculate_NVE_heat_capacity_error(config, t0):
+    """Calculate the standard error of the Heat Capacity for NVE ensemble.
+
+    Input:
+        config: ase.io.trajectory.Trajectory -traj-file containing atom objects
+                or TrajectorySeries
+        t0: int                              -timestep when equilibrium starts
+
+    Output:
+        float - standard error of the heat capacity, see
+                uncertainty.function_standard_error
+    """
+    N = get_number_of_atoms(config, -1)
+    mass = sum(get_masses(config, -1))*units._amu  # change mass from u to kg
+    temperatures = np.asarray(get_temperatures(config), dtype=float)[t0:]
+    kinetic = np.asarray(get_kinetic_energies(config), dtype=float)[t0:]
+
+    def heat_capacity(T, kin, square_kin):
+        return NVE_heat_capacity_from_averages(N, mass, T, kin**2,
+                                               square_kin)
+
+    return function_standard_error(heat_capacity, temperatures, kinetic,
+                                   kinetic**2)
+
+
+def NVE_heat_capacity_from_averages(N, mass, T, square_of_mean, mean_square):
+    """Calculate Heat Capacity for NVE ensemble from time averages.
+
+    Input:
+        N: int                 - number of atoms
+        mass: float            - total mass (kg)
+        T: float or array      - time average of the temperature
+        square_of_mean: float or array - square of the time average of the
+                                         kinetic energy
+        mean_square: float or array    - time average of the square of the
+                                         kinetic energy
+
+    Output:
+        float or array - heat capacity
+    """
     variance = mean_square - square_of_mean
     conversion = units._e * 1.5 * units.kB * N / mass
 
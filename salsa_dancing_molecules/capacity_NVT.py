@@ -6,6 +6,9 @@ from ase.io.trajectory import Trajectory
 from .ensemble_energies import (get_square_of_mean_tote,
                                 get_mean_square_of_tote)
 from .average import average
+from .trajectory_data import (get_masses, get_temperatures,
+                              get_total_energies)
+from .uncertainty import function_standard_error
 
 
 def get_NVT_heat_capacity(traj, t0):
@@ -27,19 +30,60 @@ def calculate_NVT_heat_capacity(config, t0):
 
     Input:
         traj: ase.io.trajectory.Trajectory  - traj file containing atom objects
+                                              or TrajectorySeries
         t0: int                             - timestep when equilibrium starts
 
     Output:
         int - time average heat capacity, time average over equalibrium
     """
-    a = config[-1]
-    mass = sum(a.get_masses())*units._amu  # change mass from u to kg
-    temperatures = [atom.get_temperature() for atom in config]
+    mass = sum(get_masses(config, -1))*units._amu  # change mass from u to kg
+    temperatures = get_temperatures(config)
     # equilibrium time average
     T = average(t0, temperatures)[-1]
     square_of_mean = get_square_of_mean_tote(config, t0)[-1]
     mean_square = get_mean_square_of_tote(config, t0)[-1]
 
+    return NVT_heat_capacity_from_averages(mass, T, square_of_mean,
+                                           mean_square)
+
+
+def calculate_NVT_heat_capacity_error(config, t0):
+    """Calculate the standard error of the Heat Capacity for NVT ensemble.
+
+    Input:
+        traj: ase.io.trajectory.Trajectory  - traj file containing atom objects
+                                              or TrajectorySeries
+        t0: int                             - timestep when equilibrium starts
+
+    Output:
+        float - standard error of the heat capacity, see
+                uncertainty.function_standard_error
+    """
+    mass = sum(get_masses(config, -1))*units._amu  # change mass from u to kg
+    temperatures = np.asarray(get_temperatures(config), dtype=float)[t0:]
+    energies = np.asarray(get_total_energies(config), dtype=float)[t0:]
+
+    def heat_capacity(T, tote, square_tote):
+        return NVT_heat_capacity_from_averages(mass, T, tote**2, square_tote)
+
+    return function_standard_error(heat_capacity, temperatures, energies,
+                                   energies**2)
+
+
+def NVT_heat_capacity_from_averages(mass, T, square_of_mean, mean_square):
+    """Calculate Heat Capacity for NVT ensemble from time averages.
+
+    Input:
+        mass: float            - total mass (kg)
+        T: float or array      - time average of the temperature
+        square_of_mean: float or array - square of the time average of the
+                                         total energy
+        mean_square: float or array    - time average of the square of the
+                                         total energy
+
+    Output:
+        float or array - heat capacity
+    """
     conversion = units._e / mass
     variance = mean_square - square_of_mean
 
@@ -83,6 +83,38 @@ def main():
     worker_parser = command_parser.add_parser('worker',
                                               help='Arguments for workers.')
     worker_parser.add_argument('work_path', help='Path to working directory.')
+    worker_parser.add_argument('--requeue',
+                               help=('Move jobs left in started_simulations '
+                                     'by killed workers back to '
+                                     'unbegun_simulations and exit. They '
+                                     'resume from their last checkpoint '
+                                     'when run again. Only use this when no '
+                                     'workers are running.'),
+                               action='store_true')
+    worker_parser.add_argument('--status',
+                               help=('Print the number of jobs with each '
+                                     'status in the job database and exit.'),
+                               action='store_true')
+    worker_parser.add_argument('--lease-time',
+                               help=('Seconds a job in the job database '
+                                     'stays leased to a worker without a '
+                                     'heartbeat before it is reclaimed.'),
+                               default=600,
+                               type=float)
+    worker_parser.add_argument('--max-attempts',
+                               help=('Number of times a job in the job '
+                                     'database is attempted before it is '
+                                     'marked as failed.'),
+                               default=3,
+                               type=int)
+    worker_parser.add_argument('--analysis-workers',
+                               help=('Number of background processes that '
+                                     'run the post simulation calculations '
+                                     'at lower priority while the next '
+                                     'simulation runs. Default: 0, run '
+                                     'them before claiming the next job.'),
+                               default=0,
+                               type=int)
 
     startup_parser = command_parser.add_parser(
         'startup', help='Script for generating the necessary files to '
@@ -123,6 +155,13 @@ def main():
                                 help=("Set flag to run the job as exclusive"),
                                 action='store_true')
 
+    startup_parser.add_argument('--job-db',
+                                help=('Create a job database in the '
+                                      'workspace that the workers claim '
+                                      'jobs from, instead of racing for '
+                                      'files in unbegun_simulations.'),
+                                action='store_true')
+
     startup_parser.add_argument('config_path',
                                 help=('Path to simulation config'))
 
@@ -133,6 +172,19 @@ def main():
     post_parser.add_argument('post_work_path',
                              help=('Path to workspace directory'))
 
+    post_parser.add_argument('--jobs',
+                             help=('Number of processes running the post '
+                                   'simulation calculations. Default: '
+                                   'number of CPUs.'),
+                             default=None,
+                             type=int)
+
+    post_parser.add_argument('--rerun-all',
+                             help=('Analyse all simulations again instead '
+                                   'of taking the results of unchanged '
+                                   'simulations from the results index.'),
+                             action='store_true')
+
     volume_parser = command_parser.add_parser('volume_process',
                                               help=('Run post volume-' +
                                                     'simulation calculations'))
@@ -140,6 +192,13 @@ def main():
     volume_parser.add_argument('volume_work_path',
                                help=('Path to workspace directory'))
 
+    volume_parser.add_argument('--jobs',
+                               help=('Number of processes analysing the '
+                                     'trajectories. Default: number of '
+                                     'CPUs.'),
+                               default=None,
+                               type=int)
+
     optimade_parser = command_parser.add_parser('optimade',
                                                 help='Generate OPTIMADE json.')
     optimade_parser.add_argument('workspace',
@@ -168,7 +227,13 @@ def main():
 
     elif 'work_path' in args:
         from ..worker_process import worker_process
-        worker_process.start(args.work_path)
+        if args.requeue:
+            worker_process.requeue_started_simulations(args.work_path)
+        elif args.status:
+            worker_process.print_job_status(args.work_path)
+        else:
+            worker_process.start(args.work_path, args.lease_time,
+                                 args.max_attempts, args.analysis_workers)
 
     elif 'config_path' in args:
         from ..startup import startup_script
@@ -176,11 +241,12 @@ def main():
 
     elif 'post_work_path' in args:
         from ..post_process import post_process
-        post_process.run_post_calculations(args.post_work_path)
+        post_process.run_post_calculations(args.post_work_path, args.jobs,
+                                           args.rerun_all)
 
     elif 'volume_work_path' in args:
         from ..volume_process import volume_process
-        volume_process.start(args.volume_work_path)
+        volume_process.start(args.volume_work_path, args.jobs)
 
     elif 'result_csv' in args:
         from ..optimade import run as optimade_run
@@ -1,5 +1,8 @@
 """Calculate cohesive energy."""
 
+from .trajectory_data import get_number_of_atoms, get_potential_energies
+from .uncertainty import standard_error
+
 try:
     from asap3 import Trajectory
 except ImportError:
@@ -27,6 +30,7 @@ def calculate_cohesive_energy(configs, t0):
 
     Input:
         configs:ase.io.trajectory.Trajectory -traj file containing atom objects
+                or TrajectorySeries
         t0: int         - timestep when equilibrium starts
 
     Output:
@@ -36,6 +40,23 @@ def calculate_cohesive_energy(configs, t0):
     at equilibrium.
 
     """
-    pot_energies = [atom.get_potential_energy() for atom in configs]
+    pot_energies = get_potential_energies(configs)
     avg_pot_e = (sum(pot_energies[t0:]) / len(pot_energies[t0:]))
-    return -(avg_pot_e / configs[-1].get_global_number_of_atoms())
+    return -(avg_pot_e / get_number_of_atoms(configs, -1))
+
+
+def calculate_cohesive_energy_error(configs, t0):
+    """Calculate the standard error of the cohesive energy.
+
+    Input:
+        configs:ase.io.trajectory.Trajectory -traj file containing atom objects
+                or TrajectorySeries
+        t0: int         - timestep when equilibrium starts
+
+    Output:
+        standard error of the cohesive energy: float
+
+    """
+    pot_energies = get_potential_energies(configs)
+    return (standard_error(pot_energies[t0:]) /
+            get_number_of_atoms(configs, -1))
@@ -1,6 +1,8 @@
 """Module for calculating the Debye temperature time average."""
+import numpy as np
 from ase import units
 from ase.io import read
+from .trajectory_data import get_masses, get_number_of_atoms
 
 
 def get_debye_temperature(traj_file, temperature, specific_heat_capacity):
@@ -27,7 +29,8 @@ def calculate_debye(configs, temperature, specific_heat_capacity):
     Calculate the debye temperature.
 
     arguments:
-        configs: ase.io.trajectory.Trajectory - traj file containg atom-obj.
+        configs: ase.io.trajectory.Trajectory - traj file containg atom-obj,
+                 or TrajectoryData
         temperature:float             - Temperature average of the system
         specific_heat_capacity:float  - specifict heat capacity of the system
 
@@ -38,12 +41,38 @@ def calculate_debye(configs, temperature, specific_heat_capacity):
     This function assumes that the temperature is low. If temperature is high
     the results might not be accurate.
     """
-    a = configs[0]
-    N = len(a)  # Number of atoms
-    mass = sum(a.get_masses())*units._amu  # change mass from u to kg
+    N = get_number_of_atoms(configs)  # Number of atoms
+    mass = sum(get_masses(configs))*units._amu  # change mass from u to kg
     heat_capacity = specific_heat_capacity*mass
     debye_temperature = (temperature*((12*units.pi**4*N*units._k)/(5 *
                          heat_capacity))**(1/3))
     warning = 0.3 < temperature/debye_temperature
 
     return debye_temperature, warning
+
+
+def calculate_debye_error(debye_temperature, temperature, temperature_error,
+                          specific_heat_capacity,
+                          specific_heat_capacity_error):
+    """
+    Calculate the standard error of the debye temperature.
+
+    The debye temperature is proportional to the temperature and to the
+    heat capacity to the power of -1/3, and their relative errors are
+    propagated to first order as if they were independent.
+
+    arguments:
+        debye_temperature:float             - the debye temperature
+        temperature:float                   - Temperature average of the
+                                              system
+        temperature_error:float             - its standard error
+        specific_heat_capacity:float        - specifict heat capacity of the
+                                              system
+        specific_heat_capacity_error:float  - its standard error
+
+    return:
+        debye_temperature_error - float
+    """
+    return abs(debye_temperature) * np.hypot(
+        temperature_error / temperature,
+        specific_heat_capacity_error / (3 * specific_heat_capacity))
@@ -1,6 +1,7 @@
 """Calculate ensemble energy and ensemble square energy."""
 import numpy as np
 from .average import average
+from .trajectory_data import get_kinetic_energies, get_total_energies
 import ase
 
 
@@ -9,15 +10,14 @@ def get_mean_square_of_kin(config, t0):
 
     Input:
         traj: ase.io.trajectory.Trajectory  - traj file containing atom objects
+                                              or TrajectoryData
         t0: int                             - timestep when equilibrium starts
 
     Output:
         int - time average of mean square of the kinetic energy.
               time average over equalibrium.
     """
-    mean_square_of_kin = [
-        ((a.get_kinetic_energy())**2) for a in config
-        ]
+    mean_square_of_kin = np.square(get_kinetic_energies(config))
     return average(t0, mean_square_of_kin)
 
 
@@ -26,15 +26,14 @@ def get_square_of_mean_kin(config, t0):
 
     Input:
         traj: ase.io.trajectory.Trajectory  - traj file containing atom objects
+                                              or TrajectoryData
         t0: int                             - timestep when equilibrium starts
 
     Output:
         int - time average of the square of mean kinetic energy.
               time average over equalibrium.
     """
-    square_of_mean_kin = [
-        a.get_kinetic_energy() for a in config
-        ]
+    square_of_mean_kin = get_kinetic_energies(config)
     return np.power(average(t0, square_of_mean_kin), 2)
 
 
@@ -43,15 +42,14 @@ def get_square_of_mean_tote(config, t0):
 
     Input:
         traj: ase.io.trajectory.Trajectory  - traj file containing atom objects
+                                              or TrajectoryData
         t0: int                             - timestep when equilibrium starts
 
     Output:
         int - time average of the square of mean total energy.
               time average over equalibrium.
     """
-    square_of_mean_tote = [
-        (a.get_total_energy()) for a in config
-        ]
+    square_of_mean_tote = get_total_energies(config)
     return np.power(average(t0, square_of_mean_tote), 2)
 
 
@@ -60,13 +58,12 @@ def get_mean_square_of_tote(config, t0):
 
     Input:
         traj: ase.io.trajectory.Trajectory  - traj file containing atom objects
+                                              or TrajectoryData
         t0: int                             - timestep when equilibrium starts
 
     Output:
         int - time average of mean square of the total energy.
               time average over equalibrium.
     """
-    mean_square_of_tote = [
-        (a.get_total_energy()**2) for a in config
-        ]
+    mean_square_of_tote = np.square(get_total_energies(config))
     return average(t0, mean_square_of_tote)
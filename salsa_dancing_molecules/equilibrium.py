@@ -1,28 +1,49 @@
-"""Module for finding the "steady state" of a system."""
+"""Module for finding the "steady state" of a system.
+
+The equilibrium is the start of the series that maximizes the number of
+uncorrelated samples after it, as in pymbar.timeseries.detect_equilibration.
+pymbar evaluates every possible start, which takes O(n^2) time. The fast
+mode evaluates the starts on a coarse grid, computing each statistical
+inefficiency with an FFT, and then refines the grid around the best start.
+"""
 
 from pymbar.timeseries import detect_equilibration
 import numpy as np
+from .trajectory_data import (ROWS_PER_FRAME, get_temperatures,
+                              get_potential_energies, load_derived_series,
+                              load_trajectory_series, read_csv_series,
+                              save_derived_series)
+
+# Number of starts evaluated in each refinement of the fast mode.
+GRID_POINTS = 32
 
 
-def get_equilibrium(configs, ensemble='NVE'):
+def get_equilibrium(configs, ensemble='NVE', fast=True):
     """
     Find the eqiulibrium of a system.
 
     Input:
-        configs: ase.io.trajectory.Trajectory - traj file containg atom-obj.
+        configs: ase.io.trajectory.Trajectory - traj file containg atom-obj,
+                 or TrajectoryData
+        ensemble: str - 'NVE' uses the temperature, 'NVT' the potential
+                        energy
+        fast: bool    - use detect_equilibration_fft instead of pymbar
 
     Output:
         eqiulibrium: int   - timestep when equilibrium starts.
         warning: bool      - True if equilibrium is reached in the last 10%
     """
     if ensemble == 'NVE':
-        list = [atoms.get_temperature() for atoms in configs]
+        list = get_temperatures(configs)
     elif ensemble == 'NVT':
-        list = [atoms.get_potential_energy() for atoms in configs]
+        list = get_potential_energies(configs)
     else:
-        list = [atoms.get_temperature() for atoms in configs]
+        list = get_temperatures(configs)
     list = np.array(list, dtype=np.float64)
-    [equilibrium, _, _] = detect_equilibration(list)
+    if fast:
+        equilibrium = detect_equilibration_fft(list)
+    else:
+        [equilibrium, _, _] = detect_equilibration(list)
     # If equilibrium is detected at the start set equilibrium start at 5%
     # to avoid initial fluctuation. The equilibration detector tends to
     # include the first timestep fluctuations.
@@ -32,3 +53,122 @@ def get_equilibrium(configs, ensemble='NVE'):
     warning = 0.9 < equilibrium/len(list)
 
     return equilibrium, warning
+
+
+def get_trajectory_equilibrium(traj_path, ensemble='NVE', configs=None,
+                               csv_path=None, rows_per_frame=ROWS_PER_FRAME,
+                               first_row=0):
+    """
+    Find the equilibrium of a trajectory file, computed once per file.
+
+    The result is saved with the derived series of the trajectory and is
+    reused until the trajectory changes.
+
+    Input:
+        traj_path: str - trajectory file
+        ensemble: str  - see get_equilibrium
+        configs: TrajectorySeries or None - frames of the trajectory, or
+                 rows of the CSV file, if already read, otherwise they are
+                 only read if needed
+        csv_path: str or None - CSV file of the same simulation, if given
+                  the equilibrium is found in its denser series
+        rows_per_frame: int, first_row: int - sampling of the CSV file,
+                  see read_csv_series
+
+    Output:
+        eqiulibrium: int   - timestep when equilibrium starts, the row of
+                             the CSV file if csv_path is given
+        warning: bool      - True if equilibrium is reached in the last 10%
+    """
+    ensemble = ensemble.upper()
+    if csv_path is None:
+        name = f'equilibrium_{ensemble}'
+    else:
+        name = f'equilibrium_csv_{ensemble}'
+    series = load_derived_series(traj_path)
+    if series is not None and name in series:
+        equilibrium, warning = series[name]
+        return int(equilibrium), bool(warning)
+
+    if configs is None:
+        configs = load_trajectory_series(traj_path)
+        if csv_path is not None:
+            configs = read_csv_series(csv_path, configs, rows_per_frame,
+                                      first_row)
+    equilibrium, warning = get_equilibrium(configs, ensemble)
+    try:
+        save_derived_series(traj_path, **{name: [equilibrium, warning]})
+    except OSError as e:
+        print(f'Could not save the equilibrium of {traj_path}: {e}')
+    return equilibrium, warning
+
+
+def statistical_inefficiency_fft(series, mintime=3):
+    """
+    Calculate the statistical inefficiency of a series.
+
+    The result is that of pymbar.timeseries.statistical_inefficiency with
+    fast=False, with the autocorrelation function from an FFT.
+
+    Input:
+        series: array - the series
+        mintime: int  - the autocorrelation is integrated until it first
+                        goes negative after this time
+
+    Output:
+        g: float | None - statistical inefficiency, None if the series is
+                          constant
+    """
+    n = len(series)
+    fluctuation = series - series.mean()
+    variance = np.mean(fluctuation ** 2)
+    if variance == 0:
+        return None
+    transform = np.fft.rfft(fluctuation, n=2 * n)
+    covariance = np.fft.irfft(transform * transform.conj(), n=2 * n)[1:n - 1]
+    t = np.arange(1, n - 1)
+    correlation = covariance / ((n - t) * variance)
+    crossings = np.nonzero((correlation <= 0) & (t > mintime))[0]
+    stop = crossings[0] if len(crossings) else len(t)
+    g = 1 + 2 * np.sum(correlation[:stop] * (1 - t[:stop] / n))
+    return max(g, 1.0)
+
+
+def detect_equilibration_fft(series, grid_points=GRID_POINTS):
+    """
+    Find the start of a series that maximizes the uncorrelated samples.
+
+    The number of uncorrelated samples is evaluated for grid_points starts
+    spread over the series, and then for starts spread between the
+    neighbours of the best one, until neighbouring starts are adjacent.
+
+    Input:
+        series: array     - the series
+        grid_points: int  - number of starts evaluated in each refinement
+
+    Output:
+        equilibrium: int - start of the equilibrated series
+    """
+    series = np.asarray(series, dtype=np.float64)
+    n = len(series)
+    if n < 3 or series.std() == 0.0:
+        return 0
+
+    def uncorrelated_samples(start):
+        g = statistical_inefficiency_fft(series[start:])
+        if g is None:
+            # A constant end of the series counts as one sample, as in
+            # pymbar.
+            g = n - start + 1
+        return (n - start + 1) / g
+
+    low, high = 0, n - 2
+    while True:
+        starts = np.unique(np.linspace(low, high, grid_points).round()
+                           .astype(int))
+        best = int(np.argmax([uncorrelated_samples(start)
+                              for start in starts]))
+        if len(starts) == high - low + 1:
+            return int(starts[best])
+        low = starts[max(best - 1, 0)]
+        high = starts[min(best + 1, len(starts) - 1)]
@@ -0,0 +1,147 @@
+"""Lennard-Jones calculator built on a cell list and NumPy pair kernels.
+
+The calculator is a drop in replacement for the ASE Lennard-Jones
+calculator that scales linearly with the number of atoms. Like the
+modified ASAP3 potential, the pair energy is shifted to be zero at the
+cutoff.
+"""
+
+import numpy as np
+from ase.calculators.calculator import Calculator, all_changes
+from ase.stress import full_3x3_to_voigt_6_stress
+from .neighbor_list import NeighborList
+
+
+class CellListLennardJones(Calculator):
+    """Lennard-Jones potential using a cell list neighbour search.
+
+    The neighbour list is kept between calculations and is only rebuilt
+    when an atom has moved more than half the skin distance.
+
+    For a single element, epsilon, sigma and rc are numbers. For several
+    elements they are square matrices, e.g. from
+    lennardjonesparse.get_lj_mixing_matrices, and numbers lists the atomic
+    number belonging to each row and column. The parameters of every pair
+    in the neighbour list are looked up once per rebuild, so the pair
+    kernel costs the same for any number of elements.
+
+    Parameters:
+        epsilon: float or array - depth of the potential well (eV)
+        sigma: float or array   - distance where the potential is zero (Å)
+        rc: float or array      - cutoff distance (Å), default 3 * sigma
+        skin: float             - neighbour list skin distance (Å)
+        numbers: list or None   - atomic numbers of the matrix rows
+    """
+
+    implemented_properties = ['energy', 'free_energy', 'forces', 'stress']
+    default_parameters = {'epsilon': 1.0, 'sigma': 1.0, 'rc': None,
+                          'skin': 0.3, 'numbers': None}
+    nolabel = True
+
+    def __init__(self, **kwargs):
+        """Create the calculator, see the class for the parameters."""
+        self.nl = None
+        Calculator.__init__(self, **kwargs)
+
+    def set(self, **kwargs):
+        """Set parameters and discard the neighbour list if they change."""
+        changed_parameters = Calculator.set(self, **kwargs)
+        if changed_parameters:
+            self.nl = None
+        return changed_parameters
+
+    def _parameter_matrices(self):
+        """Return epsilon, sigma and cutoff as matrices."""
+        epsilon = np.atleast_2d(np.asarray(self.parameters.epsilon,
+                                           dtype=float))
+        sigma = np.atleast_2d(np.asarray(self.parameters.sigma,
+                                         dtype=float))
+        rc = self.parameters.rc
+        if rc is None:
+            rc = 3 * sigma
+        rc = np.broadcast_to(np.asarray(rc, dtype=float), sigma.shape)
+        return epsilon, sigma, rc
+
+    def _species(self):
+        """Return the row in the parameter matrices for every atom."""
+        numbers = self.parameters.numbers
+        if numbers is None:
+            return np.zeros(len(self.atoms), dtype=int)
+        numbers = np.asarray(numbers)
+        order = np.argsort(numbers)
+        index = np.searchsorted(numbers, self.atoms.numbers, sorter=order)
+        index = order[np.minimum(index, len(numbers) - 1)]
+        missing = numbers[index] != self.atoms.numbers
+        if np.any(missing):
+            raise ValueError('No Lennard-Jones parameters for atomic '
+                             f'numbers {set(self.atoms.numbers[missing])}')
+        return index
+
+    def _build_neighbor_list(self):
+        """Create the neighbour list and look up the atom species."""
+        _, _, rc = self._parameter_matrices()
+        self.nl = NeighborList(rc.max(), self.parameters.skin)
+        self._species_index = self._species()
+        self._pair_build = None
+
+    def _pair_parameters(self):
+        """Return the parameters of every pair in the neighbour list.
+
+        The parameters are only looked up again after the neighbour list
+        has been rebuilt.
+        """
+        if self._pair_build != self.nl.nbuilds:
+            epsilon, sigma, rc = self._parameter_matrices()
+            # Potential value at the cutoff, subtracted to make the energy
+            # continuous.
+            e0 = 4 * epsilon * ((sigma / rc) ** 12 - (sigma / rc) ** 6)
+            si = self._species_index[self.nl.i]
+            sj = self._species_index[self.nl.j]
+            self._pair_values = (epsilon[si, sj], sigma[si, sj] ** 2,
+                                 rc[si, sj] ** 2, e0[si, sj])
+            self._pair_build = self.nl.nbuilds
+        return self._pair_values
+
+    def calculate(self, atoms=None, properties=None,
+                  system_changes=all_changes):
+        """Calculate energy, forces and stress for the atoms."""
+        Calculator.calculate(self, atoms, properties, system_changes)
+
+        positions = self.atoms.positions
+        cell = self.atoms.cell.array
+        n_atoms = len(self.atoms)
+
+        if self.nl is None or 'numbers' in system_changes:
+            self._build_neighbor_list()
+        self.nl.update(positions, cell, self.atoms.pbc)
+        epsilon, sigma2, rc2, e0 = self._pair_parameters()
+
+        i, j, shifts = self.nl.i, self.nl.j, self.nl.shifts
+        # Vectors pointing from atom i to atom j.
+        d = positions[j] - positions[i] + shifts @ cell
+        r2 = np.einsum('ij,ij->i', d, d)
+        # The neighbour list also contains pairs within the skin.
+        inside = r2 < rc2
+        i, j, d, r2 = i[inside], j[inside], d[inside], r2[inside]
+        epsilon, sigma2, e0 = epsilon[inside], sigma2[inside], e0[inside]
+
+        c6 = (sigma2 / r2) ** 3
+        c12 = c6 ** 2
+        energy = np.sum(4 * epsilon * (c12 - c6) - e0)
+
+        # Force on atom i from atom j, the opposite force acts on atom j.
+        pair_forces = (-24 * epsilon * (2 * c12 - c6) / r2)[:, None] * d
+        forces = np.zeros((n_atoms, 3))
+        for k in range(3):
+            forces[:, k] = (np.bincount(i, pair_forces[:, k], n_atoms) -
+                            np.bincount(j, pair_forces[:, k], n_atoms))
+
+        self.results['energy'] = energy
+        self.results['free_energy'] = energy
+        self.results['forces'] = forces
+
+        # No lattice, no stress.
+        if self.atoms.cell.rank == 3:
+            virial = pair_forces.T @ d
+            self.results['stress'] = (full_3x3_to_voigt_6_stress(virial) /
+                                      self.atoms.get_volume())
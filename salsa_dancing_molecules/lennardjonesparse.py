@@ -1,4 +1,5 @@
 """Functionfile to parse Lennard-Jones (L-J) parameters for a given element."""
+import numpy as np
 from .third_party import lj_params
 
 
@@ -13,3 +14,44 @@ def parse_lj_params(atom_letters):
     Andrew Akerson.
     """
     return lj_params[atom_letters]
+
+
+def get_lj_mixing_matrices(symbols):
+    """Get L-J parameter matrices for all pairs of elements in a material.
+
+    Input is a list of chemical symbols, e.g. atoms.get_chemical_symbols().
+    Output is the atomic numbers of the unique elements, sorted by atomic
+    number, and matrices with the cutoff, epsilon and sigma for every pair
+    of those elements. The pair parameters are given by the
+    Lorentz-Berthelot mixing rules, the arithmetic mean of sigma and the
+    geometric mean of epsilon. The cutoff is the arithmetic mean of the
+    cutoffs, which keeps the cutoff proportional to sigma.
+    """
+    params = sorted({lj_params[symbol] for symbol in symbols})
+    numbers = [p[0] for p in params]
+    rc = np.array([p[1] for p in params])
+    epsilon = np.array([p[2] for p in params])
+    sigma = np.array([p[3] for p in params])
+
+    rc = (rc[:, None] + rc[None, :]) / 2
+    epsilon = np.sqrt(epsilon[:, None] * epsilon[None, :])
+    sigma = (sigma[:, None] + sigma[None, :]) / 2
+    return numbers, rc, epsilon, sigma
+
+
+def warn_single_cutoff(rc):
+    """Warn if the pairs of elements have different cutoffs.
+
+    asap3's LennardJones takes a single cutoff for all pairs, the largest
+    one is used, so its energies differ from those of the cell list
+    calculator, which cuts off and shifts every pair at its own cutoff.
+
+    Input is the cutoff matrix of get_lj_mixing_matrices.
+    Output is True if a warning was printed.
+    """
+    if np.all(rc == rc.max()):
+        return False
+    print(f'Warning: use-asap = True uses the cutoff {rc.max():g} Å for all '
+          'pairs of elements instead of the cutoff of each pair, the '
+          'energies differ from those with use-asap = False.')
+    return True
@@ -1,21 +1,25 @@
 """Calculates the Lindemann parameter and check the Lindemann criterium."""
 
+from .average import average
 from .mean_square_displacement import calculate_msd
+from .trajectory_data import load_derived_series, load_trajectory_data
+from ase.cell import Cell
+from ase.geometry import cell_to_cellpar
 import numpy as np
 
-try:
-    from asap3 import Trajectory
-except ImportError:
-    print("asap3 import failed. This should only happen when building docs.")
 
-
-def get_lindemann_parameter(traj, a, t0):
+def get_lindemann_parameter(traj, a, t0, memory_limit=None):
     """Read trajectory file.
 
+    The MSD saved by the post simulation calculations is used if the
+    trajectory has not changed since, and the trajectory is only read
+    otherwise.
+
     Input:
-        traj: str      -trajectory file
-        t0: int        -timestep when equilibrium starts
-        a: float       -lattice constant
+        traj: str          -trajectory file
+        t0: int            -timestep when equilibrium starts
+        a: float           -lattice constant
+        memory_limit: int  -bytes to use at most for the MSD
 
     Output:
         lidemann_parameters: array - array of time evolution averages of
@@ -23,13 +27,19 @@ def get_lindemann_parameter(traj, a, t0):
         criterion: boolean - if lindemann criterion is violated;
                              if the time average lindemann parameter > 0.1
     """
-    configs = Trajectory(traj)
-    atom = configs[-1]
-    unit_cell = atom.get_cell_lengths_and_angles()
-    cell = atom.get_cell()
-    cell = cell.fromcellpar(unit_cell)
+    series = load_derived_series(traj)
+    if series is not None and 'MSD' in series:
+        MSD = series['MSD']
+        final_cell = series['final_cell']
+    else:
+        configs = load_trajectory_data(traj, memory_limit=memory_limit)
+        MSD, _ = calculate_msd(configs, t0, "initial", memory_limit)
+        final_cell = configs.cell[-1]
+    unit_cell = cell_to_cellpar(final_cell)
+    cell = Cell.fromcellpar(unit_cell)
     lattice = cell.get_bravais_lattice()
-    MSD, MSD_avr = calculate_msd(configs, t0, "initial")
+    # The running average depends on t0, the MSD does not.
+    MSD_avr = average(t0, MSD)
     return calculate_lindemann_parameter(a, MSD, MSD_avr[-1], lattice)
 
 
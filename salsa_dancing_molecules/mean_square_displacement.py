@@ -1,11 +1,41 @@
-"""Module for calculating the mean square displacement of a trajectory file."""
+"""Module for calculating the mean square displacement of a trajectory file.
 
+The calculations take an optional memory limit in bytes. When the arrays
+of the whole trajectory would not fit, the positions are read and unwrapped
+in blocks of frames, or of atoms for the MSD averaged over time origins,
+with the same results.
+"""
+
+from ase.geometry import complete_cell
 from ase.io.trajectory import Trajectory
 import numpy as np
 from .average import average
+from .trajectory_data import (get_all_positions, get_cells,
+                              get_number_of_atoms, get_pbc,
+                              get_positions_block)
+
+# Number of arrays of the size of the positions held at the same time by
+# unwrap_positions and by msd_time_origins, whose FFT is complex and twice
+# as long.
+_UNWRAP_COPIES = 4
+_FFT_COPIES = 8
+
+
+def parse_memory_limit(memory_limit):
+    """Convert the analysis-memory of a simulation to bytes.
+
+    arguments:
+        memory_limit: str, float or None - memory in MB
 
+    return:
+        memory_limit: int or None - memory in bytes, None for no limit
+    """
+    if memory_limit is None:
+        return None
+    return int(float(memory_limit) * 2**20)
 
-def get_msd(traj_file, t0, reference="initial"):
+
+def get_msd(traj_file, t0, reference="initial", memory_limit=None):
     """
     Read trajectory file and call calculation function.
 
@@ -14,6 +44,7 @@ def get_msd(traj_file, t0, reference="initial"):
         t0: int                - timestep when equilibrium starts
         reference: str or None - which atom to be used as reference,can be
                                  'initial' or 'final', default is 'initial'.
+        memory_limit: int      - bytes to use at most, default no limit
 
     return:
         mean square displacement - list
@@ -23,68 +54,271 @@ def get_msd(traj_file, t0, reference="initial"):
     """
     configs = Trajectory(traj_file)
 
-    return calculate_msd(configs, t0, reference)
+    return calculate_msd(configs, t0, reference, memory_limit)
+
 
+def unwrap_positions(positions, cells, pbc):
+    """Undo the wrapping of atoms into the cell between frames.
 
-def calculate_msd(configs, t0, reference="initial"):
+    The displacement of every atom between two frames is converted to
+    fractional coordinates of the cell of the earlier frame, and the
+    nearest lattice vector is subtracted in the periodic directions. This
+    is correct for any cell shape, as long as no atom moves more than half
+    a cell between two frames.
+
+    arguments:
+        positions: array(F, N, 3) - atom positions of every frame
+        cells: array(F, 3, 3)     - lattice vectors as rows of every frame
+        pbc: array(3)             - True for periodic directions
+
+    return:
+        positions: array(F, N, 3) - unwrapped atom positions
+    """
+    positions = np.array(positions, dtype=float)
+    if len(positions) < 2 or not np.any(pbc):
+        return positions
+    dr = unwrapped_displacements(positions, cells, pbc)
+    np.cumsum(dr, axis=0, out=dr)
+    positions[1:] = positions[0] + dr
+    return positions
+
+
+def unwrapped_displacements(positions, cells, pbc):
+    """Return the displacements between frames, see unwrap_positions.
+
+    return:
+        dr: array(F-1, N, 3) - displacement of every atom between each
+                               frame and the next
+    """
+    cells = complete_cell_array(np.asarray(cells, dtype=float)[:-1])
+    dr = np.diff(positions, axis=0)
+    dr_frac = dr @ np.linalg.inv(cells)
+    dr_frac[..., pbc] -= np.round(dr_frac[..., pbc])
+    return dr_frac @ cells
+
+
+def unwrap_blocks(configs, block_frames):
+    """Yield the unwrapped positions of the frames in blocks.
+
+    Only the current block, the first and previous frame and the total
+    displacement up to the previous frame are kept in memory. The positions
+    are the same as those of unwrap_positions for all frames at once.
+
+    arguments:
+        configs: TrajectoryData or Trajectory - frames to read
+        block_frames: int                     - frames in each block
+
+    yields:
+        positions: array(B, N, 3) - unwrapped atom positions of a block
+    """
+    cells = get_cells(configs)
+    pbc = get_pbc(configs)
+    for start in range(0, len(configs), block_frames):
+        stop = min(start + block_frames, len(configs))
+        positions = get_positions_block(configs, slice(start, stop))
+        if not np.any(pbc):
+            yield positions
+            continue
+        if start == 0:
+            first = previous = positions[0].copy()
+            displacement = np.zeros_like(first)
+        # Frames are unwrapped from the last frame of the previous block.
+        new = 1 if start == 0 else 0
+        frames = np.concatenate(([previous], positions[new:]))
+        previous = positions[-1].copy()
+        if len(frames) > 1:
+            dr = unwrapped_displacements(frames, cells[start - 1 + new:stop],
+                                         pbc)
+            dr[0] += displacement
+            np.cumsum(dr, axis=0, out=dr)
+            displacement = dr[-1].copy()
+            positions[new:] = first + dr
+        yield positions
+
+
+def complete_cell_array(cells):
+    """Complete the cells of all frames, see ase.geometry.complete_cell."""
+    if np.all(cells == cells[0]):
+        return complete_cell(cells[0])
+    return np.array([complete_cell(cell) for cell in cells])
+
+
+def calculate_msd(configs, t0, reference="initial", memory_limit=None,
+                  per_atom=False):
     """
     Calculate the mean square dispalcement for a trajectory file as a list.
 
     arguments:
-        configs: ase.io.trajectory.Trajectory - traj file containg atom-obj.
+        configs: ase.io.trajectory.Trajectory - traj file containg atom-obj,
+                 or TrajectoryData
         reference: str or None - which atom to be used as reference,can be
                                  'initial' or 'final', default is 'initial'.
+        memory_limit: int      - bytes to use at most, default no limit
+        per_atom: bool         - return the mean square displacement of
+                                 every atom instead of their average
 
     return:
-        MSD: list     - means square displacement
-        MSD_avr: list - time evolution average of mean square displacement
+        MSD: array     - means square displacement, of shape (F, N) if
+                         per_atom is True
+        MSD_avr: array - time evolution average of mean square displacement,
+                         averaged over the atoms
     """
-    N = len(configs[0])  # Number of atoms
-    atom = configs[0]
-    cell_lengths_and_angles = atom.get_cell_lengths_and_angles()
-    x_size = cell_lengths_and_angles[0]
-    y_size = cell_lengths_and_angles[1]
-    z_size = cell_lengths_and_angles[2]
-    atom_positions = [atom.get_positions() for atom in configs]
-    atom_positions = np.array(atom_positions)
+    if memory_limit is not None:
+        n_atoms = get_number_of_atoms(configs)
+        block_frames = max(1, int(memory_limit //
+                                  (_UNWRAP_COPIES * n_atoms * 3 * 8)))
+        if block_frames < len(configs):
+            MSD = calculate_msd_blocks(configs, reference, block_frames,
+                                       per_atom)
+            return MSD, average(t0, MSD.mean(axis=1) if per_atom else MSD)
+
+    # Changes atom positions according to boundary conditions
+    atom_positions = unwrap_positions(get_all_positions(configs),
+                                      get_cells(configs), get_pbc(configs))
 
     if reference == "initial":
         reference_position = atom_positions[0]
     elif reference == "final":
         reference_position = atom_positions[-1]
 
-    # Changes atom positions according to boundary conditions
-    for time_step in range(len(atom_positions)):
-        if time_step == 0:
-            pass
-        else:
-            dr = (atom_positions[time_step] - atom_positions[time_step-1])
-            for atom in dr:
-                dx = atom[0]
-                if (dx > x_size*0.5):
-                    dx = dx - x_size
-                if (dx <= -x_size*0.5):
-                    dx = dx + x_size
-                atom[0] = dx
-                dy = atom[1]
-                if (dy > y_size*0.5):
-                    dy = dy - y_size
-                if (dy <= -y_size*0.5):
-                    dy = dy + y_size
-                atom[1] = dy
-                dz = atom[2]
-                if (dz > z_size*0.5):
-                    dz = dz - z_size
-                if (dz <= -z_size*0.5):
-                    dz = dz + z_size
-                atom[2] = dz
-
-            atom_positions[time_step] = atom_positions[time_step-1] + dr
-
-    MSD = []
     # Calculates the mean square displacement using correct atom positions
-    for pos in atom_positions:
-        X = np.subtract(pos, reference_position)
-        MSD.append(1/N*sum([(np.linalg.norm(i))**2 for i in X]))
+    atom_positions -= reference_position
+    if per_atom:
+        MSD = np.einsum('fni,fni->fn', atom_positions, atom_positions)
+        return MSD, average(t0, MSD.mean(axis=1))
+    MSD = np.einsum('fni,fni->f', atom_positions,
+                    atom_positions) / atom_positions.shape[1]
     MSD_avr = average(t0, MSD)
     return MSD, MSD_avr
+
+
+def calculate_msd_blocks(configs, reference, block_frames, per_atom=False):
+    """
+    Calculate the mean square displacement in blocks of frames.
+
+    The final positions are found with a first pass over the trajectory if
+    they are used as reference.
+
+    arguments:
+        configs: ase.io.trajectory.Trajectory - traj file containg atom-obj,
+                 or TrajectoryData
+        reference: str    - 'initial' or 'final', see calculate_msd
+        block_frames: int - frames in each block
+        per_atom: bool    - see calculate_msd
+
+    return:
+        MSD: array - means square displacement
+    """
+    if reference == "initial":
+        reference_position = get_positions_block(configs, slice(0, 1))[0]
+    elif reference == "final":
+        for positions in unwrap_blocks(configs, block_frames):
+            pass
+        reference_position = positions[-1]
+
+    n_atoms = len(reference_position)
+    MSD = np.empty((len(configs), n_atoms) if per_atom else len(configs))
+    start = 0
+    for positions in unwrap_blocks(configs, block_frames):
+        positions -= reference_position
+        if per_atom:
+            MSD[start:start + len(positions)] = np.einsum(
+                'fni,fni->fn', positions, positions)
+        else:
+            MSD[start:start + len(positions)] = np.einsum(
+                'fni,fni->f', positions, positions) / n_atoms
+        start += len(positions)
+    return MSD
+
+
+def calculate_msd_time_origins(configs, t0, memory_limit=None,
+                               per_atom=False):
+    """
+    Calculate the mean square displacement averaged over all time origins.
+
+    Every frame after equilibrium is used as a reference, so the value at a
+    time lag m is averaged over all pairs of frames m frames apart instead
+    of over the atoms of a single pair. The average is computed with the
+    FFT in O(F log F) time, see msd_time_origins. With a memory limit, the
+    atoms are processed in blocks, and a trajectory that is not memory
+    mapped is read once for every block.
+
+    arguments:
+        configs: ase.io.trajectory.Trajectory - traj file containg atom-obj,
+                 or TrajectoryData
+        t0: int           - timestep when equilibrium starts
+        memory_limit: int - bytes to use at most, default no limit, the
+                            result is not included
+        per_atom: bool    - return the mean square displacement of every
+                            atom instead of their average
+
+    return:
+        MSD: array - mean square displacement for every time lag, in frames,
+                     from 0 to the number of frames after equilibrium, of
+                     shape (F, N) if per_atom is True
+    """
+    n_atoms = get_number_of_atoms(configs)
+    if memory_limit is None:
+        atom_positions = unwrap_positions(get_all_positions(configs)[t0:],
+                                          get_cells(configs)[t0:],
+                                          get_pbc(configs))
+        return msd_time_origins(atom_positions, per_atom)
+
+    n_frames = len(configs) - t0
+    block_atoms = max(1, int(memory_limit //
+                             (_FFT_COPIES * max(n_frames, 1) * 3 * 8)))
+    cells = get_cells(configs)[t0:]
+    pbc = get_pbc(configs)
+    MSD = np.zeros((n_frames, n_atoms) if per_atom else n_frames)
+    for start in range(0, n_atoms, block_atoms):
+        atoms = slice(start, min(start + block_atoms, n_atoms))
+        atom_positions = unwrap_positions(
+            get_positions_block(configs, slice(t0, None), atoms), cells, pbc)
+        if per_atom:
+            MSD[:, atoms] = msd_time_origins(atom_positions, per_atom)
+        else:
+            MSD += (msd_time_origins(atom_positions) *
+                    atom_positions.shape[1])
+    return MSD if per_atom else MSD / n_atoms
+
+
+def msd_time_origins(positions, per_atom=False):
+    """
+    Calculate the mean square displacement averaged over all time origins.
+
+    For F frames, the average of |r(k+m) - r(k)|^2 over k is split into the
+    sums of |r(k)|^2 and |r(k+m)|^2, taken from cumulative sums, and the
+    autocorrelation of r(k)·r(k+m), calculated with a zero padded FFT.
+
+    arguments:
+        positions: array(F, N, 3) - unwrapped atom positions of every frame
+        per_atom: bool            - do not average over the atoms
+
+    return:
+        MSD: array(F) - mean square displacement for every time lag, or
+                        array(F, N) of every atom if per_atom is True
+    """
+    positions = np.asarray(positions, dtype=float)
+    n_frames, n_atoms = positions.shape[:2]
+    if n_frames == 0:
+        return np.zeros((0, n_atoms) if per_atom else 0)
+    # The MSD does not depend on the origin of each atom, and measuring
+    # positions from their mean keeps the two terms small.
+    positions = positions - positions.mean(axis=0)
+    lags = np.arange(n_frames)
+    counts = (n_frames - lags)[:, np.newaxis]
+
+    square = np.einsum('fni,fni->fn', positions, positions)
+    cumulative = np.concatenate((np.zeros((1, n_atoms)),
+                                 np.cumsum(square, axis=0)))
+    square_sum = (cumulative[n_frames - lags] +
+                  cumulative[-1] - cumulative[lags])
+
+    correlation = np.zeros((n_frames, n_atoms))
+    for k in range(3):
+        transform = np.fft.rfft(positions[..., k], n=2 * n_frames, axis=0)
+        correlation += np.fft.irfft(transform * transform.conj(),
+                                    n=2 * n_frames, axis=0)[:n_frames]
+
+    MSD = (square_sum - 2 * correlation) / counts
+    return MSD if per_atom else MSD.mean(axis=1)
@@ -0,0 +1,225 @@
+"""Module for finding interacting atom pairs with a cell list.
+
+The atoms are binned into a grid of cells (linked-cell binning) whose
+sides are at least as long as the cutoff, so that all neighbours of an
+atom are found in its own bin or in one of the adjacent bins. All the
+work per bin offset is done with whole-array NumPy operations.
+"""
+
+import itertools
+import numpy as np
+
+
+def _working_cell(cell, pbc):
+    """Return a full rank cell to bin the atoms in.
+
+    Lattice vectors of non-periodic directions are replaced by unit
+    vectors orthogonal to the periodic lattice vectors, which makes it
+    possible to bin clusters and slabs without a proper cell.
+
+    arguments:
+        cell: array(3, 3) - lattice vectors as rows
+        pbc: array(3)     - periodic boundary conditions per direction
+
+    returns:
+        cell: array(3, 3) - cell with full rank
+    """
+    work = np.array(cell, dtype=float)
+    periodic = work[pbc]
+    if len(periodic) > 0:
+        _, _, vt = np.linalg.svd(periodic)
+        work[~pbc] = vt[len(periodic):]
+    else:
+        work = np.eye(3)
+    return work
+
+
+def cell_list_pairs(positions, cell, pbc, cutoff):
+    """Find all atom pairs closer than the cutoff.
+
+    Every pair is only returned once. The vector from atom i to atom j is
+    given by positions[j] - positions[i] + shifts @ cell, which also holds
+    for atoms that have moved outside of the cell.
+
+    arguments:
+        positions: array(N, 3) - atom positions
+        cell: array(3, 3)      - lattice vectors as rows
+        pbc: array(3) or bool  - periodic boundary conditions
+        cutoff: float          - largest pair distance to include
+
+    returns:
+        i: array(M)         - index of the first atom in each pair
+        j: array(M)         - index of the second atom in each pair
+        shifts: array(M, 3) - integer cell shifts of the second atom
+    """
+    positions = np.asarray(positions, dtype=float)
+    cell = np.asarray(cell, dtype=float)
+    pbc = np.broadcast_to(np.asarray(pbc, dtype=bool), (3,))
+    n_atoms = len(positions)
+    if n_atoms == 0:
+        return (np.zeros(0, dtype=int), np.zeros(0, dtype=int),
+                np.zeros((0, 3), dtype=int))
+
+    work = _working_cell(cell, pbc)
+    # Distances between opposite faces of the cell.
+    volume = abs(np.linalg.det(work))
+    face_distances = volume / np.linalg.norm(
+        np.cross(work[[1, 2, 0]], work[[2, 0, 1]]), axis=1)
+
+    # Fractional coordinates, wrapped into the cell in periodic directions
+    # and scaled to the bounding box of the atoms in the other directions.
+    frac = np.linalg.solve(work.T, positions.T).T
+    wraps = np.where(pbc, np.floor(frac), 0).astype(int)
+    frac = frac - wraps
+    low = np.where(pbc, 0.0, frac.min(axis=0))
+    span = np.where(pbc, 1.0, frac.max(axis=0) - low)
+    span = np.where(span > 0, span, 1.0)
+    frac = (frac - low) / span
+    widths = span * face_distances
+
+    n_bins = np.maximum(1, (widths // cutoff).astype(int))
+    # Keep the grid from growing far beyond the number of atoms for
+    # sparse systems. Fewer bins are always wider than the cutoff.
+    max_bins = max(1000, 8 * n_atoms)
+    if np.prod(n_bins) > max_bins:
+        scale = (max_bins / np.prod(n_bins)) ** (1 / 3)
+        n_bins = np.maximum(1, (n_bins * scale).astype(int))
+    bin_widths = widths / n_bins
+
+    # Number of neighbouring bins to search in each direction. Periodic
+    # cells thinner than the cutoff need to include several images.
+    reach = np.where(pbc,
+                     np.ceil(cutoff / bin_widths - 1e-12).astype(int),
+                     np.minimum(1, n_bins - 1))
+
+    bins = np.minimum((frac * n_bins).astype(int), n_bins - 1)
+    bin_index = np.ravel_multi_index(bins.T, n_bins)
+    order = np.argsort(bin_index, kind='stable')
+    counts = np.bincount(bin_index, minlength=np.prod(n_bins))
+    starts = np.cumsum(counts) - counts
+
+    pair_i = []
+    pair_j = []
+    pair_shifts = []
+    wrapped = positions - wraps @ cell
+    ranges = [range(-r, r + 1) for r in reach]
+    for offset in itertools.product(*ranges):
+        neighbor_bins = bins + offset
+        images = np.floor_divide(neighbor_bins, n_bins)
+        neighbor_bins -= images * n_bins
+        valid = np.all(pbc | (images == 0), axis=1)
+        atoms = np.nonzero(valid)[0]
+        neighbor_index = np.ravel_multi_index(neighbor_bins[valid].T,
+                                              n_bins)
+
+        # Pair each atom with every atom in its neighbour bin.
+        n_pairs = counts[neighbor_index]
+        total = n_pairs.sum()
+        if total == 0:
+            continue
+        i = np.repeat(atoms, n_pairs)
+        within = np.arange(total) - np.repeat(np.cumsum(n_pairs) - n_pairs,
+                                              n_pairs)
+        j = order[np.repeat(starts[neighbor_index], n_pairs) + within]
+        shifts = np.repeat(images[valid], n_pairs, axis=0)
+
+        # Each pair is found twice, once from each atom. Keep i < j and
+        # for an atom interacting with its own image the positive shift.
+        positive = ((shifts[:, 0] > 0) |
+                    ((shifts[:, 0] == 0) & (shifts[:, 1] > 0)) |
+                    ((shifts[:, 0] == 0) & (shifts[:, 1] == 0) &
+                     (shifts[:, 2] > 0)))
+        keep = (i < j) | ((i == j) & positive)
+        i, j, shifts = i[keep], j[keep], shifts[keep]
+
+        d = wrapped[j] - wrapped[i] + shifts @ cell
+        close = np.einsum('ij,ij->i', d, d) < cutoff ** 2
+        i, j, shifts = i[close], j[close], shifts[close]
+
+        pair_i.append(i)
+        pair_j.append(j)
+        # Convert the shifts to refer to the unwrapped positions.
+        pair_shifts.append(shifts - wraps[j] + wraps[i])
+
+    if len(pair_i) == 0:
+        return (np.zeros(0, dtype=int), np.zeros(0, dtype=int),
+                np.zeros((0, 3), dtype=int))
+    return (np.concatenate(pair_i), np.concatenate(pair_j),
+            np.concatenate(pair_shifts))
+
+
+class NeighborList:
+    """Verlet neighbour list with a skin distance.
+
+    The pairs are found with cell_list_pairs using the cutoff plus the
+    skin. The list stays valid until some atom has moved more than half
+    the skin, so it only has to be rebuilt once in a while during a
+    simulation.
+
+    Attributes:
+        cutoff: float       - largest interaction distance
+        skin: float         - extra distance included in the list
+        nbuilds: int        - number of times the list has been built
+        nupdates: int       - number of times update has been called
+        i, j, shifts: array - pairs as returned by cell_list_pairs
+    """
+
+    def __init__(self, cutoff, skin=0.3):
+        """Create an empty neighbour list.
+
+        arguments:
+            cutoff: float - largest interaction distance
+            skin: float   - extra distance to include in the list
+        """
+        self.cutoff = cutoff
+        self.skin = skin
+        self.nbuilds = 0
+        self.nupdates = 0
+        self.i = None
+        self.j = None
+        self.shifts = None
+        self._positions = None
+        self._cell = None
+        self._pbc = None
+
+    def update(self, positions, cell, pbc):
+        """Rebuild the list if it is no longer valid.
+
+        arguments:
+            positions: array(N, 3) - atom positions
+            cell: array(3, 3)      - lattice vectors as rows
+            pbc: array(3) or bool  - periodic boundary conditions
+
+        returns:
+            rebuilt: bool - True if the list was rebuilt
+        """
+        self.nupdates += 1
+        positions = np.asarray(positions, dtype=float)
+        cell = np.asarray(cell, dtype=float)
+        pbc = np.broadcast_to(np.asarray(pbc, dtype=bool), (3,))
+
+        if not self._needs_rebuild(positions, cell, pbc):
+            return False
+
+        self.i, self.j, self.shifts = cell_list_pairs(
+            positions, cell, pbc, self.cutoff + self.skin)
+        self._positions = positions.copy()
+        self._cell = cell.copy()
+        self._pbc = pbc.copy()
+        self.nbuilds += 1
+        return True
+
+    def _needs_rebuild(self, positions, cell, pbc):
+        """Check if the list has to be rebuilt for the new positions."""
+        if self._positions is None:
+            return True
+        if (len(positions) != len(self._positions) or
+                not np.array_equal(cell, self._cell) or
+                not np.array_equal(pbc, self._pbc)):
+            return True
+        if len(positions) == 0:
+            return False
+        displacement = positions - self._positions
+        max_displacement = np.sqrt(
+            np.einsum('ij,ij->i', displacement, displacement).max())
+        return max_displacement > 0.5 * self.skin
@@ -1,42 +1,225 @@
-"""Module for managing post process calculations of multiple simulations."""
+"""Module for managing post process calculations of multiple simulations.
+
+The simulations are post processed in parallel in a pool of processes, and
+the result of each simulation is written to the output file as soon as it
+is done. Simulations whose calculations fail are logged in a separate file
+and do not stop the others.
+
+The results are also kept in an index in post_process_output, keyed by the
+name of the simulation, a hash of its configuration and the size and
+modification time of its trajectory. Later runs only analyse simulations
+that are new or have changed, and take the results of the others from the
+index.
+"""
 import os
 import csv
+import hashlib
+import traceback
+from concurrent import futures
 from .post_simulation_calculation import post_simulation_calculation
 from datetime import datetime
 import json
 
+INDEX_FILE_NAME = "results_index.json"
+INDEX_VERSION = 2
+
+
+def analyse_done_simulation(done_path, done_sim):
+    """Run the post simulation calculations of a finished simulation.
+
+    Args:
+        done_path: string - path to the done_simulations directory.
+        done_sim: string  - file name of the simulation configuration.
+
+    return:
+        sim_results: dict - results of the post simulation calculations.
+    """
+    with open(os.path.join(done_path, done_sim)) as f:
+        sim_info = json.load(f)
+    sim_results = post_simulation_calculation(sim_info)
+    sim_results["file_name"] = os.path.splitext(done_sim)[0]
+    return sim_results
+
+
+def analyse_done_simulations(done_path, done_list, jobs):
+    """Post process simulations and yield the results as they complete.
+
+    Args:
+        done_path: string      - path to the done_simulations directory.
+        done_list: list(str)   - file names of the simulation configurations.
+        jobs: int              - number of processes, 1 runs the
+                                 calculations in this process.
+
+    yield:
+        done_sim: string               - file name of the configuration.
+        sim_results: dict | Exception  - results, or the exception raised
+                                         by the calculations.
+    """
+    if jobs == 1:
+        for done_sim in done_list:
+            try:
+                yield done_sim, analyse_done_simulation(done_path, done_sim)
+            except Exception as e:
+                yield done_sim, e
+        return
+
+    with futures.ProcessPoolExecutor(jobs) as pool:
+        pending = {pool.submit(analyse_done_simulation, done_path, done_sim):
+                   done_sim for done_sim in done_list}
+        for future in futures.as_completed(pending):
+            try:
+                yield pending[future], future.result()
+            except Exception as e:
+                yield pending[future], e
+
+
+def get_simulation_key(done_path, done_sim):
+    """Return what identifies the inputs of a finished simulation.
+
+    Args:
+        done_path: string - path to the done_simulations directory.
+        done_sim: string  - file name of the simulation configuration.
+
+    return:
+        key: dict - hash of the configuration and size and modification
+                    time of the trajectory and CSV file, None for a file
+                    that does not exist.
+    """
+    with open(os.path.join(done_path, done_sim), "rb") as f:
+        config = f.read()
+    key = {"config_sha256": hashlib.sha256(config).hexdigest()}
+    try:
+        sim_info = json.loads(config)
+    except ValueError:
+        sim_info = {}
+    for name in ["traj", "csv"]:
+        key[f"{name}_size"] = key[f"{name}_mtime_ns"] = None
+        try:
+            stat = os.stat(sim_info[f"{name}_output_path"])
+        except (OSError, KeyError, TypeError):
+            continue
+        key[f"{name}_size"] = stat.st_size
+        key[f"{name}_mtime_ns"] = stat.st_mtime_ns
+    return key
 
-def run_post_calculations(work_path):
+
+def read_results_index(output_path):
+    """Read the index of post processing results.
+
+    Args:
+        output_path: string - path to the post_process_output directory.
+
+    return:
+        index: dict - key and results of each simulation by name, empty if
+                      there is no usable index.
+    """
+    try:
+        with open(os.path.join(output_path, INDEX_FILE_NAME)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if index.get("version") != INDEX_VERSION:
+        return {}
+    return index["simulations"]
+
+
+def write_results_index(output_path, simulations):
+    """Write the index of post processing results.
+
+    The index is written to a temporary file that then replaces the old
+    index, so an interrupted run never leaves a broken index behind.
+
+    Args:
+        output_path: string - path to the post_process_output directory.
+        simulations: dict   - key and results of each simulation by name.
+    """
+    index_path = os.path.join(output_path, INDEX_FILE_NAME)
+    with open(index_path + ".tmp", "w") as f:
+        json.dump({"version": INDEX_VERSION, "simulations": simulations}, f)
+    os.replace(index_path + ".tmp", index_path)
+
+
+def run_post_calculations(work_path, jobs=None, rerun_all=False):
     """Run post processing.
 
     Go through folder of configs from finished simulations and perform
-    post simulation calculations.
+    post simulation calculations. Simulations whose results are in the
+    results index and have not changed since are not analysed again.
 
     Args:
         work_path: string - path to working directory.
+        jobs: int         - number of processes to run the calculations in,
+                            default is the number of CPUs.
+        rerun_all: bool   - analyse all simulations, ignoring the index.
     """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
     done_path = work_path.rstrip("/")+"/done_simulations"
-    done_list = os.listdir(done_path)
-    simulation_results = []
-    if not os.path.exists(work_path.rstrip("/")+"/post_process_output"):
-        os.mkdir(work_path.rstrip("/")+"/post_process_output")
-    for done_sim in done_list:
-        f = open(os.path.join(done_path, done_sim))
-        sim_info = json.load(f)
-        f.close()
-        sim_results = post_simulation_calculation(sim_info)
-        sim_file_name = os.path.splitext(done_sim)[0]
-        sim_results["file_name"] = sim_file_name
-        simulation_results.append(sim_results)
+    done_list = sorted(os.listdir(done_path))
+    output_path = work_path.rstrip("/")+"/post_process_output"
+    if not os.path.exists(output_path):
+        os.mkdir(output_path)
     now = datetime.now()
     dt_string = now.strftime("%d-%m-%y_%H_%M_%S")
-    results_file_name = "post_process_"+dt_string+".csv"
-    results_file_name = (work_path.rstrip('/') + "/post_process_output/" +
-                         results_file_name)
-    f = open(results_file_name, "w+")
-    fieldnames = simulation_results[0].keys()
-    writer = csv.DictWriter(f, fieldnames)
-    writer.writeheader()
-    for result_dict in simulation_results:
-        writer.writerow(result_dict)
-    f.close()
+    results_file_name = output_path + "/post_process_"+dt_string+".csv"
+    failures_file_name = output_path + "/post_process_"+dt_string+"_failed.log"
+
+    old_index = {} if rerun_all else read_results_index(output_path)
+    index = {}
+    cached_results = []
+    new_list = []
+    keys = {}
+    for done_sim in done_list:
+        name = os.path.splitext(done_sim)[0]
+        keys[done_sim] = get_simulation_key(done_path, done_sim)
+        entry = old_index.get(name)
+        if entry is not None and entry["key"] == keys[done_sim]:
+            index[name] = entry
+            cached_results.append(entry["results"])
+        else:
+            new_list.append(done_sim)
+    print(f'Analysing {len(new_list)} new or changed simulations, '
+          f'{len(cached_results)} unchanged simulations are taken from '
+          'the results index.')
+
+    f = None
+    writer = None
+    n_failed = 0
+
+    def write_row(sim_results):
+        nonlocal f, writer
+        if writer is None:
+            f = open(results_file_name, "w+")
+            writer = csv.DictWriter(f, sim_results.keys())
+            writer.writeheader()
+        writer.writerow(sim_results)
+
+    try:
+        for sim_results in cached_results:
+            write_row(sim_results)
+        for done_sim, sim_results in analyse_done_simulations(
+                done_path, new_list, jobs):
+            if isinstance(sim_results, Exception):
+                n_failed += 1
+                print(f'Post processing of {done_sim} failed: {sim_results}')
+                with open(failures_file_name, "a") as log:
+                    log.write(f'{done_sim}:\n')
+                    log.writelines(traceback.format_exception(
+                        type(sim_results), sim_results,
+                        sim_results.__traceback__))
+                    log.write('\n')
+                continue
+            write_row(sim_results)
+            # Keep the results of finished simulations if the run is
+            # interrupted.
+            f.flush()
+            index[sim_results["file_name"]] = {"key": keys[done_sim],
+                                               "results": sim_results}
+    finally:
+        if f is not None:
+            f.close()
+        write_results_index(output_path, index)
+
+    if n_failed:
+        print(f'Post processing of {n_failed} of {len(done_list)} '
+              f'simulations failed, see {failures_file_name}')
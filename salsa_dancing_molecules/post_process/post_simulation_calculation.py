@@ -1,14 +1,24 @@
 """Module for calling calculations of the post simulation values."""
 
-from ase.io.trajectory import Trajectory
-from ..equilibrium import get_equilibrium
+from ..trajectory_data import (get_csv_layout, get_frame_of_row,
+                               load_trajectory_data, read_csv_series,
+                               save_derived_series)
+from ..equilibrium import get_trajectory_equilibrium
 from ..average import average
-from ..mean_square_displacement import calculate_msd
-from ..self_diffusion_coefficient import calculate_self_diffusion_coefficient
-from ..capacity_NVE import calculate_NVE_heat_capacity
-from ..capacity_NVT import calculate_NVT_heat_capacity
-from ..debye_temperature import calculate_debye
-from ..cohesive_energy import calculate_cohesive_energy
+from ..mean_square_displacement import (calculate_msd,
+                                        calculate_msd_time_origins,
+                                        parse_memory_limit)
+from ..self_diffusion_coefficient import (fit_self_diffusion_coefficient,
+                                          parse_fit_window)
+from ..capacity_NVE import (calculate_NVE_heat_capacity,
+                            calculate_NVE_heat_capacity_error)
+from ..capacity_NVT import (calculate_NVT_heat_capacity,
+                            calculate_NVT_heat_capacity_error)
+from ..debye_temperature import calculate_debye, calculate_debye_error
+from ..cohesive_energy import (calculate_cohesive_energy,
+                               calculate_cohesive_energy_error)
+from ..uncertainty import (effective_samples, independent_standard_error,
+                           standard_error)
 
 import csv
 import numpy as np
@@ -47,6 +57,11 @@ def post_simulation_calculation(sim_info):
             heat_capacity               - float
             debye_temperature           - float
             cohesive_energy             - float
+            <name>_error                - float, standard error of each of
+                                          the above
+            effective_samples           - float, uncorrelated samples of
+                                          the series used for the
+                                          equilibrium
 
     To get the average mean square displacement from equilibrium-time to the
     last time-step take the last element of MSD_avr.
@@ -54,15 +69,26 @@ def post_simulation_calculation(sim_info):
     """
     traj_path = sim_info["traj_output_path"]
     csv_path = sim_info["csv_output_path"]
-    temperature = get_column_from_csv(csv_path, "Temperature (K)")
-    temperature = [float(x) for x in temperature]
     ensemble = sim_info["ensemble"]
     ensemble = ensemble.upper()
-    # Read the Trajectory file
-    configs = Trajectory(traj_path)
-
-    # Calculate the equilibrium time of the system
-    t0, equilibrium_warning = get_equilibrium(configs, ensemble)
+    # The positions are read in blocks if they would need more than
+    # analysis-memory MB.
+    memory_limit = parse_memory_limit(sim_info.get("analysis-memory"))
+    # Read the Trajectory file once into arrays used by all calculations,
+    # or load the arrays saved by an earlier run.
+    configs = load_trajectory_data(traj_path, memory_limit=memory_limit)
+    # The energies and temperature are sampled more often in the CSV file
+    # than in the trajectory, the calculations that only need them use its
+    # series.
+    rows_per_frame, first_row = get_csv_layout(sim_info)
+    series = read_csv_series(csv_path, configs, rows_per_frame, first_row)
+
+    # Calculate the equilibrium row of the CSV file, or take it from an
+    # earlier analysis of the same simulation, and the first trajectory
+    # frame after it.
+    t0_series, equilibrium_warning = get_trajectory_equilibrium(
+        traj_path, ensemble, series, csv_path)
+    t0 = get_frame_of_row(t0_series, rows_per_frame, len(configs))
 
     if equilibrium_warning:
         equilibrium_warning = ("Warning: Equilibrium detected close to the "
@@ -72,21 +98,51 @@ def post_simulation_calculation(sim_info):
         equilibrium_warning = ""
 
     # Calculate the temperature average of the system
-    temperature = np.array(temperature)
-    temperature_avr = average(t0, temperature)[-1]
-
-    # Calculate values
-    MSD, MSD_avr = calculate_msd(configs, t0)
-    self_diffusion_coefficient = calculate_self_diffusion_coefficient(MSD, t0)
+    temperature_avr = average(t0_series, series.temperature)[-1]
+
+    # Calculate values, the error of the MSD comes from the spread of the
+    # time averages of the atoms, which are taken as independent.
+    MSD_atoms, MSD_avr = calculate_msd(configs, t0, memory_limit=memory_limit,
+                                       per_atom=True)
+    MSD = MSD_atoms.mean(axis=1)
+    MSD_avr_error = independent_standard_error(MSD_atoms[t0:].mean(axis=0))
+    del MSD_atoms
+    # Saved for the Lindemann parameter calculated by volume_process.
+    try:
+        save_derived_series(traj_path, MSD=MSD, MSD_avr=MSD_avr, t0=t0,
+                            final_cell=configs.cell[-1])
+    except OSError as e:
+        print(f'Could not save the MSD of {traj_path}: {e}')
+    # The diffusion coefficient is fitted to the MSD averaged over all time
+    # origins after equilibrium.
+    fit_window = parse_fit_window(sim_info.get("msd-fit-window", "0.1,0.5"))
+    MSD_origins = calculate_msd_time_origins(configs, t0, memory_limit,
+                                             per_atom=True)
+    self_diffusion_coefficient = fit_self_diffusion_coefficient(
+        MSD_origins.mean(axis=1), fit_window)
+    # The coefficient is the mean of those fitted to every atom, which are
+    # taken as independent.
+    self_diffusion_coefficient_error = independent_standard_error(
+        fit_self_diffusion_coefficient(MSD_origins, fit_window))
 
     if ensemble == 'NVE':
-        heat_capacity = calculate_NVE_heat_capacity(configs, t0)
+        heat_capacity = calculate_NVE_heat_capacity(series, t0_series)
+        heat_capacity_error = calculate_NVE_heat_capacity_error(series,
+                                                                t0_series)
+        equilibrium_series = series.temperature
     elif ensemble == 'NVT':
-        heat_capacity = calculate_NVT_heat_capacity(configs, t0)
+        heat_capacity = calculate_NVT_heat_capacity(series, t0_series)
+        heat_capacity_error = calculate_NVT_heat_capacity_error(series,
+                                                                t0_series)
+        equilibrium_series = series.potential_energy
 
     debye_temperature, debye_warning = calculate_debye(configs,
                                                        temperature_avr,
                                                        heat_capacity)
+    debye_temperature_error = calculate_debye_error(
+        debye_temperature, temperature_avr,
+        standard_error(series.temperature[t0_series:]), heat_capacity,
+        heat_capacity_error)
 
     if debye_warning:
         debye_warning = ("Warning: Debye temperature is low compared to the "
@@ -95,7 +151,9 @@ def post_simulation_calculation(sim_info):
     else:
         debye_warning = ""
 
-    cohesive_energy = calculate_cohesive_energy(configs, t0)
+    cohesive_energy = calculate_cohesive_energy(series, t0_series)
+    cohesive_energy_error = calculate_cohesive_energy_error(series,
+                                                            t0_series)
 
     result_dict = {}
     result_dict["MSD_avr"] = MSD_avr[-1]
@@ -105,5 +163,13 @@ def post_simulation_calculation(sim_info):
     result_dict["cohesive_energy"] = cohesive_energy
     result_dict["equilibrium_warning"] = equilibrium_warning
     result_dict["debye_warning"] = debye_warning
+    result_dict["MSD_avr_error"] = MSD_avr_error
+    result_dict["self_diffusion_coefficient_error"] = (
+        self_diffusion_coefficient_error)
+    result_dict["heat_capacity_error"] = heat_capacity_error
+    result_dict["debye_temperature_error"] = debye_temperature_error
+    result_dict["cohesive_energy_error"] = cohesive_energy_error
+    result_dict["effective_samples"] = effective_samples(
+        equilibrium_series[t0_series:])
 
     return result_dict
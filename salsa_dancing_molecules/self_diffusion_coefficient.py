@@ -1,22 +1,33 @@
 """Module for calculating the self diffusion coefficient."""
 
-from .mean_square_displacement import get_msd
+import numpy as np
+from ase.io.trajectory import Trajectory
+from .mean_square_displacement import calculate_msd_time_origins
 
+# Default part of the time lags of the mean square displacement to fit,
+# as fractions of the longest lag.
+DEFAULT_FIT_WINDOW = (0.1, 0.5)
 
-def get_self_diffusion_coefficient(traj_file, t0):
+
+def get_self_diffusion_coefficient(traj_file, t0,
+                                   fit_window=DEFAULT_FIT_WINDOW):
     """
     Take a trajectory file and returns the self diffusion coefficient.
 
     arguments:
-        traj_file: str - trajectory file
-        t0: int        - timestep when equilibrium starts
+        traj_file: str            - trajectory file
+        t0: int                   - timestep when equilibrium starts
+        fit_window: (float,float) - time lags to fit, see
+                                    fit_self_diffusion_coefficient
 
     returns:
         self_diffusion_coefficient - float
 
     """
-    MSD, _ = get_msd(traj_file, reference="initial")
-    self_diffusion_coefficient = calculate_self_diffusion_coefficient(MSD, t0)
+    with Trajectory(traj_file) as configs:
+        MSD = calculate_msd_time_origins(configs, t0)
+    self_diffusion_coefficient = fit_self_diffusion_coefficient(MSD,
+                                                                fit_window)
 
     return self_diffusion_coefficient
 
@@ -45,3 +56,57 @@ def calculate_self_diffusion_coefficient(MSD, t0):
     self_diffusion_coefficient = (MSD[-1] - MSD[t0])/(6*t)
 
     return self_diffusion_coefficient
+
+
+def fit_self_diffusion_coefficient(MSD, fit_window=DEFAULT_FIT_WINDOW):
+    """
+    Fit the self diffusion coefficient to the MSD of a range of time lags.
+
+    arguments:
+        MSD: array                - mean square displacement for every time
+                                    lag, e.g. from calculate_msd_time_origins
+                                    or array(F, N) to fit every atom
+        fit_window: (float,float) - first and last time lag to fit, as
+                                    fractions of the longest time lag
+
+    returns:
+        self_diffusion_coefficient - float, or array(N) for every atom
+
+    The Einstein relation MSD = 6Dt only holds at time lags long enough for
+    the motion to be diffusive, and the MSD of the longest lags is averaged
+    over few time origins. The slope is therefore fitted with least squares
+    between the two lags of fit_window, using at least two lags.
+
+    """
+    MSD = np.asarray(MSD, dtype=float)
+    n_lags = len(MSD)
+    if n_lags < 2:
+        # A single frame has no displacement to fit.
+        return 0.0 if MSD.ndim == 1 else np.zeros(MSD.shape[1])
+    start, stop = fit_window
+    if not 0 <= start < stop <= 1:
+        raise ValueError(f'Invalid MSD fit window {fit_window}, it should '
+                         'be two increasing fractions between 0 and 1.')
+    last_lag = n_lags - 1
+    first = min(int(round(start * last_lag)), last_lag - 1)
+    last = max(int(round(stop * last_lag)), first + 1)
+    lags = np.arange(first, last + 1)
+    slope, _ = np.polyfit(lags, MSD[first:last + 1], 1)
+    return slope / 6
+
+
+def parse_fit_window(fit_window):
+    """
+    Read a fit window given as a string of two fractions, e.g. "0.1,0.5".
+
+    arguments:
+        fit_window: str - first and last time lag as fractions
+
+    returns:
+        fit_window: (float, float)
+    """
+    values = [float(x) for x in fit_window.split(',')]
+    if len(values) != 2:
+        raise ValueError(f'Invalid MSD fit window "{fit_window}", it should '
+                         'be two fractions separated by a comma.')
+    return tuple(values)
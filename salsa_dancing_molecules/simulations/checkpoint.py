@@ -0,0 +1,152 @@
+"""Module for checkpointing and restarting simulations.
+
+A checkpoint contains everything needed to continue a simulation from the
+step it was written at: the atoms with their momenta, the step counter of
+the dynamics, the state of the random number generator used by the
+thermostat and the observables collected so far.
+"""
+import os
+import pickle
+import numpy as np
+from ase.io.trajectory import Trajectory
+
+
+def get_checkpoint_path(sim_info):
+    """Get the path of the checkpoint file of a simulation.
+
+    The checkpoint is saved next to the trajectory file, with the file
+    extension replaced with ".checkpoint".
+
+    Args:
+        sim_info: dict - dictionary with information on the simulation.
+    Returns:
+        checkpoint_path: str - path to the checkpoint file.
+    """
+    return os.path.splitext(sim_info["traj_output_path"])[0] + ".checkpoint"
+
+
+def _get_rng_state(rng):
+    """Return the state of a NumPy random number generator or module."""
+    if rng is np.random:
+        return np.random.get_state()
+    if isinstance(rng, np.random.RandomState):
+        return rng.get_state()
+    if isinstance(rng, np.random.Generator):
+        return rng.bit_generator.state
+    return None
+
+
+def _set_rng_state(rng, state):
+    """Restore the state of a NumPy random number generator or module."""
+    if state is None:
+        return
+    if rng is np.random:
+        np.random.set_state(state)
+    elif isinstance(rng, np.random.RandomState):
+        rng.set_state(state)
+    elif isinstance(rng, np.random.Generator):
+        rng.bit_generator.state = state
+
+
+def write_checkpoint(checkpoint_path, atoms, dyn, variables,
+                     traj_interval):
+    """Write a checkpoint of a running simulation.
+
+    The checkpoint is first written to a temporary file which then
+    replaces the old checkpoint, so a simulation killed while writing
+    always leaves a complete checkpoint behind.
+
+    Args:
+        checkpoint_path: str   - path to the checkpoint file.
+        atoms: Atoms           - atoms object of the simulation.
+        dyn: MolecularDynamics - dynamics object running the simulation.
+        variables: Variables   - observables collected so far.
+        traj_interval: int     - number of steps between trajectory frames.
+    """
+    checkpoint_atoms = atoms.copy()
+    checkpoint_atoms.calc = None
+    state = {
+        "atoms": checkpoint_atoms,
+        "step": dyn.nsteps,
+        # Frames are written at step 0 and then every traj_interval steps.
+        "traj_frames": dyn.nsteps // traj_interval + 1,
+        "rng_state": _get_rng_state(getattr(dyn, "rng", None)),
+        "variables": variables.get_state(),
+    }
+    temporary_path = checkpoint_path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        pickle.dump(state, f)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def read_checkpoint(checkpoint_path, atoms):
+    """Read a checkpoint if it exists and belongs to the atoms.
+
+    Args:
+        checkpoint_path: str - path to the checkpoint file.
+        atoms: Atoms         - atoms object of the simulation to resume.
+    Returns:
+        state: dict | None - checkpoint state, or None if there is no
+                             usable checkpoint.
+    """
+    if not os.path.exists(checkpoint_path):
+        return None
+    try:
+        with open(checkpoint_path, "rb") as f:
+            state = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        print(f'Could not read checkpoint {checkpoint_path}: {e}')
+        return None
+
+    # The cell might have been repeated a different number of times when
+    # the checkpoint was written.
+    if (len(state["atoms"]) != len(atoms) or
+            not np.array_equal(state["atoms"].numbers, atoms.numbers)):
+        return None
+    return state
+
+
+def restore_checkpoint(state, atoms, dyn, variables):
+    """Restore a simulation from a checkpoint.
+
+    Args:
+        state: dict            - checkpoint state from read_checkpoint.
+        atoms: Atoms           - atoms object of the simulation.
+        dyn: MolecularDynamics - dynamics object running the simulation.
+        variables: Variables   - observables to restore.
+    """
+    atoms.set_cell(state["atoms"].get_cell())
+    atoms.set_positions(state["atoms"].get_positions())
+    atoms.set_momenta(state["atoms"].get_momenta())
+    dyn.nsteps = state["step"]
+    _set_rng_state(getattr(dyn, "rng", None), state["rng_state"])
+    variables.set_state(state["variables"])
+
+
+def truncate_trajectory(traj_path, n_frames):
+    """Remove trajectory frames written after a checkpoint.
+
+    Args:
+        traj_path: str - path to the trajectory file.
+        n_frames: int  - number of frames to keep.
+    """
+    if not os.path.exists(traj_path):
+        return
+    with Trajectory(traj_path) as configs:
+        if len(configs) <= n_frames:
+            return
+        temporary_path = traj_path + ".tmp"
+        with Trajectory(temporary_path, "w") as truncated:
+            for i in range(n_frames):
+                truncated.write(configs[i])
+    os.replace(temporary_path, traj_path)
+
+
+def remove_checkpoint(checkpoint_path):
+    """Remove the checkpoint of a finished simulation.
+
+    Args:
+        checkpoint_path: str - path to the checkpoint file.
+    """
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
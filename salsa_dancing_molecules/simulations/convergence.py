@@ -0,0 +1,156 @@
+"""Module for stopping simulations once their observables have converged.
+
+A ConvergenceMonitor is attached to the dynamics like the other observers,
+and checks the observables sampled by Variables so far. The simulation has
+converged when the equilibrium has been detected, as by the post
+processing, and the standard error of the time average after it of every
+chosen observable is below a tolerance relative to that average, or below
+an absolute tolerance. The absolute tolerance lets observables that
+average to about zero, like the pressure, converge.
+"""
+import numpy as np
+from ..equilibrium import detect_equilibration_fft
+from ..uncertainty import effective_samples, standard_error
+
+# Observables that can be monitored, and the attributes of Variables they
+# are sampled in.
+OBSERVABLES = {"temperature": "temperatures",
+               "potential-energy": "potential_energies",
+               "kinetic-energy": "kinetic_energies",
+               "pressure": "atomic_pressures"}
+
+# Uncorrelated samples needed after the equilibrium before the standard
+# errors are trusted.
+MIN_EFFECTIVE_SAMPLES = 20
+
+
+def parse_observables(observables):
+    """Parse the observables to monitor from the configuration.
+
+    Args:
+        observables: str - comma separated names of observables.
+    Returns:
+        observables: list(str) - the names.
+    Raises:
+        ValueError - if an observable can not be monitored.
+    """
+    names = [name.strip().lower() for name in observables.split(",")]
+    for name in names:
+        if name not in OBSERVABLES:
+            raise ValueError(f'Invalid convergence observable {name}, it '
+                             f'should be one of {", ".join(OBSERVABLES)}.')
+    return names
+
+
+def parse_absolute_tolerances(tolerances, observables):
+    """Parse the absolute tolerances of the observables from the configuration.
+
+    Args:
+        tolerances: str         - comma separated tolerances, one for every
+                                  observable or one for all of them.
+        observables: list(str)  - names of the observables.
+    Returns:
+        tolerances: list(float) - the tolerance of every observable.
+    Raises:
+        ValueError - if the number of tolerances does not match.
+    """
+    values = [float(value) for value in tolerances.split(",")]
+    if len(values) == 1:
+        return values * len(observables)
+    if len(values) != len(observables):
+        raise ValueError(f'Invalid convergence absolute tolerance '
+                         f'{tolerances}, it should have one value or one '
+                         f'for each of {", ".join(observables)}.')
+    return values
+
+
+class ConvergenceMonitor:
+    """Observer that detects when the observables of a simulation converge.
+
+    Attributes:
+        converged: bool - True once the observables have converged.
+        reason: str     - why the simulation converged, None before.
+    """
+
+    def __init__(self, variables, ensemble, observables, tolerance,
+                 absolute_tolerances=None):
+        """Create a monitor of the samples collected in variables.
+
+        Args:
+            variables: Variables       - samples of the running simulation.
+            ensemble: str              - 'NVE' detects the equilibrium in
+                                         the temperature, 'NVT' in the
+                                         potential energy.
+            observables: list(str)     - names of the observables, see
+                                         OBSERVABLES.
+            tolerance: float           - largest standard error relative
+                                         to the time average.
+            absolute_tolerances: list(float) - largest standard error of
+                                         every observable in its own units,
+                                         accepted even if it is above the
+                                         relative tolerance. Default 0.
+        Raises:
+            ValueError - if the tolerance is not positive or an absolute
+                         tolerance is negative.
+        """
+        if not tolerance > 0:
+            raise ValueError(f'Invalid convergence tolerance {tolerance}, '
+                             'it should be positive.')
+        if absolute_tolerances is None:
+            absolute_tolerances = [0.0] * len(observables)
+        for absolute_tolerance in absolute_tolerances:
+            if not absolute_tolerance >= 0:
+                raise ValueError('Invalid convergence absolute tolerance '
+                                 f'{absolute_tolerance}, it should not be '
+                                 'negative.')
+        self.variables = variables
+        if ensemble.upper() == "NVT":
+            self.equilibrium_observable = "potential-energy"
+        else:
+            self.equilibrium_observable = "temperature"
+        self.observables = observables
+        self.tolerance = tolerance
+        self.absolute_tolerances = absolute_tolerances
+        self.converged = False
+        self.reason = None
+
+    def get_series(self, name):
+        """Return the samples of an observable collected so far."""
+        return np.array(getattr(self.variables, OBSERVABLES[name]),
+                        dtype=float)
+
+    def __call__(self):
+        """Check if the observables have converged."""
+        if self.converged:
+            return
+        series = self.get_series(self.equilibrium_observable)
+        n_samples = len(series)
+        if n_samples < MIN_EFFECTIVE_SAMPLES:
+            return
+        # Same rules as get_equilibrium, the start is skipped and an
+        # equilibrium in the last 10% is not trusted.
+        equilibrium = max(detect_equilibration_fft(series),
+                          int(n_samples * 0.05))
+        if equilibrium > 0.9 * n_samples:
+            return
+        if (effective_samples(series[equilibrium:]) <
+                MIN_EFFECTIVE_SAMPLES):
+            return
+
+        errors = []
+        for name, absolute_tolerance in zip(self.observables,
+                                            self.absolute_tolerances):
+            samples = self.get_series(name)[equilibrium:]
+            mean = abs(samples.mean())
+            error = standard_error(samples)
+            if not error <= max(self.tolerance * mean, absolute_tolerance):
+                return
+            if error <= self.tolerance * mean:
+                errors.append(f'{name} {error / mean:.2%}' if mean > 0 else
+                              f'{name} 0')
+            else:
+                errors.append(f'{name} {error:.3g} absolute')
+        self.converged = True
+        self.reason = (f'converged, standard error of '
+                       f'{", ".join(errors)} after the equilibrium at '
+                       f'sample {equilibrium}')
@@ -5,7 +5,8 @@ from ase.md.verlet import VelocityVerlet
 from ase import units
 from ..variables import Variables
 from ..materialsproject import MatClient
-from ..lennardjonesparse import parse_lj_params
+from ..lennardjonesparse import get_lj_mixing_matrices, warn_single_cutoff
+from ..lennardjones import CellListLennardJones
 
 try:
     from asap3 import Trajectory, AsapError
@@ -82,9 +83,6 @@ def run(atoms, steps, output_path, potential='', use_asap=True):
         use_asap: bool   - Whether to use ASAP3 to calculate the potential.
     """
     # Describe the interatomic interactions with the L-J
-    # FIXME: This Lennard-Jones potential is currently coded for
-    # only pure elements
-
     if potential != 'Lennard-Jones':
         try:
             from ase.calculators.kim import KIM
@@ -95,19 +93,17 @@ def run(atoms, steps, output_path, potential='', use_asap=True):
             potential = 'Lennard-Jones'
 
     if potential == 'Lennard-Jones':
-        element_symbols = atoms.get_chemical_symbols()
-        if len(element_symbols) > 1:
-            print('More than one element was inputted, will use '
-                  f'LJ-parameters for {element_symbols[0]}')
-        element, rc, epsilon, sigma = parse_lj_params(element_symbols[0])
+        elements, rc, epsilon, sigma = get_lj_mixing_matrices(
+            atoms.get_chemical_symbols())
 
         if use_asap:
             from asap3 import LennardJones
-            atoms.calc = LennardJones(element, epsilon, sigma, rCut=rc,
-                                      modified=True)
+            warn_single_cutoff(rc)
+            atoms.calc = LennardJones(elements, epsilon, sigma,
+                                      rCut=rc.max(), modified=True)
         else:
-            from ase.calculators.lj import LennardJones
-            atoms.calc = LennardJones(epsilon=epsilon, sigma=sigma, rc=rc)
+            atoms.calc = CellListLennardJones(epsilon=epsilon, sigma=sigma,
+                                              rc=rc, numbers=elements)
 
     # Set the momenta corresponding to T=300K
     MaxwellBoltzmannDistribution(atoms, temperature_K=40)
@@ -1,16 +1,50 @@
 """Module for running a simulation."""
-from ..lennardjonesparse import parse_lj_params
+from ..lennardjonesparse import get_lj_mixing_matrices, warn_single_cutoff
 from ase.md.velocitydistribution import MaxwellBoltzmannDistribution
 from ase.md.verlet import VelocityVerlet
 from ase.md.langevin import Langevin
 from ase import units
 from ..variables import Variables
+from ..trajectory_data import CSV_INTERVAL, TRAJ_INTERVAL
+from ..lennardjones import CellListLennardJones
+from .checkpoint import (get_checkpoint_path, read_checkpoint,
+                         restore_checkpoint, write_checkpoint,
+                         truncate_trajectory, remove_checkpoint)
+from .convergence import (ConvergenceMonitor, parse_absolute_tolerances,
+                          parse_observables)
 
 try:
     from asap3 import Trajectory
 except ImportError:
     print("asap3 import failed. This should only happen when building docs.")
 
+# Set by request_stop, e.g. from a signal handler, to stop the running
+# simulation at the next timestep.
+_stop_requested = False
+
+
+class SimulationInterrupted(Exception):
+    """Raised when a simulation is stopped before all steps are done."""
+
+
+class SimulationAborted(Exception):
+    """Raised when a simulation is abandoned, e.g. its job lease is lost."""
+
+
+def request_stop():
+    """Request running and future simulations to stop.
+
+    The running simulation writes a checkpoint at the next timestep and
+    raises SimulationInterrupted. Safe to call from a signal handler.
+    """
+    global _stop_requested
+    _stop_requested = True
+
+
+def stop_requested():
+    """Return True if request_stop has been called."""
+    return _stop_requested
+
 
 def choose_potential(potential, sim_info, use_asap, atoms):
     """Set the atoms object's calc attribute.
@@ -19,6 +53,8 @@ def choose_potential(potential, sim_info, use_asap, atoms):
     in the simulation. If openkim does not work, Lennard Jones will be
     used instead. Openkim and Lennard Jones are the only ones implemented
     right now. use_asap is not relevant for openkim, only Lennard Jones.
+    Lennard Jones without asap3 uses the built-in cell list calculator,
+    which can also be chosen directly with "lennard-jones-numpy".
 
     Args:
         potential: string - name of potential to be used.
@@ -39,20 +75,29 @@ def choose_potential(potential, sim_info, use_asap, atoms):
             if use_asap:
                 print("OpenKIM potential used, use-asap "
                       "= True will be ignored.")
+    if potential == "lennard-jones-numpy":
+        if use_asap:
+            print("NumPy Lennard-Jones potential used, use-asap "
+                  "= True will be ignored.")
+        use_asap = False
+        potential = "lennard-jones"
     if potential == "lennard-jones":
-        element_symbols = atoms.get_chemical_symbols()
-        if len(element_symbols) > 1:
-            print('More than one element was inputted, will use '
-                  f'LJ-parameters for {element_symbols[0]}')
-        element, rc, epsilon, sigma = parse_lj_params(element_symbols[0])
+        # Pair parameters for all elements in the material are mixed
+        # with the Lorentz-Berthelot rules.
+        elements, rc, epsilon, sigma = get_lj_mixing_matrices(
+            atoms.get_chemical_symbols())
 
         if use_asap:
+            # asap3 only supports a single cutoff for all pairs.
             from asap3 import LennardJones
-            atoms.calc = LennardJones(element, epsilon, sigma, rCut=rc,
-                                      modified=True)
+            warn_single_cutoff(rc)
+            atoms.calc = LennardJones(elements, epsilon, sigma,
+                                      rCut=rc.max(), modified=True)
         else:
-            from ase.calculators.lj import LennardJones
-            atoms.calc = LennardJones(epsilon=epsilon, sigma=sigma, rc=rc)
+            skin = float(sim_info.get("neighbor-skin", 0.3))
+            atoms.calc = CellListLennardJones(epsilon=epsilon, sigma=sigma,
+                                              rc=rc, skin=skin,
+                                              numbers=elements)
 
 
 def choose_ensemble(ensemble, target_temperature, atoms):
@@ -79,12 +124,20 @@ def choose_ensemble(ensemble, target_temperature, atoms):
     return dyn
 
 
-def run(sim_info, atoms):
+def run(sim_info, atoms, abort=None):
     """Run the simulation.
 
+    The number of steps run and why the simulation stopped are added to
+    sim_info as "steps-done" and "stop-reason", and the steps between the
+    rows of the CSV file and the trajectory frames as "csv-interval" and
+    "traj-interval".
+
     Args:
         sim_info - dictionary with information on the simulation.
         atoms - atoms object to be used.
+        abort - threading.Event or None, when it is set the simulation
+                stops at the next timestep without writing anything more
+                and raises SimulationAborted.
     """
     if "volume-scale" in sim_info:
         scaling = float(sim_info["volume-scale"])
@@ -111,24 +164,89 @@ def run(sim_info, atoms):
                           target_temperature,
                           atoms)
 
-    traj = Trajectory(output_path_traj, "w", atoms)
-    dyn.attach(traj.write, interval=100)
     # Generate different quantatives to save
     Var = Variables()
-    Var.set_timestep(10)
+    Var.set_timestep(CSV_INTERVAL)
+
+    if abort is not None and abort.is_set():
+        raise SimulationAborted('Simulation aborted before it started.')
+
+    # Continue from the last checkpoint if the simulation was interrupted.
+    checkpoint_path = get_checkpoint_path(sim_info)
+    checkpoint = read_checkpoint(checkpoint_path, atoms)
+    if checkpoint is not None:
+        restore_checkpoint(checkpoint, atoms, dyn, Var)
+        truncate_trajectory(output_path_traj, checkpoint["traj_frames"])
+        traj = Trajectory(output_path_traj, "a", atoms)
+        print(f'Resuming simulation from step {dyn.nsteps}.')
+    else:
+        traj = Trajectory(output_path_traj, "w", atoms)
+
+    def check_abort():
+        # Another worker may now be running the same simulation, so stop
+        # before any observer writes to its files.
+        if abort.is_set():
+            raise SimulationAborted('Simulation aborted at step '
+                                    f'{dyn.nsteps}.')
+
+    if abort is not None:
+        dyn.attach(check_abort, interval=1)
+    dyn.attach(traj.write, interval=TRAJ_INTERVAL)
 
     def dynamics(a=atoms):
         # Saves snapshots of the state of system
         Var.Snapshot(a)
         Var.increment_time()
 
-    # Now run the dynamics
-    dyn.attach(dynamics, interval=10)
-    dynamics()
-    dyn.run(int(sim_info["steps"]))
+    # Now run the dynamics, the observers are called at the first step by
+    # the dynamics.
+    dyn.attach(dynamics, interval=CSV_INTERVAL)
+    sim_info["csv-interval"] = str(CSV_INTERVAL)
+    sim_info["traj-interval"] = str(TRAJ_INTERVAL)
+    checkpoint_interval = int(sim_info.get("checkpoint-interval", 1000))
+    if checkpoint_interval > 0:
+        dyn.attach(write_checkpoint, checkpoint_interval,
+                   checkpoint_path, atoms, dyn, Var, TRAJ_INTERVAL)
+
+    def check_stop():
+        # Flush a checkpoint and stop if the worker is being terminated.
+        if _stop_requested:
+            write_checkpoint(checkpoint_path, atoms, dyn, Var, TRAJ_INTERVAL)
+            raise SimulationInterrupted('Simulation stopped at step '
+                                        f'{dyn.nsteps}, checkpoint written '
+                                        f'to {checkpoint_path}.')
+
+    dyn.attach(check_stop, interval=1)
+
+    # Stop before all steps are done if the observables have converged.
+    monitor = None
+    if "convergence-tolerance" in sim_info:
+        observables = parse_observables(
+            sim_info.get("convergence-observables", "temperature"))
+        monitor = ConvergenceMonitor(
+            Var, sim_info["ensemble"], observables,
+            float(sim_info["convergence-tolerance"]),
+            parse_absolute_tolerances(
+                sim_info.get("convergence-absolute-tolerance", "0"),
+                observables))
+        dyn.attach(monitor,
+                   interval=int(sim_info.get("convergence-interval", 1000)))
+    for _ in dyn.irun(int(sim_info["steps"]) - dyn.nsteps):
+        if monitor is not None and monitor.converged:
+            break
+    sim_info["steps-done"] = str(dyn.nsteps)
+    if monitor is not None and monitor.converged:
+        sim_info["stop-reason"] = monitor.reason
+        print(f'Simulation stopped at step {dyn.nsteps}, {monitor.reason}.')
+    else:
+        sim_info["stop-reason"] = "all steps done"
+    if isinstance(atoms.calc, CellListLennardJones) and atoms.calc.nl:
+        print(f'Neighbor list was rebuilt {atoms.calc.nl.nbuilds} times '
+              f'in {atoms.calc.nl.nupdates} force evaluations.')
     # Convert the list to an array with given data types
     Var.list_to_array()
     # Upload the data to file
     Var.generate_file(output_path_csv)
+    remove_checkpoint(checkpoint_path)
     # Simulation is done.
     print('Molecular dynamics simulation is completed.')
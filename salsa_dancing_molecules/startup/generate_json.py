@@ -1,5 +1,13 @@
 """Module converts the configurations into a Json-files."""
 import json
+import os
+from pickle import load
+
+# Rough cost of one timestep per atom for each potential, relative to the
+# ASAP3 Lennard-Jones potential.
+POTENTIAL_COST_FACTORS = {"lennard-jones": 1.0,
+                          "lennard-jones-numpy": 3.0,
+                          "openkim": 4.0}
 
 
 def config_to_configs(config):
@@ -50,16 +58,50 @@ def config_to_configs(config):
     return list_of_json_dicts
 
 
+def estimate_cost(json_dict):
+    """Estimate the relative cost of running a simulation.
+
+    The cost is the number of atoms times repeat cubed times the number of
+    steps times a factor for the potential. It is only used to run the
+    most expensive simulations first.
+
+    Args:
+        json_dict - dictionary describing a single simulation, with the
+                    path to the material pickle.
+    Returns:
+        cost - estimated cost of the simulation.
+    """
+    n_atoms = 1
+    if os.path.exists(json_dict["material"]):
+        with open(json_dict["material"], "rb") as f:
+            n_atoms = len(load(f))
+    repeat = max(1, int(json_dict.get("repeat", 1)))
+    steps = int(json_dict.get("steps", 1))
+
+    potential = json_dict.get("potential", "lennard-jones").lower().strip()
+    if (potential == "lennard-jones" and
+            json_dict.get("use-asap", "True") == "False"):
+        potential = "lennard-jones-numpy"
+    factor = POTENTIAL_COST_FACTORS.get(potential, 1.0)
+
+    return n_atoms * repeat**3 * steps * factor
+
+
 def convert_to_json(config):
     """Generate a json file for each configuration set.
 
     The function takes in a dictionary to be used as a template
     describing the different types of simulations to be run.
     Then, multiple json files are generated, one for each specific simulation.
+    The estimated cost of each simulation is stored with the key "cost".
     Args:
         config - dictionary to be used as template.
+    Returns:
+        job_costs - dictionary with the names of the generated json files
+                    as keys and the estimated costs as values.
     """
     list_of_dicts = config_to_configs(config)
+    job_costs = {}
     for json_dict in list_of_dicts:
         name_string = ""
         for key, value in json_dict.items():
@@ -78,7 +120,11 @@ def convert_to_json(config):
                                         "/output/csv/" +
                                         name_string +
                                         ".csv")
+        cost = estimate_cost(json_dict)
+        json_dict["cost"] = str(cost)
         with open(json_dict["workspace_path"] +
                   "/unbegun_simulations/" +
                   name_string+".json", "w") as outfile:
             json.dump(json_dict, outfile)
+        job_costs[name_string+".json"] = cost
+    return job_costs
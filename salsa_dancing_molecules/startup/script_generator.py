@@ -28,6 +28,7 @@ def create_sbatch(job, use_devel, exclusive, time, nodes, cores, work_path):
         f"#SBATCH -t {time}\n"
         f"#SBATCH -N {nodes}\n"
         f"#SBATCH -n {cores}\n"
+        "#SBATCH --signal=TERM@120\n"
         f"{exclusive_str}"
         "#\n"
         "export NSC_MODULE_SILENT=1\n"
@@ -4,6 +4,8 @@ from .use_custom_materials import materials_to_pickles
 from .config_module import read_configuration
 from .generate_json import convert_to_json
 from .script_generator import create_sbatch
+from ..worker_process.job_queue import (JobQueue, get_job_queue_path,
+                                        write_job_costs)
 from ..materialsproject import prepare_materials as mp_prepare_materials
 import os
 import sys
@@ -17,7 +19,10 @@ def start(args):
         - A finshed directory will be created, if it does not exist.
         - Materials section in configuration file creates pickle files of
           those atoms.
-        - Json files are created for each configuration set.
+        - Json files are created for each configuration set, and their
+          estimated costs are written to a manifest in the workspace.
+        - If requested, the jobs are added to a job database in the
+          workspace, which the workers then claim jobs from.
 
     Args:
         args - argument object from argparse.
@@ -76,7 +81,12 @@ def start(args):
                                                       material_names))
             simulation_conf['material'].extend(downloaded_materials)
 
-        convert_to_json(simulation_conf)
+        job_costs = convert_to_json(simulation_conf)
+        write_job_costs(work_path, job_costs)
+
+        if args.job_db:
+            with JobQueue(get_job_queue_path(work_path)) as queue:
+                queue.add_jobs(list(job_costs), list(job_costs.values()))
     job = args.job if args.job else "error"
     use_devel = args.use_devel
     time = args.time if args.time else "error"
@@ -0,0 +1,696 @@
+"""Module for reading a trajectory into NumPy arrays in a single pass.
+
+Every frame read from a trajectory file is decoded into a full atoms
+object. Instead of iterating over the trajectory once per analysis, the
+post simulation calculations read it once into a TrajectoryData bundle
+holding one array per quantity. The analysis functions accept either a
+bundle or a trajectory, and the get_* functions below extract a quantity
+from both. Analyses that only need the energies, volumes and temperatures
+can use read_trajectory_series, which skips the positions entirely.
+
+load_trajectory_data also saves the arrays as .npy files in a sidecar
+directory next to the trajectory. Later analyses of the same trajectory
+memory map those files instead of decoding the trajectory again. The
+sidecar is only used while the size and modification time of the
+trajectory are the ones it was written for. The positions and momenta are
+written to the sidecar frame by frame while the trajectory is read, so
+they never have to fit in memory. A sidecar is written to a temporary
+directory that then replaces the old one, so the arrays that other
+processes have memory mapped are never overwritten. If the sidecar cannot
+be written and the positions and momenta would need more memory than
+allowed, load_trajectory_data returns a TrajectoryFrames bundle instead,
+whose positions are read from the trajectory when needed.
+
+Series derived from a trajectory by the analyses, e.g. its mean square
+displacement, are saved with save_derived_series in a file next to it, so
+that later analyses can reuse them without reading the trajectory.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from ase import units
+from ase.data import atomic_masses
+from ase.io import ulm
+from ase.io.trajectory import Trajectory
+
+
+class TrajectorySeries:
+    """Arrays of the quantities of all frames that are not per atom.
+
+    F is the number of frames and N the number of atoms.
+
+    Attributes:
+        numbers: array(N)            - atomic numbers
+        masses: array(N)             - atomic masses (u)
+        pbc: array(3)                - periodic boundary conditions
+        cell: array(F, 3, 3)         - lattice vectors as rows (Å)
+        volume: array(F)             - cell volume (Å^3)
+        potential_energy: array(F)   - potential energy (eV)
+        kinetic_energy: array(F)     - kinetic energy (eV)
+        total_energy: array(F)       - total energy (eV)
+        temperature: array(F)        - temperature (K)
+    """
+
+    def __init__(self, numbers, masses, pbc, cell, volume, potential_energy,
+                 kinetic_energy, temperature):
+        """Create a bundle from arrays, see the class for the arguments."""
+        self.numbers = np.asarray(numbers)
+        self.masses = np.asarray(masses, dtype=float)
+        self.pbc = np.asarray(pbc, dtype=bool)
+        self.cell = np.asarray(cell, dtype=float)
+        self.volume = np.asarray(volume, dtype=float)
+        self.potential_energy = np.asarray(potential_energy, dtype=float)
+        self.kinetic_energy = np.asarray(kinetic_energy, dtype=float)
+        self.total_energy = self.potential_energy + self.kinetic_energy
+        self.temperature = np.asarray(temperature, dtype=float)
+
+    def __len__(self):
+        """Return the number of frames."""
+        return len(self.volume)
+
+    @property
+    def n_atoms(self):
+        """Number of atoms in every frame."""
+        return len(self.numbers)
+
+
+class TrajectoryData(TrajectorySeries):
+    """Columnar arrays of all frames in a trajectory.
+
+    Attributes:
+        positions: array(F, N, 3)    - atom positions (Å)
+        momenta: array(F, N, 3)      - atom momenta
+
+    and those of TrajectorySeries.
+    """
+
+    def __init__(self, numbers, masses, pbc, positions, momenta, cell,
+                 volume, potential_energy, kinetic_energy, temperature):
+        """Create a bundle from arrays, see the class for the arguments."""
+        TrajectorySeries.__init__(self, numbers, masses, pbc, cell, volume,
+                                  potential_energy, kinetic_energy,
+                                  temperature)
+        self.positions = np.asarray(positions, dtype=float)
+        self.momenta = np.asarray(momenta, dtype=float)
+
+
+class TrajectoryFrames(TrajectorySeries):
+    """The series of a trajectory whose positions stay in the file.
+
+    The positions are read from the trajectory by get_all_positions and
+    get_positions_block, one frame at a time.
+
+    Attributes:
+        traj_path: str - path to the trajectory file
+
+    and those of TrajectorySeries.
+    """
+
+    def __init__(self, traj_path, series):
+        """Create a bundle from the series read from the trajectory."""
+        TrajectorySeries.__init__(self, series.numbers, series.masses,
+                                  series.pbc, series.cell, series.volume,
+                                  series.potential_energy,
+                                  series.kinetic_energy, series.temperature)
+        self.traj_path = traj_path
+
+
+def _empty_array(sidecar_path, name, shape):
+    """Allocate an array in memory or as a .npy file in the sidecar."""
+    if sidecar_path is None:
+        return np.empty(shape)
+    return np.lib.format.open_memmap(
+        os.path.join(sidecar_path, name + '.npy'), mode='w+',
+        dtype=float, shape=shape)
+
+
+def read_trajectory_data(traj_path, sidecar_path=None):
+    """Read a trajectory file into a TrajectoryData bundle.
+
+    The file is read frame by frame, and every frame is only decoded once.
+
+    arguments:
+        traj_path: str           - path to the trajectory file
+        sidecar_path: str | None - directory to write the positions and
+                                   momenta to while reading, instead of
+                                   keeping them in memory
+
+    returns:
+        data: TrajectoryData - arrays of all frames in the trajectory
+    """
+    with Trajectory(traj_path) as configs:
+        n_frames = len(configs)
+        first = configs[0]
+        n_atoms = len(first)
+        positions = _empty_array(sidecar_path, 'positions',
+                                 (n_frames, n_atoms, 3))
+        momenta = _empty_array(sidecar_path, 'momenta',
+                               (n_frames, n_atoms, 3))
+        cell = np.empty((n_frames, 3, 3))
+        volume = np.empty(n_frames)
+        potential_energy = np.empty(n_frames)
+        kinetic_energy = np.empty(n_frames)
+        temperature = np.empty(n_frames)
+
+        for i, atoms in enumerate(configs):
+            positions[i] = atoms.get_positions()
+            momenta[i] = atoms.get_momenta()
+            cell[i] = atoms.get_cell()
+            # Clusters have no volume.
+            volume[i] = abs(np.linalg.det(cell[i]))
+            potential_energy[i] = atoms.get_potential_energy()
+            kinetic_energy[i] = atoms.get_kinetic_energy()
+            temperature[i] = atoms.get_temperature()
+
+    if sidecar_path is not None:
+        positions.flush()
+        momenta.flush()
+    return TrajectoryData(first.get_atomic_numbers(), first.get_masses(),
+                          first.get_pbc(), positions, momenta, cell, volume,
+                          potential_energy, kinetic_energy, temperature)
+
+
+def read_trajectory_series(traj_path):
+    """Read the quantities that are not per atom from a trajectory file.
+
+    The frames are read straight from the file format, without creating
+    atoms objects or reading the positions. The kinetic energy and
+    temperature are calculated from the momenta like ASE does. Trajectories
+    with constraints, which change the degrees of freedom, are read with
+    read_trajectory_data instead.
+
+    arguments:
+        traj_path: str - path to the trajectory file
+
+    returns:
+        series: TrajectorySeries - arrays of all frames in the trajectory
+    """
+    with ulm.open(traj_path) as backend:
+        if backend.get('constraints', '[]') != '[]':
+            data = read_trajectory_data(traj_path)
+            return TrajectorySeries(data.numbers, data.masses, data.pbc,
+                                    data.cell, data.volume,
+                                    data.potential_energy,
+                                    data.kinetic_energy, data.temperature)
+        n_frames = len(backend)
+        numbers = backend.numbers
+        masses = backend.get('masses')
+        if masses is None:
+            masses = atomic_masses[numbers]
+        pbc = backend.pbc
+        cell = np.empty((n_frames, 3, 3))
+        potential_energy = np.empty(n_frames)
+        kinetic_energy = np.zeros(n_frames)
+
+        for i in range(n_frames):
+            frame = backend[i]
+            cell[i] = frame.cell
+            potential_energy[i] = frame.calculator.energy
+            momenta = frame.get('momenta')
+            if momenta is not None:
+                kinetic_energy[i] = 0.5 * np.sum(momenta ** 2 /
+                                                 masses[:, None])
+
+    volume = np.abs(np.linalg.det(cell))
+    temperature = kinetic_energy / (1.5 * len(numbers) * units.kB)
+    return TrajectorySeries(numbers, masses, pbc, cell, volume,
+                            potential_energy, kinetic_energy, temperature)
+
+
+# Arrays stored in the sidecar, in the argument order of TrajectoryData.
+_SIDECAR_ARRAYS = ['numbers', 'masses', 'pbc', 'positions', 'momenta',
+                   'cell', 'volume', 'potential_energy', 'kinetic_energy',
+                   'temperature']
+# Arrays written to the sidecar while the trajectory is read.
+_STREAMED_ARRAYS = ['positions', 'momenta']
+_SIDECAR_VERSION = 1
+
+
+def get_sidecar_path(traj_path):
+    """Get the path of the array sidecar directory of a trajectory.
+
+    arguments:
+        traj_path: str - path to the trajectory file
+
+    returns:
+        sidecar_path: str - path to the sidecar directory
+    """
+    return os.path.splitext(traj_path)[0] + '.arrays'
+
+
+def _trajectory_key(traj_path):
+    """Return what identifies the contents of a trajectory file."""
+    stat = os.stat(traj_path)
+    return {'version': _SIDECAR_VERSION, 'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_sidecar(traj_path):
+    """Memory map the sidecar arrays if they belong to the trajectory."""
+    sidecar_path = get_sidecar_path(traj_path)
+    try:
+        with open(os.path.join(sidecar_path, 'key.json')) as f:
+            key = json.load(f)
+        if key != _trajectory_key(traj_path):
+            return None
+        arrays = [np.load(os.path.join(sidecar_path, name + '.npy'),
+                          mmap_mode='r')
+                  for name in _SIDECAR_ARRAYS]
+    except (OSError, ValueError):
+        return None
+    return TrajectoryData(*arrays)
+
+
+def _replace_directory(source, destination):
+    """Move a directory to destination, replacing a directory there.
+
+    The old directory is moved away and then removed, so its files are
+    unlinked rather than overwritten. If another process puts its own
+    directory in place first, that one is kept.
+    """
+    try:
+        os.rename(source, destination)
+        return
+    except OSError:
+        # The destination exists and is not empty.
+        pass
+    parent, name = os.path.split(destination)
+    old_path = tempfile.mkdtemp(prefix=f'.{name}.old.', dir=parent or '.')
+    try:
+        os.rename(destination, old_path)
+        os.rename(source, destination)
+    except OSError:
+        pass
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def _write_sidecar(traj_path):
+    """Read a trajectory into the arrays of a new sidecar directory.
+
+    The arrays are written to a temporary directory next to the sidecar,
+    with the key written last, and the directory then replaces the sidecar.
+
+    returns:
+        data: TrajectoryData | None - the memory mapped arrays, or None if
+                                      the trajectory changed while read
+    """
+    sidecar_path = get_sidecar_path(traj_path)
+    parent, name = os.path.split(sidecar_path)
+    key = _trajectory_key(traj_path)
+    temporary_path = tempfile.mkdtemp(prefix=f'.{name}.', dir=parent or '.')
+    try:
+        data = read_trajectory_data(traj_path, temporary_path)
+        for name in _SIDECAR_ARRAYS:
+            if name not in _STREAMED_ARRAYS:
+                np.save(os.path.join(temporary_path, name + '.npy'),
+                        getattr(data, name))
+        with open(os.path.join(temporary_path, 'key.json'), 'w') as f:
+            json.dump(key, f)
+        del data
+        _replace_directory(temporary_path, sidecar_path)
+    finally:
+        shutil.rmtree(temporary_path, ignore_errors=True)
+    return _read_sidecar(traj_path)
+
+
+def load_trajectory_data(traj_path, cache=True, memory_limit=None):
+    """Load the arrays of a trajectory, from its sidecar if possible.
+
+    Without a sidecar, the positions and momenta are read into memory if
+    they fit in memory_limit, and are otherwise left in the trajectory.
+
+    arguments:
+        traj_path: str    - path to the trajectory file
+        cache: bool       - use and write the sidecar of the trajectory
+        memory_limit: int - bytes the positions and momenta may use when
+                            read into memory, default no limit
+
+    returns:
+        data: TrajectoryData | TrajectoryFrames - arrays of all frames in
+                               the trajectory, the arrays are read-only
+                               when memory mapped
+    """
+    if cache:
+        data = _read_sidecar(traj_path)
+        if data is None:
+            try:
+                data = _write_sidecar(traj_path)
+            except OSError as e:
+                print(f'Could not write array sidecar of {traj_path}: {e}')
+        if data is not None:
+            return data
+    if memory_limit is not None:
+        with ulm.open(traj_path) as backend:
+            n_values = len(backend) * len(backend.numbers) * 3
+        if len(_STREAMED_ARRAYS) * n_values * 8 > memory_limit:
+            return TrajectoryFrames(traj_path,
+                                    read_trajectory_series(traj_path))
+    return read_trajectory_data(traj_path)
+
+
+def load_trajectory_series(traj_path):
+    """Load the quantities that are not per atom of a trajectory.
+
+    The memory mapped sidecar is used if it is up to date, otherwise the
+    trajectory is read with read_trajectory_series.
+
+    arguments:
+        traj_path: str - path to the trajectory file
+
+    returns:
+        series: TrajectorySeries - arrays of all frames in the trajectory
+    """
+    data = _read_sidecar(traj_path)
+    if data is not None:
+        return data
+    return read_trajectory_series(traj_path)
+
+
+# Columns of the CSV file written by the simulations, the energies are per
+# atom.
+CSV_COLUMNS = {'potential_energy': 'Potential Energy (eV)',
+               'kinetic_energy': 'Kinetic Energy (eV)',
+               'temperature': 'Temperature (K)'}
+# Steps between the rows of the CSV file and between the frames of the
+# trajectory written by the simulations, both start at the first step.
+CSV_INTERVAL = 10
+TRAJ_INTERVAL = 100
+ROWS_PER_FRAME = TRAJ_INTERVAL // CSV_INTERVAL
+
+
+def get_csv_layout(sim_info):
+    """Get how the CSV file of a simulation is sampled.
+
+    The simulations record their sampling intervals in the simulation
+    information. Those that did not used the default intervals, and wrote
+    the row of the first step twice.
+
+    arguments:
+        sim_info: dict - simulation information, e.g. from a done json-file
+
+    returns:
+        rows_per_frame: int - CSV rows per trajectory frame
+        first_row: int      - row of the first step, without the header
+    """
+    if 'csv-interval' not in sim_info:
+        return ROWS_PER_FRAME, 1
+    return (int(sim_info['traj-interval']) // int(sim_info['csv-interval']),
+            0)
+
+
+def get_frame_of_row(row, rows_per_frame, n_frames):
+    """Get the first trajectory frame sampled at or after a CSV row.
+
+    arguments:
+        row: int            - row of the CSV file, from the first step
+        rows_per_frame: int - CSV rows per trajectory frame
+        n_frames: int       - number of frames in the trajectory
+
+    returns:
+        frame: int - frame of the trajectory
+    """
+    return min(-(-row // rows_per_frame), n_frames - 1)
+
+
+def read_csv_series(csv_path, configs, rows_per_frame=ROWS_PER_FRAME,
+                    first_row=0):
+    """Read the series sampled into the CSV file of a simulation.
+
+    The simulations sample the energies and temperature more often than
+    they write the trajectory. The CSV file is parsed in one call, and the
+    quantities it does not hold, the atoms and the cell, are taken from
+    the last trajectory frame at or before each row.
+
+    arguments:
+        csv_path: str             - path to the CSV file
+        configs: TrajectorySeries - frames of the trajectory of the same
+                                    simulation
+        rows_per_frame: int       - CSV rows per trajectory frame
+        first_row: int            - row of the first step, the rows before
+                                    it are skipped, see get_csv_layout
+
+    returns:
+        series: TrajectorySeries - arrays of the rows from the first step
+    """
+    with open(csv_path) as f:
+        header = f.readline().strip().split(',')
+        try:
+            columns = [header.index(CSV_COLUMNS[name])
+                       for name in ['potential_energy', 'kinetic_energy',
+                                    'temperature']]
+        except ValueError:
+            raise ValueError(f'{csv_path} does not have the columns '
+                             f'{list(CSV_COLUMNS.values())}')
+        rows = np.loadtxt(f, delimiter=',', usecols=columns, ndmin=2,
+                          skiprows=first_row)
+    frames = np.minimum(np.arange(len(rows)) // rows_per_frame,
+                        len(configs) - 1)
+    n_atoms = get_number_of_atoms(configs)
+    return TrajectorySeries(configs.numbers, configs.masses, configs.pbc,
+                            configs.cell[frames], configs.volume[frames],
+                            rows[:, 0] * n_atoms, rows[:, 1] * n_atoms,
+                            rows[:, 2])
+
+
+def get_derived_series_path(traj_path):
+    """Get the path of the file with the derived series of a trajectory.
+
+    arguments:
+        traj_path: str - path to the trajectory file
+
+    returns:
+        series_path: str - path to the .npz file
+    """
+    return os.path.splitext(traj_path)[0] + '.series.npz'
+
+
+def load_derived_series(traj_path):
+    """Load the derived series saved for a trajectory.
+
+    arguments:
+        traj_path: str - path to the trajectory file
+
+    returns:
+        series: dict | None - arrays by name, or None if there are none or
+                              the trajectory has changed since
+    """
+    try:
+        with np.load(get_derived_series_path(traj_path)) as f:
+            series = dict(f)
+        key = _trajectory_key(traj_path)
+    except (OSError, ValueError):
+        return None
+    for name, value in key.items():
+        if series.pop('key_' + name, None) != value:
+            return None
+    return series
+
+
+def save_derived_series(traj_path, **series):
+    """Save derived series of a trajectory.
+
+    The series are added to those already saved for the trajectory, and
+    replace series with the same names. Processes saving series of the same
+    trajectory take turns with a lock on a file next to it, so none of the
+    series are lost. The file is written to a temporary file of each
+    process first, so a partly written file is never read.
+
+    arguments:
+        traj_path: str  - path to the trajectory file
+        series: arrays  - arrays to save by name
+    """
+    series_path = get_derived_series_path(traj_path)
+    base_path = series_path[:-len('.npz')]
+    with open(base_path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        saved = load_derived_series(traj_path) or {}
+        saved.update(series)
+        for name, value in _trajectory_key(traj_path).items():
+            saved['key_' + name] = value
+        fd, temporary_path = tempfile.mkstemp(
+            prefix=os.path.basename(base_path) + '.', suffix='.npz',
+            dir=os.path.dirname(series_path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **saved)
+            os.replace(temporary_path, series_path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+
+def get_temperatures(configs):
+    """Return the temperature of every frame.
+
+    arguments:
+        configs: TrajectorySeries or Trajectory - frames to read
+
+    returns:
+        temperatures: array or list - temperature of every frame
+    """
+    if isinstance(configs, TrajectorySeries):
+        return configs.temperature
+    return [atoms.get_temperature() for atoms in configs]
+
+
+def get_potential_energies(configs):
+    """Return the potential energy of every frame.
+
+    arguments:
+        configs: TrajectorySeries or Trajectory - frames to read
+
+    returns:
+        energies: array or list - potential energy of every frame
+    """
+    if isinstance(configs, TrajectorySeries):
+        return configs.potential_energy
+    return [atoms.get_potential_energy() for atoms in configs]
+
+
+def get_kinetic_energies(configs):
+    """Return the kinetic energy of every frame.
+
+    arguments:
+        configs: TrajectorySeries or Trajectory - frames to read
+
+    returns:
+        energies: array or list - kinetic energy of every frame
+    """
+    if isinstance(configs, TrajectorySeries):
+        return configs.kinetic_energy
+    return [atoms.get_kinetic_energy() for atoms in configs]
+
+
+def get_total_energies(configs):
+    """Return the total energy of every frame.
+
+    arguments:
+        configs: TrajectorySeries or Trajectory - frames to read
+
+    returns:
+        energies: array or list - total energy of every frame
+    """
+    if isinstance(configs, TrajectorySeries):
+        return configs.total_energy
+    return [atoms.get_total_energy() for atoms in configs]
+
+
+def get_volumes(configs):
+    """Return the cell volume of every frame.
+
+    arguments:
+        configs: TrajectorySeries or Trajectory - frames to read
+
+    returns:
+        volumes: array or list - cell volume of every frame
+    """
+    if isinstance(configs, TrajectorySeries):
+        return configs.volume
+    return [atoms.get_volume() for atoms in configs]
+
+
+def get_all_positions(configs):
+    """Return the atom positions of every frame.
+
+    arguments:
+        configs: TrajectoryData, TrajectoryFrames or Trajectory
+                 - frames to read
+
+    returns:
+        positions: array(F, N, 3) - atom positions of every frame
+    """
+    if isinstance(configs, TrajectoryFrames):
+        with Trajectory(configs.traj_path) as trajectory:
+            return get_all_positions(trajectory)
+    if isinstance(configs, TrajectoryData):
+        return configs.positions.copy()
+    return np.array([atoms.get_positions() for atoms in configs])
+
+
+def get_positions_block(configs, frames, atoms=slice(None)):
+    """Return the positions of a block of atoms in a block of frames.
+
+    Only the block is read into memory when the positions are memory
+    mapped. A trajectory is decoded frame by frame.
+
+    arguments:
+        configs: TrajectoryData, TrajectoryFrames or Trajectory
+                              - frames to read
+        frames: slice         - frames of the block
+        atoms: slice          - atoms of the block
+
+    returns:
+        positions: array(F, N, 3) - atom positions of the block
+    """
+    if isinstance(configs, TrajectoryFrames):
+        with Trajectory(configs.traj_path) as trajectory:
+            return get_positions_block(trajectory, frames, atoms)
+    if isinstance(configs, TrajectoryData):
+        return np.array(configs.positions[frames, atoms])
+    return np.array([np.asarray(configs[i].get_positions(),
+                                dtype=float)[atoms]
+                     for i in range(*frames.indices(len(configs)))])
+
+
+def get_cells(configs):
+    """Return the lattice vectors of every frame.
+
+    arguments:
+        configs: TrajectorySeries or Trajectory - frames to read
+
+    returns:
+        cells: array(F, 3, 3) - lattice vectors as rows of every frame
+    """
+    if isinstance(configs, TrajectorySeries):
+        return configs.cell
+    return np.array([np.asarray(atoms.get_cell(), dtype=float)
+                     for atoms in configs])
+
+
+def get_pbc(configs):
+    """Return the periodic boundary conditions.
+
+    arguments:
+        configs: TrajectorySeries or Trajectory - frames to read
+
+    returns:
+        pbc: array(3) - True for periodic directions
+    """
+    if isinstance(configs, TrajectorySeries):
+        return configs.pbc
+    return np.broadcast_to(np.asarray(configs[0].get_pbc(), dtype=bool),
+                           (3,))
+
+
+def get_masses(configs, frame=0):
+    """Return the atomic masses of a frame.
+
+    arguments:
+        configs: TrajectorySeries or Trajectory - frames to read
+        frame: int                              - index of the frame
+
+    returns:
+        masses: array or list - mass of every atom (u)
+    """
+    if isinstance(configs, TrajectorySeries):
+        return configs.masses
+    return configs[frame].get_masses()
+
+
+def get_number_of_atoms(configs, frame=0):
+    """Return the number of atoms of a frame.
+
+    arguments:
+        configs: TrajectorySeries or Trajectory - frames to read
+        frame: int                              - index of the frame
+
+    returns:
+        n_atoms: int - number of atoms
+    """
+    if isinstance(configs, TrajectorySeries):
+        return configs.n_atoms
+    return len(configs[frame])
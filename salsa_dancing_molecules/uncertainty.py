@@ -0,0 +1,234 @@
+"""Module for the statistical uncertainty of time averages.
+
+Successive samples of a molecular dynamics simulation are correlated, so a
+time series of n samples holds fewer independent ones. The number of
+effective samples is n/g, where g is the statistical inefficiency of the
+series, calculated from its autocorrelation with an FFT. The standard
+error of the mean follows from the variance and the effective samples.
+
+The Flyvbjerg-Petersen blocking method gives the standard error without
+the autocorrelation. The series is repeatedly halved by averaging pairs of
+neighbouring samples, until the samples are uncorrelated and the estimated
+error stops growing.
+
+Quantities that are not a mean of a series, like a heat capacity from the
+fluctuations of the energy, get their standard error by a jackknife over
+blocks longer than the correlation time. Series too short for two such
+blocks instead use the blocking method on the quantity linearised around
+the means.
+"""
+
+import numpy as np
+from .equilibrium import statistical_inefficiency_fft
+
+# Length of the jackknife blocks, in statistical inefficiencies.
+JACKKNIFE_BLOCK_INEFFICIENCIES = 5
+
+
+def statistical_inefficiency(series):
+    """
+    Calculate the statistical inefficiency of a series.
+
+    Input:
+        series: array - the series
+
+    Output:
+        g: float - statistical inefficiency, 1 for a constant series or one
+                   of less than 3 samples
+    """
+    series = np.asarray(series, dtype=np.float64)
+    if len(series) < 3:
+        return 1.0
+    g = statistical_inefficiency_fft(series)
+    return 1.0 if g is None else g
+
+
+def effective_samples(series):
+    """
+    Calculate the number of uncorrelated samples in a series.
+
+    Input:
+        series: array - the series
+
+    Output:
+        n_eff: float - number of samples divided by the statistical
+                       inefficiency
+    """
+    return len(series) / statistical_inefficiency(series)
+
+
+def standard_error(series):
+    """
+    Calculate the standard error of the mean of a correlated series.
+
+    Input:
+        series: array - the series
+
+    Output:
+        error: float - standard error of the mean, NaN for an empty series
+    """
+    series = np.asarray(series, dtype=np.float64)
+    if len(series) == 0:
+        return np.nan
+    return np.sqrt(series.var() / effective_samples(series))
+
+
+def independent_standard_error(samples):
+    """
+    Calculate the standard error of the mean of independent samples.
+
+    Input:
+        samples: array - the samples, e.g. a quantity of every atom
+
+    Output:
+        error: float - standard error of the mean, NaN for less than two
+                       samples
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if len(samples) < 2:
+        return np.nan
+    return samples.std(ddof=1) / np.sqrt(len(samples))
+
+
+def blocking(series):
+    """
+    Estimate the standard error of the mean at every blocking level.
+
+    Level 0 is the series itself, and every following level averages pairs
+    of samples of the previous one, dropping the last sample if the number
+    of samples is odd. The estimates of a level are only unbiased once its
+    samples are uncorrelated.
+
+    Input:
+        series: array - the series
+
+    Output:
+        errors: array       - estimated standard error at every level with
+                              at least two samples
+        error_errors: array - standard error of each estimate
+    """
+    samples = np.asarray(series, dtype=np.float64)
+    errors = []
+    error_errors = []
+    while len(samples) >= 2:
+        n = len(samples)
+        error = np.sqrt(samples.var() / (n - 1))
+        errors.append(error)
+        error_errors.append(error / np.sqrt(2 * (n - 1)))
+        samples = 0.5 * (samples[0:n - 1:2] + samples[1:n:2])
+    return np.array(errors), np.array(error_errors)
+
+
+def blocking_standard_error(series):
+    """
+    Calculate the standard error of the mean with the blocking method.
+
+    The error is taken at the first level where it has stopped growing,
+    i.e. where no later level estimates an error larger by more than the
+    uncertainty of that estimate.
+
+    Input:
+        series: array - the series
+
+    Output:
+        error: float - standard error of the mean, NaN for less than two
+                       samples
+    """
+    errors, error_errors = blocking(series)
+    if len(errors) == 0:
+        return np.nan
+    # The largest estimate, less its uncertainty, after every level.
+    lower = np.maximum.accumulate((errors - error_errors)[::-1])[::-1]
+    later = np.append(lower[1:], -np.inf)
+    level = np.nonzero(errors >= later)[0][0]
+    return errors[level]
+
+
+def jackknife_standard_error(estimator, *series, block_length=None):
+    """
+    Calculate the standard error of a function of the means of series.
+
+    The series are split into blocks, and the estimator is evaluated on
+    the means with each block left out in turn. The samples before the
+    first whole block, counted from the end, are not used.
+
+    Input:
+        estimator: function - takes the means of the series, as arrays of
+                              the same length, and returns the quantity for
+                              each of them
+        series: array       - series of the same length
+        block_length: int   - samples per block, default a few statistical
+                              inefficiencies of the most correlated series
+
+    Output:
+        error: float - standard error of the quantity, NaN for less than two
+                       blocks
+    """
+    series = [np.asarray(s, dtype=np.float64) for s in series]
+    n = len(series[0])
+    if block_length is None:
+        g = max(statistical_inefficiency(s) for s in series)
+        block_length = int(np.ceil(JACKKNIFE_BLOCK_INEFFICIENCIES * g))
+    n_blocks = n // block_length
+    if n_blocks < 2:
+        return np.nan
+    n_used = n_blocks * block_length
+    means = []
+    for s in series:
+        block_sums = s[n - n_used:].reshape(n_blocks, block_length).sum(1)
+        means.append((block_sums.sum() - block_sums) /
+                     (n_used - block_length))
+    values = np.asarray(estimator(*means), dtype=np.float64)
+    return np.sqrt((n_blocks - 1) / n_blocks *
+                   np.sum((values - values.mean()) ** 2))
+
+
+def linearised_blocking_standard_error(estimator, *series):
+    """
+    Calculate the standard error of a function of means by blocking.
+
+    The estimator is linearised around the means of the series with central
+    differences, and the standard error is that of the mean of the
+    linearised series, see blocking_standard_error.
+
+    Input:
+        estimator: function - takes the means of the series, as arrays of
+                              the same length, and returns the quantity for
+                              each of them
+        series: array       - series of the same length
+
+    Output:
+        error: float - standard error of the quantity, NaN for less than two
+                       samples
+    """
+    series = [np.asarray(s, dtype=np.float64) for s in series]
+    if len(series[0]) < 2:
+        return np.nan
+    means = np.array([s.mean() for s in series])
+    steps = 1e-6 * np.where(means != 0, np.abs(means), 1.0)
+    # Every series is shifted up and then down, one at a time.
+    shifts = np.hstack([np.diag(steps), -np.diag(steps)])
+    values = np.asarray(estimator(*(means[:, np.newaxis] + shifts)),
+                        dtype=np.float64)
+    gradient = (values[:len(series)] - values[len(series):]) / (2 * steps)
+    return blocking_standard_error(sum(g * s for g, s in zip(gradient,
+                                                             series)))
+
+
+def function_standard_error(estimator, *series):
+    """
+    Calculate the standard error of a function of the means of series.
+
+    Input:
+        estimator: function - see jackknife_standard_error
+        series: array       - series of the same length
+
+    Output:
+        error: float - the jackknife standard error, or the linearised
+                       blocking one if there are less than two jackknife
+                       blocks
+    """
+    error = jackknife_standard_error(estimator, *series)
+    if np.isnan(error):
+        return linearised_blocking_standard_error(estimator, *series)
+    return error
@@ -15,3 +15,14 @@ def test_average():
                 5.142857142857143, 5.25, 5.333333333333333,
                 5.4, 5.454545454545454]
     assert result == pytest.approx(expected, 0.0001)
+
+
+def test_average_variance():
+    """Test the running variance against the variance of each interval."""
+    t0 = 3
+    array = np.random.RandomState(0).normal(1e6, 2.0, 200)
+    mean, variance = average(t0, array, variance=True)
+    expected_mean = [np.mean(array[t0:n + 1]) for n in range(t0, 200)]
+    expected_variance = [np.var(array[t0:n + 1]) for n in range(t0, 200)]
+    assert mean == pytest.approx(expected_mean, rel=1e-12)
+    assert variance == pytest.approx(expected_variance, rel=1e-6)
@@ -51,3 +51,17 @@ def test_capacity_NVT():
     result = capacity_NVT.calculate_NVT_heat_capacity(configs, t0)
 
     assert result == pytest.approx(expected, 0.0001)
+
+
+def test_capacity_NVT_error_short_series():
+    """Test that a series too short for the jackknife still has an error."""
+    configs = []
+    for energy in [1, 1, 1, 1, 1, 2, 2, 2, 2, 2]:
+        frame = Mock()
+        frame.__len__ = Mock(return_value=1)
+        frame.get_temperature.return_value = 1
+        frame.get_total_energy.return_value = energy
+        frame.get_masses.return_value = [1, 1, 1]
+        configs.append(frame)
+    result = capacity_NVT.calculate_NVT_heat_capacity_error(configs, 0)
+    assert result > 0
@@ -0,0 +1,53 @@
+"""Unit test for simulations/checkpoint.py."""
+
+import numpy as np
+from ase import units
+from ase.build import bulk
+from ase.calculators.emt import EMT
+from ase.md.langevin import Langevin
+from ..variables import Variables
+from ..simulations.checkpoint import (read_checkpoint, restore_checkpoint,
+                                      write_checkpoint)
+
+
+def create_dynamics():
+    """Create a small Langevin simulation."""
+    atoms = bulk('Cu', 'fcc', a=3.6) * (2, 2, 2)
+    atoms.calc = EMT()
+    dyn = Langevin(atoms, 1 * units.fs, temperature_K=300, friction=0.05,
+                   rng=np.random.RandomState(1))
+    return atoms, dyn
+
+
+def test_checkpoint_restart(tmp_path):
+    """Test that a restarted simulation continues identically."""
+    path = str(tmp_path / 'test.checkpoint')
+    atoms, dyn = create_dynamics()
+    variables = Variables()
+    variables.set_timestep(10)
+    dyn.run(5)
+    variables.increment_time()
+    write_checkpoint(path, atoms, dyn, variables, 100)
+    dyn.run(5)
+
+    restarted_atoms, restarted_dyn = create_dynamics()
+    restarted_variables = Variables()
+    state = read_checkpoint(path, restarted_atoms)
+    restore_checkpoint(state, restarted_atoms, restarted_dyn,
+                       restarted_variables)
+    assert restarted_dyn.nsteps == 5
+    assert restarted_variables.time == [0]
+    assert restarted_variables.timestep == 10
+
+    restarted_dyn.run(5)
+    assert np.allclose(restarted_atoms.positions, atoms.positions)
+    assert np.allclose(restarted_atoms.get_momenta(), atoms.get_momenta())
+
+
+def test_checkpoint_other_atoms(tmp_path):
+    """Test that a checkpoint for other atoms is ignored."""
+    path = str(tmp_path / 'test.checkpoint')
+    atoms, dyn = create_dynamics()
+    write_checkpoint(path, atoms, dyn, Variables(), 100)
+    assert read_checkpoint(path, atoms.repeat(2)) is None
+    assert read_checkpoint(str(tmp_path / 'missing'), atoms) is None
@@ -0,0 +1,102 @@
+"""Unit test for simulations/convergence.py."""
+
+import numpy as np
+import pytest
+from ase import units
+from ase.build import bulk
+from ase.calculators.emt import EMT
+from ase.md.langevin import Langevin
+from ..variables import Variables
+from ..simulations.convergence import (ConvergenceMonitor,
+                                       parse_absolute_tolerances,
+                                       parse_observables)
+
+
+def sampled_variables(temperatures):
+    """Return Variables with the given temperatures sampled."""
+    variables = Variables()
+    variables.temperatures = list(temperatures)
+    variables.potential_energies = list(-1 - 0.01 * np.asarray(temperatures))
+    variables.atomic_pressures = list(temperatures - np.mean(temperatures))
+    return variables
+
+
+def test_converged_series():
+    """Test that a stationary series converges within a loose tolerance."""
+    temperatures = 300 + np.random.RandomState(0).normal(size=2000)
+    monitor = ConvergenceMonitor(sampled_variables(temperatures), 'NVE',
+                                 ['temperature', 'potential-energy'], 0.01)
+    monitor()
+    assert monitor.converged
+    assert monitor.reason.startswith('converged')
+
+    monitor = ConvergenceMonitor(sampled_variables(temperatures), 'NVE',
+                                 ['temperature'], 1e-6)
+    monitor()
+    assert not monitor.converged
+    assert monitor.reason is None
+
+
+def test_zero_mean_series():
+    """Test that a series averaging to zero converges absolutely."""
+    temperatures = 300 + np.random.RandomState(0).normal(size=2000)
+    monitor = ConvergenceMonitor(sampled_variables(temperatures), 'NVE',
+                                 ['temperature', 'pressure'], 0.01)
+    monitor()
+    assert not monitor.converged
+
+    monitor = ConvergenceMonitor(sampled_variables(temperatures), 'NVE',
+                                 ['temperature', 'pressure'], 0.01,
+                                 [0.0, 0.1])
+    monitor()
+    assert monitor.converged
+    assert 'pressure' in monitor.reason and 'absolute' in monitor.reason
+
+    with pytest.raises(ValueError):
+        ConvergenceMonitor(Variables(), 'NVE', ['pressure'], 0.01, [-1.0])
+
+
+def test_unequilibrated_series():
+    """Test that a series still drifting at its end does not converge."""
+    temperatures = np.linspace(0, 300, 2000)
+    monitor = ConvergenceMonitor(sampled_variables(temperatures), 'NVT',
+                                 ['temperature'], 1.0)
+    monitor()
+    assert not monitor.converged
+
+
+def test_parse_observables():
+    """Test parsing of the observables from the configuration."""
+    assert parse_observables('Temperature, potential-energy') == \
+        ['temperature', 'potential-energy']
+    with pytest.raises(ValueError):
+        parse_observables('temperature,volume')
+    with pytest.raises(ValueError):
+        ConvergenceMonitor(Variables(), 'NVE', ['temperature'], 0)
+
+
+def test_parse_absolute_tolerances():
+    """Test parsing of the absolute tolerances from the configuration."""
+    observables = ['temperature', 'pressure']
+    assert parse_absolute_tolerances('0.5', observables) == [0.5, 0.5]
+    assert parse_absolute_tolerances('0, 1e5', observables) == [0.0, 1e5]
+    with pytest.raises(ValueError):
+        parse_absolute_tolerances('1,2,3', observables)
+
+
+def test_early_termination():
+    """Test that a simulation stops once its temperature has converged."""
+    atoms = bulk('Cu', 'fcc', a=3.6) * (2, 2, 2)
+    atoms.calc = EMT()
+    dyn = Langevin(atoms, 5 * units.fs, temperature_K=300, friction=0.05,
+                   rng=np.random.RandomState(1))
+    variables = Variables()
+    dyn.attach(lambda: variables.Snapshot(atoms), interval=1)
+    monitor = ConvergenceMonitor(variables, 'NVT', ['temperature'], 0.05)
+    dyn.attach(monitor, interval=100)
+    for _ in dyn.irun(100000):
+        if monitor.converged:
+            break
+    assert monitor.converged
+    assert dyn.nsteps < 100000
+    assert dyn.nsteps % 100 == 0
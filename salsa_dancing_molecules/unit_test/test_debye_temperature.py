@@ -1,7 +1,8 @@
 """Unit test for debye_temperature.py."""
 
+import numpy as np
 import pytest
-from ..debye_temperature import calculate_debye
+from ..debye_temperature import calculate_debye, calculate_debye_error
 from unittest.mock import Mock
 
 atoms = Mock()
@@ -19,3 +20,16 @@ def test_debye_temperature():
               specific_heat_capacity))
     test_success = 1511.8455140792846, False
     assert result == pytest.approx(test_success, 0.0001)
+
+
+def test_debye_temperature_error():
+    """Test the propagation of the errors to the debye temperature."""
+    debye_temperature, _ = calculate_debye(configs, temperature,
+                                           specific_heat_capacity)
+    # A relative error of 3% in the heat capacity is 1% in the result.
+    assert calculate_debye_error(debye_temperature, temperature, 0,
+                                 specific_heat_capacity, 0.09) == \
+        pytest.approx(0.01 * debye_temperature)
+    assert calculate_debye_error(debye_temperature, temperature, 0.2,
+                                 specific_heat_capacity, 0.09) == \
+        pytest.approx(np.sqrt(2) * 0.01 * debye_temperature)
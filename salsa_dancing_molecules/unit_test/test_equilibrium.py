@@ -0,0 +1,33 @@
+"""Unit test for equilibrium.py."""
+
+import numpy as np
+import pytest
+from pymbar.timeseries import detect_equilibration, statistical_inefficiency
+from ..equilibrium import (detect_equilibration_fft,
+                           statistical_inefficiency_fft)
+
+
+def correlated_series(n, relaxation):
+    """Return a correlated series that relaxes from 5 to 0."""
+    rng = np.random.RandomState(0)
+    series = rng.normal(size=n)
+    for i in range(1, n):
+        series[i] += 0.8 * series[i - 1]
+    series[:relaxation] += np.linspace(5, 0, relaxation)
+    return series
+
+
+def test_statistical_inefficiency_fft():
+    """Test the FFT statistical inefficiency against pymbar."""
+    series = correlated_series(1000, 0)
+    assert statistical_inefficiency_fft(series) == pytest.approx(
+        statistical_inefficiency(series, fast=False), rel=1e-10)
+    assert statistical_inefficiency_fft(np.ones(10)) is None
+
+
+def test_detect_equilibration_fft():
+    """Test the grid search against all starts evaluated by pymbar."""
+    series = correlated_series(600, 150)
+    expected, _, _ = detect_equilibration(series, fast=False)
+    assert detect_equilibration_fft(series) == expected
+    assert detect_equilibration_fft(np.ones(10)) == 0
@@ -1,6 +1,8 @@
 """Unit test for generate_json.py."""
 import pytest
 import os
+import pickle
+from ase.build import bulk
 from ..startup import generate_json
 
 
@@ -45,3 +47,16 @@ def test_convert_to_json():
     filename = "./test/unbegun_simulations/value.json"
     assert os.path.exists(filename)
     os.remove(filename)
+
+
+def test_estimate_cost(tmp_path):
+    """Check the cost estimate for a pickled material."""
+    material = tmp_path / "Cu.pickle"
+    with open(material, "wb") as f:
+        pickle.dump(bulk("Cu", "fcc", a=3.6, cubic=True), f)
+    json_dict = {"material": str(material), "repeat": "2", "steps": "100",
+                 "potential": "openkim"}
+    assert generate_json.estimate_cost(json_dict) == 4 * 8 * 100 * 4.0
+    json_dict["potential"] = "lennard-jones"
+    json_dict["use-asap"] = "False"
+    assert generate_json.estimate_cost(json_dict) == 4 * 8 * 100 * 3.0
@@ -0,0 +1,103 @@
+"""Unit test for worker_process/job_queue.py."""
+
+import time
+from ..worker_process import job_queue
+from ..worker_process.job_queue import (JobQueue, LeaseHeartbeat,
+                                        is_shared_filesystem, open_job_queue,
+                                        get_job_queue_path)
+
+
+def test_claim_jobs(tmp_path):
+    """Test that every job is claimed exactly once."""
+    with JobQueue(get_job_queue_path(str(tmp_path))) as queue:
+        queue.add_jobs(['a.json', 'b.json'])
+        # Adding a job twice does not reset it.
+        first = queue.claim('worker_0')
+        queue.add_jobs([first])
+        second = queue.claim('worker_1')
+        assert {first, second} == {'a.json', 'b.json'}
+        assert queue.claim('worker_0') is None
+        assert queue.status_counts() == {'started': 2}
+
+
+def test_claim_most_expensive(tmp_path):
+    """Test that the jobs are claimed in order of decreasing cost."""
+    with JobQueue(get_job_queue_path(str(tmp_path))) as queue:
+        queue.add_jobs(['a.json', 'b.json', 'c.json'], [2.0, 30.0, 5.0])
+        assert [queue.claim('worker_0') for _ in range(3)] == [
+            'b.json', 'c.json', 'a.json']
+
+
+def test_job_status(tmp_path):
+    """Test completing, failing and requeueing jobs."""
+    with JobQueue(get_job_queue_path(str(tmp_path))) as queue:
+        queue.add_jobs(['a.json', 'b.json', 'c.json'])
+        names = [queue.claim('worker_0') for _ in range(3)]
+        queue.complete(names[0])
+        queue.fail(names[1], 'error')
+        queue.requeue(names[2])
+        assert queue.status_counts() == {'done': 1, 'failed': 1,
+                                         'pending': 1}
+        assert queue.claim('worker_1') == names[2]
+
+
+def test_open_job_queue(tmp_path):
+    """Test that workspaces without a job database use no queue."""
+    assert open_job_queue(str(tmp_path)) is None
+    JobQueue(get_job_queue_path(str(tmp_path))).close()
+    with open_job_queue(str(tmp_path)) as queue:
+        assert queue.status_counts() == {}
+
+
+def test_reclaim_expired(tmp_path):
+    """Test that expired jobs are retried until max attempts."""
+    path = get_job_queue_path(str(tmp_path))
+    with JobQueue(path, lease_time=-1) as queue:
+        queue.add_jobs(['a.json'])
+        assert queue.claim('worker_0') == 'a.json'
+        assert queue.reclaim_expired(2) == (['a.json'], [])
+        assert queue.claim('worker_1') == 'a.json'
+        assert not queue.renew_lease('a.json', 'worker_0')
+        assert queue.reclaim_expired(2) == ([], ['a.json'])
+        assert queue.status_counts() == {'failed': 1}
+
+
+def test_lease_heartbeat(tmp_path):
+    """Test that the heartbeat keeps the lease of a running job."""
+    path = get_job_queue_path(str(tmp_path))
+    with JobQueue(path, lease_time=0.05) as queue:
+        queue.add_jobs(['a.json'])
+        queue.claim('worker_0')
+        with LeaseHeartbeat(path, 'a.json', 'worker_0', 10, 0.01):
+            time.sleep(0.1)
+        assert queue.reclaim_expired(3) == ([], [])
+        assert queue.renew_lease('a.json', 'worker_0')
+
+
+def test_is_shared_filesystem(tmp_path):
+    """Test finding the file system of a path in the mounted ones."""
+    mounts = tmp_path / 'mounts'
+    mounts.write_text('/dev/sda1 / ext4 rw 0 0\n'
+                      'server:/home /home nfs4 rw 0 0\n'
+                      'tmpfs /home/local tmpfs rw 0 0\n'
+                      'mds@o2ib:/fs /proj/my\\040project lustre rw 0 0\n')
+    assert is_shared_filesystem('/home/user/ws', str(mounts))
+    assert not is_shared_filesystem('/home/local/ws', str(mounts))
+    assert not is_shared_filesystem('/homework', str(mounts))
+    assert is_shared_filesystem('/proj/my project/ws', str(mounts))
+    assert not is_shared_filesystem('/home', str(tmp_path / 'missing'))
+
+
+def test_journal_mode(tmp_path, monkeypatch):
+    """Test that shared file systems get a rollback journal."""
+    path = get_job_queue_path(str(tmp_path))
+    monkeypatch.setattr(job_queue, 'is_shared_filesystem',
+                        lambda path: True)
+    with JobQueue(path) as queue:
+        assert queue.connection.execute(
+            'PRAGMA journal_mode').fetchone()[0] == 'delete'
+    monkeypatch.setattr(job_queue, 'is_shared_filesystem',
+                        lambda path: False)
+    with JobQueue(path) as queue:
+        assert queue.connection.execute(
+            'PRAGMA journal_mode').fetchone()[0] == 'wal'
@@ -0,0 +1,92 @@
+"""Unit test for lennardjones.py."""
+
+import pytest
+from ase import Atoms
+from ase.build import bulk
+from ase.calculators.lj import LennardJones
+from ..lennardjones import CellListLennardJones
+from ..lennardjonesparse import get_lj_mixing_matrices
+
+parameters = {'epsilon': 0.0103404, 'sigma': 3.4, 'rc': 8.5}
+
+
+def compare_with_ase(atoms):
+    """Return results from the ASE and the cell list calculators."""
+    reference = atoms.copy()
+    reference.calc = LennardJones(**parameters)
+    atoms.calc = CellListLennardJones(**parameters)
+    return reference, atoms
+
+
+def test_energy_and_forces():
+    """Compare energy and forces to the ASE Lennard-Jones calculator."""
+    atoms = bulk('Ar', 'fcc', a=5.26) * (3, 2, 4)
+    atoms.rattle(0.1, seed=1)
+    reference, atoms = compare_with_ase(atoms)
+    assert atoms.get_potential_energy() == pytest.approx(
+        reference.get_potential_energy(), 1e-10)
+    assert atoms.get_forces() == pytest.approx(reference.get_forces(),
+                                               abs=1e-10)
+
+
+def test_stress():
+    """Compare the stress to the ASE Lennard-Jones calculator."""
+    atoms = bulk('Ar', 'fcc', a=5.26, cubic=True) * (3, 3, 3)
+    atoms.rattle(0.2, seed=2)
+    reference, atoms = compare_with_ase(atoms)
+    assert atoms.get_stress() == pytest.approx(reference.get_stress(),
+                                               abs=1e-12)
+
+
+def test_small_cell():
+    """Test a unit cell smaller than the cutoff."""
+    atoms = bulk('Ar', 'fcc', a=5.26)
+    reference, atoms = compare_with_ase(atoms)
+    assert atoms.get_potential_energy() == pytest.approx(
+        reference.get_potential_energy(), 1e-10)
+
+
+def test_no_pbc():
+    """Test a cluster without periodic boundary conditions."""
+    atoms = bulk('Ar', 'fcc', a=5.26) * (3, 3, 3)
+    atoms.pbc = False
+    atoms.rattle(0.1, seed=3)
+    reference, atoms = compare_with_ase(atoms)
+    assert atoms.get_potential_energy() == pytest.approx(
+        reference.get_potential_energy(), 1e-10)
+    assert atoms.get_forces() == pytest.approx(reference.get_forces(),
+                                               abs=1e-10)
+
+
+def test_neighbor_list_reuse():
+    """Test that results stay correct when the neighbour list is reused."""
+    atoms = bulk('Ar', 'fcc', a=5.26) * (3, 3, 3)
+    atoms.calc = CellListLennardJones(skin=1.0, **parameters)
+    atoms.get_potential_energy()
+    atoms.rattle(0.1, seed=4)
+    reference = atoms.copy()
+    reference.calc = LennardJones(**parameters)
+    assert atoms.get_forces() == pytest.approx(reference.get_forces(),
+                                               abs=1e-10)
+    assert atoms.calc.nl.nbuilds == 1
+
+
+def test_several_elements():
+    """Compare a two element cluster to a direct pair sum."""
+    atoms = Atoms('NaCl2', positions=[[0, 0, 0], [2.5, 0, 0], [0, 2.8, 0]])
+    numbers, rc, epsilon, sigma = get_lj_mixing_matrices(
+        atoms.get_chemical_symbols())
+    atoms.calc = CellListLennardJones(epsilon=epsilon, sigma=sigma, rc=rc,
+                                      numbers=numbers)
+
+    expected = 0
+    species = [numbers.index(n) for n in atoms.numbers]
+    for a in range(len(atoms)):
+        for b in range(a + 1, len(atoms)):
+            s, t = species[a], species[b]
+            r = atoms.get_distance(a, b)
+            e0 = 4 * epsilon[s, t] * ((sigma[s, t] / rc[s, t]) ** 12 -
+                                      (sigma[s, t] / rc[s, t]) ** 6)
+            expected += 4 * epsilon[s, t] * ((sigma[s, t] / r) ** 12 -
+                                             (sigma[s, t] / r) ** 6) - e0
+    assert atoms.get_potential_energy() == pytest.approx(expected, 1e-10)
@@ -1,7 +1,8 @@
 """Unittest for lennardjonesparse.py."""
 
 import pytest
-from ..lennardjonesparse import parse_lj_params
+from ..lennardjonesparse import (parse_lj_params, get_lj_mixing_matrices,
+                                 warn_single_cutoff)
 
 
 def test_lj():
@@ -10,3 +11,24 @@ def test_lj():
 
     assert element == 1 and r_c == 2.20943 and epsilon == 4.47789 \
            and sigma == 0.552357
+
+
+def test_lj_mixing_matrices():
+    """Function for testing the Lorentz-Berthelot mixing matrices."""
+    numbers, r_c, epsilon, sigma = get_lj_mixing_matrices(['Cl', 'Na', 'Cl'])
+    _, r_c_na, epsilon_na, sigma_na = parse_lj_params('Na')
+    _, r_c_cl, epsilon_cl, sigma_cl = parse_lj_params('Cl')
+
+    assert numbers == [11, 17]
+    assert epsilon[0, 0] == epsilon_na and epsilon[1, 1] == epsilon_cl
+    assert epsilon[0, 1] == pytest.approx((epsilon_na * epsilon_cl) ** 0.5)
+    assert sigma[1, 0] == pytest.approx((sigma_na + sigma_cl) / 2)
+    assert r_c[0, 1] == pytest.approx((r_c_na + r_c_cl) / 2)
+
+
+def test_warn_single_cutoff(capsys):
+    """Test the warning of the single asap3 cutoff for several elements."""
+    assert not warn_single_cutoff(get_lj_mixing_matrices(['Ar'])[1])
+    assert capsys.readouterr().out == ''
+    assert warn_single_cutoff(get_lj_mixing_matrices(['Na', 'Cl'])[1])
+    assert 'use-asap' in capsys.readouterr().out
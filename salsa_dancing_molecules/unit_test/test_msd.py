@@ -1,7 +1,11 @@
 """Unit test for mean_square_displacement.py."""
 
+import numpy as np
 import pytest
-from ..mean_square_displacement import calculate_msd
+from ..mean_square_displacement import (calculate_msd,
+                                        calculate_msd_time_origins,
+                                        msd_time_origins, unwrap_positions)
+from ..trajectory_data import TrajectoryData
 from unittest.mock import Mock
 
 
@@ -9,6 +13,9 @@ atoms = Mock()
 atoms2 = Mock()
 atoms.__len__ = Mock(return_value=2)
 atoms.get_cell_lengths_and_angles.return_value = [10, 10, 10]
+atoms.get_cell.return_value = np.diag([10, 10, 10])
+atoms.get_pbc.return_value = [True, True, True]
+atoms2.get_cell.return_value = np.diag([10, 10, 10])
 atoms.get_positions.return_value = [[1, 1, 1], [2, 2, 2]]
 atoms2.get_positions.return_value = [[9, 9, 9], [3, 3, 3]]
 configs = [atoms, atoms2]
@@ -40,3 +47,64 @@ def test_mean_square_displacement_time_average():
     _, MSD_avr = calculate_msd(configs, 0, reference='initial')
     test_success = (0, 7.5 / 2)
     assert MSD_avr == pytest.approx(test_success, 0.0001)
+
+
+def test_unwrap_triclinic_cell():
+    """Test unwrapping of atoms moving through a skewed periodic cell."""
+    cell = np.array([[0, 2.5, 2.5], [2.5, 0, 2.5], [2.5, 2.5, 0]])
+    step = np.array([0.3, -0.2, 0.4])
+    steps = np.arange(40)[:, None, None]
+    true_positions = np.array([[[1.0, 1.0, 1.0]]]) + steps * step
+    # Wrap the positions into the cell.
+    frac = true_positions @ np.linalg.inv(cell)
+    wrapped = (frac - np.floor(frac)) @ cell
+    cells = np.repeat(cell[None], 40, axis=0)
+    unwrapped = unwrap_positions(wrapped, cells, np.array([True] * 3))
+    assert unwrapped == pytest.approx(true_positions)
+
+
+def test_msd_time_origins():
+    """Test the FFT MSD against a direct average over all time origins."""
+    positions = np.cumsum(np.random.RandomState(0).normal(size=(50, 4, 3)),
+                          axis=0)
+    expected = [np.mean(np.sum((positions[m:] - positions[:50 - m]) ** 2,
+                               axis=2))
+                for m in range(50)]
+    assert msd_time_origins(positions) == pytest.approx(expected, rel=1e-9)
+
+
+def test_msd_memory_limit():
+    """Test that the MSD calculated in blocks matches the in-memory path."""
+    rng = np.random.RandomState(1)
+    cell = np.array([[4.0, 0, 0], [1.0, 4.0, 0], [0.5, 0.5, 4.0]])
+    steps = rng.normal(scale=0.3, size=(23, 10, 3))
+    frac = np.cumsum(steps, axis=0) @ np.linalg.inv(cell)
+    positions = (frac - np.floor(frac)) @ cell
+    cells = np.repeat(cell[None], 23, axis=0)
+    n = np.ones(10, dtype=int)
+    zeros = np.zeros(23)
+    data = TrajectoryData(n, n, [True] * 3, positions, positions, cells,
+                          zeros, zeros, zeros, zeros)
+    # Room for a few frames, or for a few atoms of the whole trajectory.
+    memory_limit = 4000
+    for reference in ['initial', 'final']:
+        expected = calculate_msd(data, 3, reference)
+        result = calculate_msd(data, 3, reference, memory_limit)
+        assert result[0] == pytest.approx(expected[0], rel=1e-12)
+        assert result[1] == pytest.approx(expected[1], rel=1e-12)
+        for limit in [None, memory_limit]:
+            MSD, MSD_avr = calculate_msd(data, 3, reference, limit,
+                                         per_atom=True)
+            assert MSD.shape == (23, 10)
+            assert MSD.mean(axis=1) == pytest.approx(expected[0],
+                                                     rel=1e-12)
+            assert MSD_avr == pytest.approx(expected[1], rel=1e-12)
+    assert calculate_msd_time_origins(data, 3, memory_limit) == \
+        pytest.approx(calculate_msd_time_origins(data, 3), rel=1e-9)
+    per_atom = calculate_msd_time_origins(data, 3, memory_limit,
+                                          per_atom=True)
+    assert per_atom.shape == (20, 10)
+    assert per_atom == pytest.approx(
+        calculate_msd_time_origins(data, 3, per_atom=True), rel=1e-9)
+    assert per_atom.mean(axis=1) == pytest.approx(
+        calculate_msd_time_origins(data, 3), rel=1e-9)
@@ -0,0 +1,50 @@
+"""Unit test for neighbor_list.py."""
+
+import numpy as np
+from ase.build import bulk
+from ase.neighborlist import neighbor_list
+from ..neighbor_list import cell_list_pairs, NeighborList
+
+
+def test_cell_list_pairs():
+    """Compare the found pairs to the ASE neighbour list."""
+    atoms = bulk('Ar', 'fcc', a=5.26) * (4, 3, 2)
+    atoms.rattle(0.3, seed=1)
+    i, j, shifts = cell_list_pairs(atoms.positions, atoms.cell.array,
+                                   atoms.pbc, 8.5)
+    distances = np.linalg.norm(atoms.positions[j] - atoms.positions[i] +
+                               shifts @ atoms.cell.array, axis=1)
+    expected = neighbor_list('d', atoms, 8.5)
+    # The ASE neighbour list contains every pair twice.
+    assert len(distances) * 2 == len(expected)
+    assert np.allclose(np.sort(np.repeat(distances, 2)), np.sort(expected))
+
+
+def test_atoms_outside_cell():
+    """Test that shifts refer to positions outside of the cell."""
+    atoms = bulk('Ar', 'fcc', a=5.26, cubic=True) * (3, 3, 3)
+    atoms.positions += [20.0, -30.0, 7.0]
+    i, j, shifts = cell_list_pairs(atoms.positions, atoms.cell.array,
+                                   atoms.pbc, 4.0)
+    distances = np.linalg.norm(atoms.positions[j] - atoms.positions[i] +
+                               shifts @ atoms.cell.array, axis=1)
+    # Every atom has 12 nearest neighbours in an FCC lattice.
+    assert len(distances) == 12 * len(atoms) // 2
+    assert np.allclose(distances, 5.26 / np.sqrt(2))
+
+
+def test_neighbor_list_rebuilds():
+    """Test that the list is only rebuilt after large displacements."""
+    atoms = bulk('Ar', 'fcc', a=5.26, cubic=True) * (3, 3, 3)
+    nl = NeighborList(4.0, skin=1.0)
+    assert nl.update(atoms.positions, atoms.cell.array, atoms.pbc)
+
+    # Moving an atom less than half the skin keeps the list.
+    atoms.positions[0] += [0.4, 0.0, 0.0]
+    assert not nl.update(atoms.positions, atoms.cell.array, atoms.pbc)
+
+    # Moving an atom more than half the skin rebuilds the list.
+    atoms.positions[0] += [0.2, 0.0, 0.0]
+    assert nl.update(atoms.positions, atoms.cell.array, atoms.pbc)
+    assert nl.nbuilds == 2
+    assert nl.nupdates == 3
@@ -0,0 +1,108 @@
+"""Unit test for post_process/post_process.py."""
+
+import csv
+import glob
+import json
+import os
+from ..post_process import post_process
+
+
+def create_done_simulations(path, names):
+    """Create a workspace with finished simulations and their output."""
+    path = str(path)
+    os.makedirs(f'{path}/done_simulations')
+    for name in names:
+        traj_path = f'{path}/{name}.traj'
+        csv_path = f'{path}/{name}.csv'
+        with open(traj_path, 'w') as f:
+            f.write('trajectory')
+        with open(csv_path, 'w') as f:
+            f.write('csv')
+        with open(f'{path}/done_simulations/{name}.json', 'w') as f:
+            json.dump({"traj_output_path": traj_path,
+                       "csv_output_path": csv_path}, f)
+    return path
+
+
+def read_results(path):
+    """Read the rows of the newest results file of a workspace."""
+    results_file = max(glob.glob(f'{path}/post_process_output/'
+                                 'post_process_*.csv'), key=os.path.getmtime)
+    with open(results_file) as f:
+        return list(csv.DictReader(f))
+
+
+def test_failing_simulation_is_logged(tmp_path, monkeypatch):
+    """Test that a failing simulation does not stop the others."""
+    path = create_done_simulations(tmp_path, ['Ar_0', 'Ar_1', 'Ar_2'])
+
+    def post_simulation_calculation(sim_info):
+        if sim_info["traj_output_path"].endswith('Ar_1.traj'):
+            raise ValueError('broken trajectory')
+        return {"heat_capacity": 1.0}
+
+    monkeypatch.setattr(post_process, 'post_simulation_calculation',
+                        post_simulation_calculation)
+    post_process.run_post_calculations(path, jobs=1)
+
+    assert sorted(row['file_name'] for row in read_results(path)) == [
+        'Ar_0', 'Ar_2']
+    [log_file] = glob.glob(f'{path}/post_process_output/*_failed.log')
+    with open(log_file) as f:
+        log = f.read()
+    assert 'Ar_1.json' in log and 'broken trajectory' in log
+    assert sorted(post_process.read_results_index(
+        f'{path}/post_process_output')) == ['Ar_0', 'Ar_2']
+
+
+def count_calculations(monkeypatch):
+    """Replace the post simulation calculations by a counting stub."""
+    analysed = []
+
+    def post_simulation_calculation(sim_info):
+        analysed.append(os.path.basename(sim_info["traj_output_path"]))
+        return {"heat_capacity": 1.0}
+
+    monkeypatch.setattr(post_process, 'post_simulation_calculation',
+                        post_simulation_calculation)
+    return analysed
+
+
+def test_results_index_reuse(tmp_path, monkeypatch):
+    """Test that unchanged simulations are taken from the results index."""
+    path = create_done_simulations(tmp_path, ['Ar_0', 'Ar_1'])
+    analysed = count_calculations(monkeypatch)
+    post_process.run_post_calculations(path, jobs=1)
+    assert sorted(analysed) == ['Ar_0.traj', 'Ar_1.traj']
+
+    analysed.clear()
+    post_process.run_post_calculations(path, jobs=1)
+    assert analysed == []
+    assert sorted(row['file_name'] for row in read_results(path)) == [
+        'Ar_0', 'Ar_1']
+
+    post_process.run_post_calculations(path, jobs=1, rerun_all=True)
+    assert sorted(analysed) == ['Ar_0.traj', 'Ar_1.traj']
+
+
+def test_results_index_invalidation(tmp_path, monkeypatch):
+    """Test that simulations with changed output are analysed again."""
+    path = create_done_simulations(tmp_path, ['Ar_0', 'Ar_1', 'Ar_2', 'Ar_3'])
+    analysed = count_calculations(monkeypatch)
+    post_process.run_post_calculations(path, jobs=1)
+
+    # Ar_0 grows, and Ar_1 is rewritten with the same size.
+    with open(f'{path}/Ar_0.traj', 'a') as f:
+        f.write('more frames')
+    stat = os.stat(f'{path}/Ar_1.traj')
+    os.utime(f'{path}/Ar_1.traj',
+             ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    # Ar_2 has a new CSV file, which the results are calculated from.
+    with open(f'{path}/Ar_2.csv', 'a') as f:
+        f.write('more rows')
+
+    analysed.clear()
+    post_process.run_post_calculations(path, jobs=1)
+    assert sorted(analysed) == ['Ar_0.traj', 'Ar_1.traj', 'Ar_2.traj']
+    assert sorted(row['file_name'] for row in read_results(path)) == [
+        'Ar_0', 'Ar_1', 'Ar_2', 'Ar_3']
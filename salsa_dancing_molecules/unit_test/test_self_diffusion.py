@@ -1,7 +1,9 @@
 """Unit test for self_diffusion_coefficient.py."""
 
+import numpy as np
 import pytest
-from ..self_diffusion_coefficient import calculate_self_diffusion_coefficient
+from ..self_diffusion_coefficient import (calculate_self_diffusion_coefficient,
+                                          fit_self_diffusion_coefficient)
 from unittest.mock import Mock
 
 MSD = [0, 7.5]
@@ -12,3 +14,16 @@ def test_self_diffusion_coefficient():
     result = calculate_self_diffusion_coefficient(MSD, 0)
     test_success = 0.625
     assert result == pytest.approx(test_success, 0.0001)
+
+
+def test_fit_self_diffusion_coefficient():
+    """Test that the fit ignores the time lags outside the window."""
+    msd = 6 * 0.25 * np.arange(100.0)
+    # Ballistic start and noisy end.
+    msd[:10] = 0
+    msd[60:] += 50
+    result = fit_self_diffusion_coefficient(msd, (0.2, 0.5))
+    assert result == pytest.approx(0.25, 1e-9)
+    per_atom = fit_self_diffusion_coefficient(np.stack([msd, 2 * msd], 1),
+                                              (0.2, 0.5))
+    assert per_atom == pytest.approx([0.25, 0.5], 1e-9)
@@ -0,0 +1,226 @@
+"""Unit test for trajectory_data.py."""
+
+import numpy as np
+import os
+import tempfile
+import threading
+import pytest
+from ase import units
+from ase.build import bulk
+from ase.calculators.emt import EMT
+from ase.io.trajectory import Trajectory
+from ase.md.velocitydistribution import MaxwellBoltzmannDistribution
+from ase.md.verlet import VelocityVerlet
+from ..trajectory_data import (TrajectoryData, TrajectoryFrames,
+                               get_csv_layout, get_frame_of_row,
+                               get_sidecar_path, load_derived_series,
+                               load_trajectory_data, read_csv_series,
+                               read_trajectory_data, read_trajectory_series,
+                               save_derived_series)
+from ..simulations import simulation
+from ..capacity_NVT import calculate_NVT_heat_capacity
+from ..cohesive_energy import calculate_cohesive_energy
+from ..mean_square_displacement import (calculate_msd,
+                                        calculate_msd_time_origins)
+
+
+@pytest.fixture
+def traj_path(tmp_path):
+    """Write a short trajectory of a copper crystal."""
+    path = str(tmp_path / 'test.traj')
+    atoms = bulk('Cu', 'fcc', a=3.6, cubic=True) * (2, 2, 2)
+    atoms.calc = EMT()
+    MaxwellBoltzmannDistribution(atoms, temperature_K=300,
+                                 rng=np.random.RandomState(1))
+    dyn = VelocityVerlet(atoms, 5 * units.fs)
+    with Trajectory(path, 'w', atoms) as traj:
+        dyn.attach(traj.write, interval=2)
+        dyn.run(20)
+    return path
+
+
+def test_read_trajectory_data(traj_path):
+    """Test that the arrays match the frames of the trajectory."""
+    data = read_trajectory_data(traj_path)
+    configs = Trajectory(traj_path)
+    assert len(data) == len(configs)
+    assert data.n_atoms == 32
+    for i, atoms in enumerate(configs):
+        assert np.array_equal(data.positions[i], atoms.get_positions())
+        assert np.array_equal(data.momenta[i], atoms.get_momenta())
+        assert data.volume[i] == pytest.approx(atoms.get_volume())
+        assert data.temperature[i] == atoms.get_temperature()
+        assert data.total_energy[i] == pytest.approx(
+            atoms.get_total_energy())
+
+
+def test_read_trajectory_series(traj_path):
+    """Test that the series match the arrays read from atoms objects."""
+    data = read_trajectory_data(traj_path)
+    series = read_trajectory_series(traj_path)
+    assert len(series) == len(data)
+    assert np.array_equal(series.masses, data.masses)
+    assert np.array_equal(series.cell, data.cell)
+    for name in ['volume', 'potential_energy', 'kinetic_energy',
+                 'temperature']:
+        assert getattr(series, name) == pytest.approx(getattr(data, name),
+                                                      rel=1e-12)
+
+
+def test_analysis_of_trajectory_data(traj_path):
+    """Test that the analyses give the same results for both inputs."""
+    data = read_trajectory_data(traj_path)
+    configs = Trajectory(traj_path)
+    t0 = 2
+    assert calculate_cohesive_energy(data, t0) == pytest.approx(
+        calculate_cohesive_energy(configs, t0))
+    assert calculate_NVT_heat_capacity(data, t0) == pytest.approx(
+        calculate_NVT_heat_capacity(configs, t0))
+    assert calculate_msd(data, t0)[0] == pytest.approx(
+        calculate_msd(configs, t0)[0])
+
+
+def test_trajectory_frames(traj_path, capsys, monkeypatch):
+    """Test that trajectories over the memory limit stay in the file."""
+    data = read_trajectory_data(traj_path)
+    # 11 frames of 32 atoms, positions and momenta need 16896 bytes.
+    assert isinstance(load_trajectory_data(traj_path, cache=False,
+                                           memory_limit=16896),
+                      TrajectoryData)
+
+    def read_only(*args, **kwargs):
+        raise PermissionError('read-only file system')
+    monkeypatch.setattr(tempfile, 'mkdtemp', read_only)
+    configs = load_trajectory_data(traj_path, memory_limit=16895)
+    assert 'Could not write array sidecar' in capsys.readouterr().out
+    assert isinstance(configs, TrajectoryFrames)
+    assert np.array_equal(configs.cell, data.cell)
+
+    t0 = 2
+    memory_limit = 4 * 32 * 3 * 8 * 3
+    assert calculate_msd(configs, t0, memory_limit=memory_limit)[0] == (
+        pytest.approx(calculate_msd(data, t0)[0]))
+    assert calculate_msd(configs, t0)[0] == pytest.approx(
+        calculate_msd(data, t0)[0])
+    assert calculate_msd_time_origins(configs, t0, memory_limit) == (
+        pytest.approx(calculate_msd_time_origins(data, t0)))
+
+
+def test_trajectory_sidecar(traj_path):
+    """Test that the arrays are cached until the trajectory changes."""
+    data = read_trajectory_data(traj_path)
+    loaded = load_trajectory_data(traj_path)
+    assert os.path.isdir(get_sidecar_path(traj_path))
+    assert np.array_equal(loaded.positions, data.positions)
+    assert np.array_equal(loaded.momenta, data.momenta)
+    cached = load_trajectory_data(traj_path)
+    # Memory mapped arrays are read-only.
+    assert not cached.positions.flags.writeable
+    assert np.array_equal(cached.positions, data.positions)
+    assert np.array_equal(cached.temperature, data.temperature)
+
+    # A rewritten trajectory is read again.
+    stat = os.stat(traj_path)
+    os.utime(traj_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    key_path = os.path.join(get_sidecar_path(traj_path), 'key.json')
+    key_mtime = os.stat(key_path).st_mtime_ns
+    reread = load_trajectory_data(traj_path)
+    assert os.stat(key_path).st_mtime_ns != key_mtime
+    assert np.array_equal(reread.positions, data.positions)
+
+
+def test_sidecar_is_replaced(traj_path):
+    """Test that a rebuilt sidecar does not overwrite mapped arrays."""
+    data = read_trajectory_data(traj_path)
+    cached = load_trajectory_data(traj_path)
+    positions_path = os.path.join(get_sidecar_path(traj_path),
+                                  'positions.npy')
+    inode = os.stat(positions_path).st_ino
+
+    stat = os.stat(traj_path)
+    os.utime(traj_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    threads = [threading.Thread(target=load_trajectory_data,
+                                args=(traj_path,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.stat(positions_path).st_ino != inode
+    assert np.array_equal(cached.positions, data.positions)
+    assert np.array_equal(load_trajectory_data(traj_path).positions,
+                          data.positions)
+    # Only the sidecar is left, without temporary directories.
+    assert [name for name in os.listdir(os.path.dirname(traj_path))
+            if name.endswith('.arrays') or '.arrays.' in name] == [
+        os.path.basename(get_sidecar_path(traj_path))]
+
+
+def test_derived_series(traj_path):
+    """Test that derived series are kept until the trajectory changes."""
+    assert load_derived_series(traj_path) is None
+    save_derived_series(traj_path, MSD=np.arange(3.0), t0=1)
+    save_derived_series(traj_path, t0=2)
+    series = load_derived_series(traj_path)
+    assert np.array_equal(series['MSD'], np.arange(3.0))
+    assert series['t0'] == 2
+    assert sorted(series) == ['MSD', 't0']
+
+    stat = os.stat(traj_path)
+    os.utime(traj_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_derived_series(traj_path) is None
+
+
+def test_derived_series_concurrent(traj_path):
+    """Test that series saved at the same time are all kept."""
+    threads = [threading.Thread(target=save_derived_series,
+                                args=(traj_path,),
+                                kwargs={f'series_{i}': np.arange(i)})
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(load_derived_series(traj_path)) == [
+        f'series_{i}' for i in range(8)]
+    assert not [name for name in os.listdir(os.path.dirname(traj_path))
+                if name.endswith('.npz') and name != 'test.series.npz']
+
+
+@pytest.mark.parametrize('steps', [300, 250])
+def test_read_csv_series(tmp_path, steps):
+    """Test that the CSV rows match the trajectory frames written with them.
+
+    The files are written by a simulation, which may stop between two
+    trajectory frames.
+    """
+    sim_info = {"ensemble": "NVE", "potential": "lennard-jones-numpy",
+                "initial-temperature": "40", "steps": str(steps),
+                "use-asap": "False", "checkpoint-interval": "0",
+                "traj_output_path": str(tmp_path / 'test.traj'),
+                "csv_output_path": str(tmp_path / 'test.csv')}
+    simulation.run(sim_info, bulk('Ar', 'fcc', a=5.26, cubic=True) * 2)
+
+    data = read_trajectory_data(sim_info["traj_output_path"])
+    rows_per_frame, first_row = get_csv_layout(sim_info)
+    assert (rows_per_frame, first_row) == (10, 0)
+    series = read_csv_series(sim_info["csv_output_path"], data,
+                             rows_per_frame, first_row)
+    assert len(data) == steps // 100 + 1
+    assert len(series) == steps // 10 + 1
+    assert series.n_atoms == data.n_atoms
+    for name in ['volume', 'potential_energy', 'kinetic_energy',
+                 'temperature']:
+        assert getattr(series, name)[::10] == pytest.approx(
+            getattr(data, name), rel=1e-6)
+    assert get_frame_of_row(0, rows_per_frame, len(data)) == 0
+    assert get_frame_of_row(11, rows_per_frame, len(data)) == 2
+    assert get_frame_of_row(len(series) - 1, rows_per_frame,
+                            len(data)) == len(data) - 1
+
+
+def test_csv_layout_without_intervals():
+    """Test that the repeated first row of older simulations is skipped."""
+    assert get_csv_layout({}) == (10, 1)
+    assert get_csv_layout({"csv-interval": "5",
+                           "traj-interval": "100"}) == (20, 0)
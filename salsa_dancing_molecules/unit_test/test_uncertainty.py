@@ -0,0 +1,90 @@
+"""Unit test for uncertainty.py."""
+
+import numpy as np
+import pytest
+from ..uncertainty import (blocking, blocking_standard_error,
+                           effective_samples, function_standard_error,
+                           independent_standard_error,
+                           jackknife_standard_error,
+                           linearised_blocking_standard_error, standard_error)
+
+
+def ar1_series(n, phi, seed=0):
+    """Return a series where each sample is phi times the last plus noise."""
+    noise = np.random.RandomState(seed).normal(size=n)
+    series = np.empty(n)
+    series[0] = noise[0]
+    for i in range(1, n):
+        series[i] = phi * series[i - 1] + noise[i]
+    return series
+
+
+def test_uncorrelated_series():
+    """Test that all errors of uncorrelated samples match sigma/sqrt(n)."""
+    series = np.random.RandomState(0).normal(size=20000)
+    expected = series.std() / np.sqrt(len(series))
+    assert effective_samples(series) == pytest.approx(len(series), rel=0.05)
+    assert standard_error(series) == pytest.approx(expected, rel=0.05)
+    assert blocking_standard_error(series) == pytest.approx(expected,
+                                                            rel=0.1)
+    assert jackknife_standard_error(lambda mean: mean, series) == \
+        pytest.approx(expected, rel=0.05)
+    assert independent_standard_error(series) == pytest.approx(expected,
+                                                               rel=1e-3)
+
+
+def test_correlated_series():
+    """Test the errors of a series with a known statistical inefficiency."""
+    phi = 0.9
+    n = 50000
+    series = ar1_series(n, phi)
+    g = (1 + phi) / (1 - phi)
+    expected = np.sqrt(g / (1 - phi**2) / n)
+    assert effective_samples(series) == pytest.approx(n / g, rel=0.15)
+    assert standard_error(series) == pytest.approx(expected, rel=0.15)
+    assert blocking_standard_error(series) == pytest.approx(expected,
+                                                            rel=0.15)
+    assert jackknife_standard_error(lambda mean: mean, series) == \
+        pytest.approx(expected, rel=0.15)
+
+
+def test_blocking_levels():
+    """Test that every blocking level halves the samples."""
+    errors, error_errors = blocking(np.arange(10.0))
+    # 10, 5, 2 and 1 samples.
+    assert len(errors) == 3
+    assert errors[0] == pytest.approx(np.arange(10.0).std() / 3)
+    assert error_errors[0] == pytest.approx(errors[0] / np.sqrt(18))
+
+
+def test_short_series():
+    """Test that errors that cannot be estimated are NaN."""
+    assert np.isnan(standard_error([]))
+    assert np.isnan(blocking_standard_error([1.0]))
+    assert np.isnan(independent_standard_error([1.0]))
+    assert np.isnan(jackknife_standard_error(lambda mean: mean, [1.0, 2.0],
+                                             block_length=2))
+    assert standard_error(np.ones(10)) == 0
+
+
+def test_function_standard_error_fallback():
+    """Test that blocking is used when there are too few jackknife blocks."""
+    series = ar1_series(100, 0.9)
+    assert np.isnan(jackknife_standard_error(lambda mean: mean, series))
+    assert function_standard_error(lambda mean: mean, series) == \
+        pytest.approx(blocking_standard_error(series))
+
+    # The variance is linearised around the means.
+    def variance(mean, mean_square):
+        return mean_square - mean ** 2
+
+    linear = series ** 2 - 2 * series.mean() * series
+    assert function_standard_error(variance, series, series ** 2) == \
+        pytest.approx(blocking_standard_error(linear))
+    assert np.isnan(linearised_blocking_standard_error(variance, [1.0],
+                                                       [1.0]))
+
+    long_series = ar1_series(50000, 0.9)
+    assert function_standard_error(variance, long_series,
+                                   long_series ** 2) == \
+        jackknife_standard_error(variance, long_series, long_series ** 2)
@@ -0,0 +1,195 @@
+"""Unit test for volume_process.py."""
+
+import csv
+import glob
+import json
+import os
+import pickle
+import numpy as np
+import pytest
+from ase.build import bulk
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.io import write
+from .. import trajectory_data
+from ..startup.prepare_workspace import do_preparations
+from ..trajectory_data import (CSV_COLUMNS, load_derived_series,
+                               save_derived_series)
+from ..volume_process import volume_process
+from ..worker_process import worker_process
+from ..volume_process.volume_process import (get_lindemann_result,
+                                             group_by_volume)
+
+
+def sim_info(material, scale):
+    """Return the simulation information of a volume-simulation."""
+    info = {"material": material, "ensemble": "NVE",
+            "traj_output_path": f"{material}_{scale}.traj",
+            "csv_output_path": f"{material}_{scale}.csv",
+            "cost": scale}
+    if scale is not None:
+        info["volume-scale"] = scale
+    return info
+
+
+def test_group_by_volume():
+    """Test that simulations are grouped and sorted by volume scale."""
+    sim_info_list = [sim_info("Ar", "1.1"), sim_info("Cu", "0.9"),
+                     sim_info("Ar", "0.9"), sim_info("Ar", None),
+                     sim_info("Cu", "1.0"), sim_info("Ar", "1.0")]
+    groups, traj_list, csv_list = group_by_volume(sim_info_list)
+    scales = [[info["volume-scale"] for info in group] for group in groups]
+    assert scales == [["0.9", "1.0", "1.1"], ["0.9", "1.0"]]
+    assert [group[0]["material"] for group in groups] == ["Ar", "Cu"]
+    assert traj_list == ["Ar_None.traj"]
+    assert csv_list == ["Ar_None.csv"]
+
+
+def test_group_by_volume_steps_done(tmp_path, monkeypatch):
+    """Test that simulations that stopped early are grouped together."""
+    path = str(tmp_path)
+    do_preparations(path)
+    with open(f'{path}/materials/Ar.pickle', 'wb') as f:
+        pickle.dump(bulk('Ar', 'fcc', a=5.26), f)
+
+    def start_simulation(sim_info, atoms, abort=None):
+        # Every volume converges after a different number of steps.
+        sim_info["steps-done"] = str(int(float(sim_info["volume-scale"]) *
+                                         1000))
+        sim_info["stop-reason"] = f'converged at {sim_info["steps-done"]}'
+
+    monkeypatch.setattr(worker_process, 'start_simulation', start_simulation)
+    for scale in ["0.9", "1.0", "1.1"]:
+        info = sim_info(f'{path}/materials/Ar.pickle', scale)
+        info["convergence-tolerance"] = "0.01"
+        started_path = f'{path}/started_simulations/Ar_{scale}.json'
+        with open(started_path, 'w') as f:
+            json.dump(info, f)
+        worker_process.finish_simulation(
+            started_path, f'{path}/done_simulations/Ar_{scale}.json')
+
+    done_list = []
+    for file in sorted(os.listdir(f'{path}/done_simulations')):
+        with open(f'{path}/done_simulations/{file}') as f:
+            done_list.append(json.load(f))
+    assert len({info["steps-done"] for info in done_list}) == 3
+    groups, _, _ = group_by_volume(done_list)
+    assert len(groups) == 1 and len(groups[0]) == 3
+
+
+def test_group_by_volume_duplicate_scale():
+    """Test that a volume scale can only occur once in a group."""
+    with pytest.raises(ValueError):
+        group_by_volume([sim_info("Ar", "1.0"), sim_info("Ar", "1.00")])
+
+
+def test_lindemann_result_from_saved_series(tmp_path, monkeypatch):
+    """Test that the saved MSD and t0 are used without reading the traj."""
+    traj_path = str(tmp_path / 'Ar.traj')
+    atoms = bulk('Ar', 'fcc', a=5.26, cubic=True)
+    write(traj_path, [atoms, atoms])
+    msd = np.array([0.0, 0.0, 0.1, 0.1])
+    save_derived_series(traj_path, MSD=msd, t0=2,
+                        final_cell=np.array(atoms.cell))
+
+    def no_trajectory(*args, **kwargs):
+        raise AssertionError('the trajectory was opened')
+
+    monkeypatch.setattr(trajectory_data, 'Trajectory', no_trajectory)
+    monkeypatch.setattr(trajectory_data.ulm, 'open', no_trajectory)
+    parameter, _ = get_lindemann_result(
+        {"traj_output_path": traj_path, "ensemble": "NVE",
+         "csv_output_path": str(tmp_path / 'Ar.csv')}, 5.26)
+    # The conventional cell of fcc is simple cubic.
+    assert parameter == pytest.approx(np.sqrt(0.1) / (5.26 / 2))
+
+
+def write_volume_simulation(path, material, scale, energy):
+    """Write a done volume-simulation with a synthetic trajectory.
+
+    The frames of fcc argon, scaled to the volume scale, have positions
+    drawn around the lattice sites, random momenta and the potential energy
+    given by energy(volume). The CSV file has ten rows per frame.
+    """
+    name = f'{material}_{scale}'
+    traj_path = f'{path}/output/traj/{name}.traj'
+    atoms = bulk('Ar', 'fcc', a=5.26 * scale ** (1 / 3)).repeat(2)
+    rng = np.random.default_rng(round(scale * 100))
+    frames = []
+    for _ in range(40):
+        frame = atoms.copy()
+        frame.positions += rng.normal(0, 0.05, frame.positions.shape)
+        frame.set_momenta(rng.normal(0, 0.1, frame.positions.shape))
+        frame.calc = SinglePointCalculator(
+            frame, energy=energy(atoms.get_volume()) +
+            rng.normal(0, 1e-5))
+        frames.append(frame)
+    write(traj_path, frames)
+    csv_path = f'{path}/output/csv/{name}.csv'
+    n_rows = 10 * (len(frames) - 1) + 1
+    rows = np.column_stack([
+        energy(atoms.get_volume()) / len(atoms) +
+        rng.normal(0, 1e-6, n_rows),
+        rng.normal(0.005, 1e-4, n_rows), rng.normal(40, 1, n_rows)])
+    np.savetxt(csv_path, rows, delimiter=',', comments='',
+               header=','.join(CSV_COLUMNS.values()))
+    with open(f'{path}/done_simulations/{name}.json', 'w') as f:
+        json.dump({"material": material, "ensemble": "NVE",
+                   "volume-scale": str(scale),
+                   "traj_output_path": traj_path,
+                   "csv_output_path": csv_path, "csv-interval": "10",
+                   "traj-interval": "100"}, f)
+
+
+def test_start(tmp_path):
+    """Test the volume processing of a workspace in a pool of one process.
+
+    The first material has an energy minimum at the volume of the
+    lattice constant 5.26, the second has no minimum and the third too few
+    volumes for the equation of state.
+    """
+    path = str(tmp_path)
+    do_preparations(path)
+    v0 = 8 * 5.26 ** 3 / 4
+    scales = [0.94, 0.97, 1.0, 1.03, 1.06]
+    for scale in scales:
+        write_volume_simulation(path, 'Ar', scale,
+                                lambda v: 0.05 * (v - v0) ** 2 / v0)
+        write_volume_simulation(path, 'Kr', scale, lambda v: -0.01 * v)
+    for scale in scales[:2]:
+        write_volume_simulation(path, 'Xe', scale, lambda v: 0.0)
+    output = f'{path}/post_process_output'
+    with open(f'{output}/temp_0.csv', 'w') as f:
+        f.write('file_name,heat_capacity\nAr_0.94,1.0\n')
+
+    volume_process.start(path, jobs=1)
+
+    assert not glob.glob(f'{output}/temp_*')
+    [results_file] = glob.glob(f'{output}/post_process_*.csv')
+    with open(results_file) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 4
+    assert rows[0]['file_name'] == 'Ar_0.94'
+    # The groups are in the order os.listdir lists their configurations.
+    fitted, no_minimum, too_few = sorted(
+        rows[1:], key=lambda row: ('Ar' not in row['Trajectory file'],
+                                   'Amount' in row['Error message']))
+
+    assert fitted['Trajectory file'] == f'{path}/output/traj/Ar_1.0.traj'
+    assert float(fitted['Lattice constant']) == pytest.approx(5.26,
+                                                              rel=1e-3)
+    assert float(fitted['Bulk modulus']) > 0
+    # The atoms are displaced by much less than the Lindemann limit.
+    assert 0 < float(fitted['Lindeman parameter last timestep']) < 0.1
+    assert fitted['Lindeman criterion'] == ''
+    # The equilibrium is found in the CSV series, like in the post
+    # simulation calculations.
+    series = load_derived_series(fitted['Trajectory file'])
+    assert 'equilibrium_csv_NVE' in series
+    assert 'equilibrium_NVE' not in series
+
+    assert 'No optimal volume found' in no_minimum['Error message']
+    assert no_minimum['Lattice constant'] == 'nan'
+    assert no_minimum['Lindeman parameter last timestep'] == ''
+    assert (f'must be {volume_process.MIN_EOS_POINTS}' in
+            too_few['Error message'])
+    assert too_few['Lindeman parameter last timestep'] == ''
@@ -0,0 +1,349 @@
+"""Unit test for worker_process/worker_process.py."""
+
+import csv
+import glob
+import json
+import os
+import pickle
+import re
+import signal
+import threading
+import time
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from ase.build import bulk
+from ..startup.prepare_workspace import do_preparations
+from ..simulations import simulation
+from ..simulations.simulation import (SimulationAborted,
+                                      SimulationInterrupted)
+from ..worker_process import worker_process
+from ..worker_process.job_queue import (JobQueue, LeaseHeartbeat,
+                                        get_job_queue_path, write_job_costs)
+
+
+def create_workspace(path, names, steps="200"):
+    """Create a workspace with small argon simulation jobs."""
+    path = str(path)
+    do_preparations(path)
+    with open(f'{path}/materials/Ar.pickle', 'wb') as f:
+        pickle.dump(bulk('Ar', 'fcc', a=5.26, cubic=True), f)
+    for name in names:
+        sim_info = {"material": f"{path}/materials/Ar.pickle",
+                    "workspace_path": path, "ensemble": "NVE",
+                    "potential": "lennard-jones-numpy",
+                    "initial-temperature": "40", "repeat": "2",
+                    "steps": steps, "use-asap": "False",
+                    "checkpoint-interval": "100",
+                    "traj_output_path": f"{path}/output/traj/{name}.traj",
+                    "csv_output_path": f"{path}/output/csv/{name}.csv"}
+        with open(f'{path}/unbegun_simulations/{name}.json', 'w') as f:
+            json.dump(sim_info, f)
+    return path
+
+
+class FakeRequest:
+    """Non-blocking receive of a FakeComm."""
+
+    def __init__(self, comm):
+        """Create a receive of the next report of comm."""
+        self.comm = comm
+
+    def test(self):
+        """Return whether a report was received, and the report."""
+        if self.comm.reports:
+            return True, self.comm.reports.pop(0)
+        return False, None
+
+    def cancel(self):
+        """Cancel the receive."""
+
+
+class FakeComm:
+    """Communicator of rank 0 with workers that finish jobs at once.
+
+    The result of each job is looked up in results, a None result stands
+    for a job that failed.
+    """
+
+    def __init__(self, size, results):
+        """Create a communicator where every worker is waiting for a job."""
+        self.size = size
+        self.results = results
+        self.reports = [{"rank": rank, "status": None, "result": None}
+                        for rank in range(1, size)]
+        self.jobs = {rank: [] for rank in range(1, size)}
+
+    def Get_size(self):
+        """Return the number of ranks."""
+        return self.size
+
+    def irecv(self, tag):
+        """Start receiving the next report."""
+        return FakeRequest(self)
+
+    def send(self, obj, dest, tag):
+        """Send a job to a worker, which reports its result."""
+        self.jobs[dest].append(obj)
+        if obj is not None:
+            self.reports.append({"rank": dest, "status": None,
+                                 "result": self.results[obj]})
+
+
+def test_dispatch_jobs(tmp_path):
+    """Test that rank 0 hands out all jobs and writes their results."""
+    path = create_workspace(tmp_path, ['Ar_0', 'Ar_1', 'Ar_2'])
+    with JobQueue(get_job_queue_path(path)) as queue:
+        queue.add_jobs(['Ar_0.json', 'Ar_1.json', 'Ar_2.json'])
+    results = {'Ar_0.json': {'file_name': 'Ar_0', 'heat_capacity': 1.0},
+               'Ar_1.json': None,
+               'Ar_2.json': {'file_name': 'Ar_2', 'heat_capacity': 2.0}}
+    comm = FakeComm(3, results)
+    worker_process.dispatch_jobs(comm, path, 600, 1)
+
+    # Every job is run once, and every worker is told to exit.
+    jobs = comm.jobs[1] + comm.jobs[2]
+    assert sorted(job for job in jobs if job) == sorted(results)
+    assert comm.jobs[1][-1] is None and comm.jobs[2][-1] is None
+    with JobQueue(get_job_queue_path(path)) as queue:
+        assert queue.status_counts() == {'done': 2, 'failed': 1}
+
+    output = f'{path}/post_process_output'
+    assert not glob.glob(f'{output}/temp_*')
+    results_files = glob.glob(f'{output}/post_process_*.csv')
+    assert len(results_files) == 1
+    with open(results_files[0]) as f:
+        rows = list(csv.DictReader(f))
+    assert sorted(row['file_name'] for row in rows) == ['Ar_0', 'Ar_2']
+
+
+def test_work_for_dispatcher(tmp_path, monkeypatch):
+    """Test that a worker reports results and interruptions to rank 0."""
+    path = create_workspace(tmp_path, ['Ar_0', 'Ar_1'])
+    for name in ['Ar_0', 'Ar_1']:
+        os.rename(f'{path}/unbegun_simulations/{name}.json',
+                  f'{path}/started_simulations/{name}.json')
+
+    class WorkerComm:
+        def __init__(self):
+            self.jobs = ['Ar_0.json', 'Ar_1.json', None]
+            self.reports = []
+
+        def Get_rank(self):
+            return 1
+
+        def recv(self, source, tag):
+            return self.jobs.pop(0)
+
+        def send(self, obj, dest, tag):
+            self.reports.append(obj)
+
+    def run_simulation_job(started_path, done_path):
+        if started_path.endswith('Ar_1.json'):
+            raise SimulationInterrupted('interrupted')
+        return {'file_name': 'Ar_0'}
+
+    monkeypatch.setattr(worker_process, 'run_simulation_job',
+                        run_simulation_job)
+    comm = WorkerComm()
+    worker_process.work_for_dispatcher(comm, path)
+    assert comm.jobs == []
+    assert [(report['status'], report['result'])
+            for report in comm.reports] == [
+        (None, None), (None, {'file_name': 'Ar_0'}),
+        (worker_process.MPI_INTERRUPTED, None)]
+    assert os.path.exists(f'{path}/unbegun_simulations/Ar_1.json')
+
+
+def test_lost_lease_aborts_simulation(tmp_path):
+    """Test that a simulation stops when another worker takes its job."""
+    path = create_workspace(tmp_path, ['Ar_0'])
+    db_path = get_job_queue_path(path)
+    with JobQueue(db_path, lease_time=-1) as queue:
+        queue.add_jobs(['Ar_0.json'])
+        queue.claim('worker_0')
+        os.rename(f'{path}/unbegun_simulations/Ar_0.json',
+                  f'{path}/started_simulations/Ar_0.json')
+        queue.reclaim_expired(3)
+        queue.claim('worker_1')
+
+    with LeaseHeartbeat(db_path, 'Ar_0.json', 'worker_0', 10,
+                        0.01) as heartbeat:
+        assert heartbeat.lost.wait(5)
+        with pytest.raises(SimulationAborted):
+            worker_process.run_simulation_job(
+                f'{path}/started_simulations/Ar_0.json',
+                f'{path}/done_simulations/Ar_0.json', abort=heartbeat.lost)
+    assert os.path.exists(f'{path}/started_simulations/Ar_0.json')
+    assert not os.path.exists(f'{path}/output/traj/Ar_0.traj')
+
+
+def test_simulation_aborted_while_running(tmp_path):
+    """Test that no files are written after the abort event is set."""
+    path = create_workspace(tmp_path, ['Ar_0'], steps="100000")
+    os.rename(f'{path}/unbegun_simulations/Ar_0.json',
+              f'{path}/started_simulations/Ar_0.json')
+    abort = threading.Event()
+    threading.Timer(1, abort.set).start()
+    with pytest.raises(SimulationAborted):
+        worker_process.run_simulation_job(
+            f'{path}/started_simulations/Ar_0.json',
+            f'{path}/done_simulations/Ar_0.json', abort=abort)
+    size = os.path.getsize(f'{path}/output/traj/Ar_0.traj')
+    time.sleep(0.1)
+    assert os.path.getsize(f'{path}/output/traj/Ar_0.traj') == size
+    assert not os.path.exists(f'{path}/output/csv/Ar_0.csv')
+
+
+def test_reclaimed_done_job_is_analysed(tmp_path, monkeypatch):
+    """Test that a job whose worker died during the analysis is analysed.
+
+    The configuration is already in done_simulations, so the job must not
+    be failed or simulated again.
+    """
+    path = create_workspace(tmp_path, ['Ar_0'])
+    os.rename(f'{path}/unbegun_simulations/Ar_0.json',
+              f'{path}/done_simulations/Ar_0.json')
+    with JobQueue(get_job_queue_path(path), lease_time=-1) as queue:
+        queue.add_jobs(['Ar_0.json'])
+        queue.claim('worker_0')
+        queue.reclaim_expired(3)
+        assert worker_process.claim_from_queue(path, queue,
+                                               'worker_1') == 'Ar_0.json'
+        assert queue.status_counts() == {'started': 1}
+
+    def no_simulation(*args):
+        raise AssertionError('the simulation was run again')
+
+    monkeypatch.setattr(worker_process, 'start_simulation', no_simulation)
+    monkeypatch.setattr(worker_process, 'post_simulation_calculation',
+                        lambda sim_info: {'heat_capacity': 1.0})
+    result = worker_process.run_simulation_job(
+        f'{path}/started_simulations/Ar_0.json',
+        f'{path}/done_simulations/Ar_0.json')
+    assert result == {'heat_capacity': 1.0, 'file_name': 'Ar_0'}
+
+
+def test_claim_from_directory_uses_cost_manifest(tmp_path, monkeypatch):
+    """Test that jobs are claimed by cost without reading their files."""
+    path = create_workspace(tmp_path, ['Ar_0', 'Ar_1', 'Ar_2'])
+    write_job_costs(path, {'Ar_0.json': 1.0, 'Ar_1.json': 3.0})
+    write_job_costs(path, {'Ar_2.json': 2.0})
+
+    def no_open(*args, **kwargs):
+        raise AssertionError('a job configuration was read')
+
+    job_costs = {}
+    claimed = [worker_process.claim_from_directory(path, job_costs)]
+    monkeypatch.setattr('builtins.open', no_open)
+    claimed += [worker_process.claim_from_directory(path, job_costs)
+                for _ in range(3)]
+    assert claimed == ['Ar_1.json', 'Ar_2.json', 'Ar_0.json', None]
+
+
+def test_collect_analyses(tmp_path):
+    """Test that jobs are finished only once their analyses are."""
+    path = str(tmp_path)
+    names = ['done.json', 'failed.json', 'running.json', 'killed.json']
+    pending = []
+    with JobQueue(f'{path}/jobs.db') as queue:
+        queue.add_jobs(names)
+        for name in names:
+            queue.claim('worker_0')
+            pending.append((name, f'{path}/{name}', futures.Future(), None))
+        pending[0][2].set_result({'file_name': 'done'})
+        pending[1][2].set_exception(ValueError('analysis failed'))
+        pending[3][2].set_exception(BrokenProcessPool('killed'))
+
+        sim_calc_list = []
+        worker_process.collect_analyses(pending, queue, sim_calc_list)
+        assert sim_calc_list == [{'file_name': 'done'}]
+        assert [job[0] for job in pending] == ['running.json']
+        assert queue.status_counts() == {'done': 1, 'failed': 1,
+                                         'started': 1, 'pending': 1}
+        assert os.path.exists(f'{path}/failed_error.txt')
+
+        pending[0][2].set_result({'file_name': 'running'})
+        worker_process.collect_analyses(pending, queue, sim_calc_list,
+                                        wait=True)
+        assert pending == []
+        assert queue.status_counts() == {'done': 2, 'failed': 1,
+                                         'pending': 1}
+
+
+def test_background_analyses(tmp_path, monkeypatch):
+    """Test the worker with the analyses run in a process pool."""
+    path = create_workspace(tmp_path, ['Ar_0', 'Ar_1'])
+    with JobQueue(get_job_queue_path(path)) as queue:
+        queue.add_jobs(['Ar_0.json', 'Ar_1.json'])
+
+    def post_simulation_calculation(sim_info):
+        return {'default_sigterm':
+                signal.getsignal(signal.SIGTERM) == signal.SIG_DFL,
+                'niceness': os.nice(0)}
+
+    monkeypatch.setattr(worker_process, 'post_simulation_calculation',
+                        post_simulation_calculation)
+    sigterm_handler = signal.getsignal(signal.SIGTERM)
+    try:
+        with pytest.raises(SystemExit):
+            worker_process.start(path, analysis_workers=1)
+    finally:
+        signal.signal(signal.SIGTERM, sigterm_handler)
+
+    with JobQueue(get_job_queue_path(path)) as queue:
+        assert queue.status_counts() == {'done': 2}
+    [results_file] = glob.glob(f'{path}/post_process_output/temp_*.csv')
+    with open(results_file) as f:
+        rows = list(csv.DictReader(f))
+    assert sorted(row['file_name'] for row in rows) == ['Ar_0', 'Ar_1']
+    for row in rows:
+        assert row['default_sigterm'] == 'True'
+        assert int(row['niceness']) > os.nice(0)
+
+
+def test_sigterm_requeues_simulation(tmp_path, monkeypatch, capsys):
+    """Test that SIGTERM checkpoints and requeues the running simulation.
+
+    The check_stop observer raises SimulationInterrupted after the signal,
+    and the requeued job continues from the checkpoint when it is run again.
+    """
+    path = create_workspace(tmp_path, ['Ar_0'], steps="100000")
+    monkeypatch.setattr(simulation, '_stop_requested', False)
+    monkeypatch.setattr(worker_process, 'post_simulation_calculation',
+                        lambda sim_info: {'heat_capacity': 1.0})
+    sigterm_handler = signal.getsignal(signal.SIGTERM)
+    threading.Timer(1, os.kill, (os.getpid(), signal.SIGTERM)).start()
+    try:
+        with pytest.raises(SystemExit):
+            worker_process.start(path)
+    finally:
+        signal.signal(signal.SIGTERM, sigterm_handler)
+
+    output = capsys.readouterr().out
+    stop_step = int(re.search(r'Simulation stopped at step (\d+), checkpoint',
+                              output).group(1))
+    assert os.listdir(f'{path}/started_simulations') == []
+    assert os.path.exists(f'{path}/output/traj/Ar_0.checkpoint')
+    with open(f'{path}/unbegun_simulations/Ar_0.json') as f:
+        sim_info = json.load(f)
+    assert sim_info['resume'] == 'True'
+
+    # Run the requeued job for another 100 steps.
+    sim_info['steps'] = str(stop_step + 100)
+    with open(f'{path}/unbegun_simulations/Ar_0.json', 'w') as f:
+        json.dump(sim_info, f)
+    monkeypatch.setattr(simulation, '_stop_requested', False)
+    try:
+        with pytest.raises(SystemExit):
+            worker_process.start(path)
+    finally:
+        signal.signal(signal.SIGTERM, sigterm_handler)
+
+    assert f'Resuming simulation from step {stop_step}.' in (
+        capsys.readouterr().out)
+    assert not os.path.exists(f'{path}/output/traj/Ar_0.checkpoint')
+    with open(f'{path}/done_simulations/Ar_0.json') as f:
+        done_info = json.load(f)
+    assert 'resume' not in done_info
+    assert done_info['steps-done'] == str(stop_step + 100)
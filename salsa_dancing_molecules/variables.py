@@ -47,6 +47,17 @@ class Variables:
                        self.atomic_pressures, self.temperatures, self.time]
         )
 
+    def get_state(self):
+        """Return a copy of the collected data, used for checkpoints."""
+        return {key: (list(value) if isinstance(value, list) else value)
+                for key, value in vars(self).items()}
+
+    def set_state(self, state):
+        """Restore data collected before a checkpoint."""
+        for key, value in state.items():
+            setattr(self, key,
+                    list(value) if isinstance(value, list) else value)
+
     def set_timestep(self, step):
         """Set the timestep."""
         self.timestep = step
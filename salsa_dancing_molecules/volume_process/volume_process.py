@@ -10,20 +10,77 @@ import json
 import os
 import csv
 import numpy as np
-from ..bulk_properties import get_bulk_properties
+from concurrent import futures
+from ..bulk_properties import (MIN_EOS_POINTS, get_average_energy_and_volume,
+                               get_bulk_properties)
 from ..lindemann import get_lindemann_parameter
-from ..equilibrium import get_equilibrium
+from ..mean_square_displacement import parse_memory_limit
+from ..equilibrium import get_trajectory_equilibrium
+from ..trajectory_data import (get_csv_layout, get_frame_of_row,
+                               load_derived_series, load_trajectory_series,
+                               read_csv_series)
 from datetime import datetime
 
-try:
-    from asap3 import Trajectory
-except ImportError:
-    print("asap3 import failed. This should only happen when building docs.")
+
+# Keys that differ between the simulations of one volume-simulation, the
+# steps run differ when the simulations stop once they have converged.
+VOLUME_SCAN_KEYS = ["volume-scale", "traj_output_path", "csv_output_path",
+                    "cost", "steps-done", "stop-reason"]
+
+
+def get_group_key(sim_info):
+    """Return a hashable key shared by the simulations of a volume-simulation.
+
+    Input:
+        sim_info: dict  -simulation information from a json-file
+
+    Output:
+        key: tuple      -sorted pairs of all keys except VOLUME_SCAN_KEYS and
+                         their values as json
+    """
+    return tuple(sorted((key, json.dumps(value, sort_keys=True))
+                        for key, value in sim_info.items()
+                        if key not in VOLUME_SCAN_KEYS))
+
+
+def validate_volume_group(group_list):
+    """Sort the simulations of a volume-simulation by volume scale.
+
+    Input:
+        group_list: list  -simulation information of one volume-simulation
+
+    Output:
+        group_list: list  -the simulations sorted by increasing volume scale
+
+    Raises ValueError if a volume scale is not a number or if several
+    simulations have the same volume scale.
+    """
+    scales = []
+    for sim_info in group_list:
+        try:
+            scales.append(float(sim_info['volume-scale']))
+        except ValueError:
+            raise ValueError('Invalid volume-scale '
+                             f'{sim_info["volume-scale"]} of '
+                             f'{sim_info["traj_output_path"]}') from None
+    order = np.argsort(scales, kind='stable')
+    group_list = [group_list[i] for i in order]
+    scales = [scales[i] for i in order]
+    for i in range(1, len(scales)):
+        if scales[i] == scales[i - 1]:
+            raise ValueError('Simulations '
+                             f'{group_list[i - 1]["traj_output_path"]} and '
+                             f'{group_list[i]["traj_output_path"]} have the '
+                             f'same volume-scale {scales[i]}')
+    return group_list
 
 
 def group_by_volume(sim_info_list):
     """Group volume-simulations.
 
+    Simulations are grouped by a key made of all their values except those
+    in VOLUME_SCAN_KEYS, in a single pass.
+
     Input:
         sim_info_list: list  -list containing simulation information from all
                               json-files
@@ -31,7 +88,8 @@ def group_by_volume(sim_info_list):
     Output:
         sim_info_group_list: list  -list containg lists. All simulations
                                     from the same volume-simulation will be
-                                    grouped together in one sub-list.
+                                    grouped together in one sub-list, sorted
+                                    by volume scale.
         csv_list: list             -list containging csv-file names from
                                     simulations that have not been simulated
                                     for varying volume.
@@ -40,42 +98,70 @@ def group_by_volume(sim_info_list):
                                     varying volume.
 
     """
-    sim_info_groups_list = []
+    groups = {}
     traj_list = []
     csv_list = []
     for sim_info in sim_info_list:
         if 'volume-scale' in sim_info:
-            if len(sim_info_groups_list) == 0:
-                sim_info_groups_list.append([sim_info])
-            else:
-                found_no_match = True
-                for group_list in sim_info_groups_list:
-                    found_group_match = True
-                    for old_sim_info in group_list:
-                        for key in old_sim_info.keys():
-                            if key not in ["volume-scale",
-                                           "traj_output_path",
-                                           "csv_output_path"]:
-                                if old_sim_info[key] != sim_info[key]:
-                                    found_group_match = False
-                                    break
-                    if found_group_match:
-                        group_list.append(sim_info)
-                        found_no_match = False
-                if found_no_match:
-                    sim_info_groups_list.append([sim_info])
+            groups.setdefault(get_group_key(sim_info), []).append(sim_info)
         else:
             traj_list.append(sim_info['traj_output_path'])
             csv_list.append(sim_info['csv_output_path'])
+    sim_info_groups_list = [validate_volume_group(group_list)
+                            for group_list in groups.values()]
     return sim_info_groups_list, traj_list, csv_list
 
 
-def start(path):
+def get_lindemann_result(sim_info, lattice_constant):
+    """Calculate the Lindemann parameter of the optimal volume-simulation.
+
+    Args:
+        sim_info: dict           - simulation information of the optimal
+                                   volume
+        lattice_constant: float  - lattice constant, or cell lengths and
+                                   angles if the lattice was not recognized
+
+    Returns:
+        parameter: float - Lindemann parameter of the last timestep
+        criterion: str   - result of the Lindemann criterion
+    """
+    traj_file = sim_info['traj_output_path']
+    # The MSD is saved with the first trajectory frame after equilibrium by
+    # the post simulation calculations, the trajectory is only read if they
+    # have not been run since it changed.
+    series = load_derived_series(traj_file)
+    if series is not None and 't0' in series:
+        t0 = int(series['t0'])
+    else:
+        # The same equilibrium as in the post simulation calculations.
+        rows_per_frame, first_row = get_csv_layout(sim_info)
+        configs = load_trajectory_series(traj_file)
+        t0_series, _ = get_trajectory_equilibrium(
+            traj_file, sim_info['ensemble'],
+            read_csv_series(sim_info['csv_output_path'], configs,
+                            rows_per_frame, first_row),
+            sim_info['csv_output_path'])
+        t0 = get_frame_of_row(t0_series, rows_per_frame, len(configs))
+    if isinstance(lattice_constant, np.ndarray):
+        a = lattice_constant[0]  # shortest vector
+    else:
+        a = lattice_constant
+    parameter_list, criterion = get_lindemann_parameter(
+        traj_file, a, t0,
+        parse_memory_limit(sim_info.get('analysis-memory')))
+    return parameter_list[-1], criterion
+
+
+def start(path, jobs=None):
     """
     Take a catalog containing files and folders to work on.
 
+    The trajectories of all volume-simulations are analysed in a pool of
+    processes.
+
     Args:
         path: The path to the working directory.
+        jobs: Number of processes, default is the number of CPUs.
 
     """
     path = path.rstrip("/")
@@ -91,28 +177,47 @@ def start(path):
     sim_info_groups_list, traj_list, csv_list = group_by_volume(sim_info_list)
 
     results_list = []
-    for group_list in sim_info_groups_list:
-        group = [sim_info['traj_output_path'] for sim_info in group_list]
-        ensembles = [sim_info['ensemble'] for sim_info in group_list]
-        result_dict = get_bulk_properties(group, ensembles[0])
-        if not result_dict['Lattice constant'] is None or float('NaN'):
-            configs = Trajectory(result_dict['Trajectory file'])
-            # Calculate the equilibrium time of the system
-            t0, equilibrium_warning = get_equilibrium(configs, ensembles[0])
-            if type(result_dict['Lattice constant']) == np.ndarray:
-                a = result_dict['Lattice constant'][0]  # shortest vector
+    with futures.ProcessPoolExecutor(jobs) as pool:
+        # The trajectories of all groups are submitted at once, so that
+        # small groups do not leave processes idle.
+        average_futures = []
+        for group_list in sim_info_groups_list:
+            if len(group_list) < MIN_EOS_POINTS:
+                average_futures.append(None)
+                continue
+            average_futures.append([
+                pool.submit(get_average_energy_and_volume,
+                            sim_info['traj_output_path'],
+                            sim_info['ensemble'],
+                            sim_info['csv_output_path'],
+                            *get_csv_layout(sim_info))
+                for sim_info in group_list])
+
+        lindemann_futures = []
+        for group_list, group_futures in zip(sim_info_groups_list,
+                                             average_futures):
+            group = [sim_info['traj_output_path'] for sim_info in group_list]
+            ensemble = group_list[0]['ensemble']
+            averages = None
+            if group_futures is not None:
+                averages = [future.result() for future in group_futures]
+            result_dict = get_bulk_properties(group, ensemble, averages)
+            if result_dict['Trajectory file'] is not None:
+                sim_info = group_list[group.index(
+                    result_dict['Trajectory file'])]
+                lindemann_futures.append(pool.submit(
+                    get_lindemann_result, sim_info,
+                    result_dict['Lattice constant']))
             else:
-                a = result_dict['Lattice constant']
-            parameter_list, criterion = get_lindemann_parameter(
-                                            result_dict['Trajectory file'],
-                                            a,
-                                            t0)
-        else:
-            parameter_list = None
-            criterion = None
-        result_dict['Lindeman parameter last timestep'] = parameter_list[-1]
-        result_dict['Lindeman criterion'] = criterion
-        results_list.append(result_dict)
+                lindemann_futures.append(None)
+            results_list.append(result_dict)
+
+        for result_dict, future in zip(results_list, lindemann_futures):
+            parameter, criterion = None, None
+            if future is not None:
+                parameter, criterion = future.result()
+            result_dict['Lindeman parameter last timestep'] = parameter
+            result_dict['Lindeman criterion'] = criterion
 
     post_process_dir = f'{path}/post_process_output'
 
@@ -132,8 +237,12 @@ def start(path):
     results_file_name = "post_process_"+dt_string+".csv"
     results_file_name = (path + "/post_process_output/" +
                          results_file_name)
+    # Results of the simulations gathered by an MPI dispatcher are already
+    # in their own results file, so there may be no temporary files.
+    fieldnames = []
+    for row in results_list[:1] + post_calc_info[:1]:
+        fieldnames += list(row.keys())
     f = open(results_file_name, "w+")
-    fieldnames = list(results_list[0].keys())+list(post_calc_info[0].keys())
     writer = csv.DictWriter(f, fieldnames)
     writer.writeheader()
     for post_calc_dict in post_calc_info:
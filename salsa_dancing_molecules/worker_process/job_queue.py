@@ -0,0 +1,413 @@
+"""SQLite backed queue of simulation jobs.
+
+Claiming jobs by renaming files in unbegun_simulations makes every worker
+list the directory and race for the same file. With a job table, a job is
+claimed with a single indexed query inside a transaction, so no two
+workers can claim the same job and no directory listing is needed.
+
+A claimed job is leased to its worker for a limited time, and the worker
+renews the lease with regular heartbeats while the simulation runs. Jobs
+whose lease has expired belonged to workers that crashed or were killed,
+and are made pending again until they have been attempted too many times.
+
+Pending jobs are claimed in order of decreasing estimated cost, so that
+the longest simulations do not end up being started last. Workspaces
+without a job database get the costs from a manifest that startup writes
+once, so the workers do not have to read every job configuration.
+
+Write-ahead logging needs memory shared by all connections, which does
+not work across the nodes of a cluster. On network and parallel file
+systems, e.g. NFS or Lustre, the database therefore uses a rollback
+journal instead, which only needs file locking. The file system must
+still support POSIX file locks across nodes. Local file systems, which
+only workers on one node can use, get write-ahead logging.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PENDING = 'pending'
+STARTED = 'started'
+DONE = 'done'
+FAILED = 'failed'
+
+# File system types that are shared between the nodes of a cluster.
+SHARED_FILESYSTEMS = {'nfs', 'nfs4', 'lustre', 'gpfs', 'beegfs', 'cifs',
+                      'smb3', 'ceph', 'fuse.glusterfs', 'panfs', 'pvfs2',
+                      'orangefs'}
+
+
+def is_shared_filesystem(path, mounts_path='/proc/mounts'):
+    """Check if a path is on a file system shared between nodes.
+
+    arguments:
+        path: str         - path to check
+        mounts_path: str  - file listing the mounted file systems
+
+    returns:
+        shared: bool - True if the file system of the path is a network or
+                       parallel file system, False if it is local or the
+                       mounts could not be read
+    """
+    path = os.path.realpath(path)
+    try:
+        with open(mounts_path) as f:
+            mounts = [line.split()[1:3] for line in f if line.strip()]
+    except OSError:
+        return False
+    fs_type = None
+    mount_length = -1
+    for mount_point, mount_type in mounts:
+        # Spaces in mount points are escaped as \040.
+        mount_point = mount_point.replace('\\040', ' ')
+        inside = (path == mount_point or
+                  path.startswith(mount_point.rstrip('/') + '/'))
+        if inside and len(mount_point) > mount_length:
+            fs_type = mount_type
+            mount_length = len(mount_point)
+    return fs_type in SHARED_FILESYSTEMS
+
+
+def get_job_queue_path(work_path):
+    """Get the path of the job database of a workspace.
+
+    arguments:
+        work_path: str - path to simulation workspace
+
+    returns:
+        db_path: str - path to the job database
+    """
+    return f'{work_path.rstrip("/")}/jobs.db'
+
+
+class JobQueue:
+    """Queue of simulation jobs stored in an SQLite database.
+
+    Each job is identified by the file name of its configuration in the
+    workspace and moves from pending to started to done or failed.
+    """
+
+    def __init__(self, db_path, timeout=600, lease_time=600):
+        """Open the job database, creating the tables if needed.
+
+        arguments:
+            db_path: str       - path to the database file
+            timeout: int       - seconds to wait for other workers holding
+                                 the database lock
+            lease_time: float  - seconds a claimed job stays leased to its
+                                 worker without a heartbeat
+        """
+        self.db_path = db_path
+        self.lease_time = lease_time
+        # Transactions are started explicitly, see _transaction.
+        self.connection = sqlite3.connect(db_path, timeout=timeout,
+                                          isolation_level=None)
+        if is_shared_filesystem(os.path.dirname(os.path.abspath(db_path))):
+            self.connection.execute('PRAGMA journal_mode=DELETE')
+            self.connection.execute('PRAGMA synchronous=FULL')
+        else:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'name TEXT PRIMARY KEY, '
+            'status TEXT NOT NULL, '
+            'worker TEXT, '
+            'started_at REAL, '
+            'finished_at REAL, '
+            'message TEXT, '
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'lease_until REAL, '
+            'cost REAL NOT NULL DEFAULT 0)')
+        # Databases created by earlier versions lack some columns.
+        columns = [row[1] for row in
+                   self.connection.execute('PRAGMA table_info(jobs)')]
+        if 'attempts' not in columns:
+            self.connection.execute('ALTER TABLE jobs ADD COLUMN attempts '
+                                    'INTEGER NOT NULL DEFAULT 0')
+        if 'lease_until' not in columns:
+            self.connection.execute('ALTER TABLE jobs ADD COLUMN '
+                                    'lease_until REAL')
+        if 'cost' not in columns:
+            self.connection.execute('ALTER TABLE jobs ADD COLUMN cost '
+                                    'REAL NOT NULL DEFAULT 0')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS jobs_status_cost '
+            'ON jobs (status, cost)')
+
+    def __enter__(self):
+        """Use the queue as a context manager."""
+        return self
+
+    def __exit__(self, *args):
+        """Close the database when leaving the context."""
+        self.close()
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+    def _transaction(self):
+        """Start a transaction holding the write lock."""
+        self.connection.execute('BEGIN IMMEDIATE')
+
+    def add_jobs(self, names, costs=None):
+        """Add pending jobs, jobs that already exist are left unchanged.
+
+        arguments:
+            names: list(str)    - file names of the job configurations
+            costs: list(float)  - estimated costs of the jobs, jobs with
+                                  higher cost are claimed first
+        """
+        if costs is None:
+            costs = [0] * len(names)
+        self._transaction()
+        try:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO jobs (name, status, cost) '
+                'VALUES (?, ?, ?)',
+                [(name, PENDING, cost) for name, cost in zip(names, costs)])
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def claim(self, worker):
+        """Claim the most expensive pending job and lease it to the worker.
+
+        arguments:
+            worker: str - identifier of the claiming worker
+
+        returns:
+            name: str | None - file name of the claimed job, or None if
+                               there are no pending jobs
+        """
+        self._transaction()
+        try:
+            row = self.connection.execute(
+                'SELECT name FROM jobs WHERE status = ? '
+                'ORDER BY cost DESC LIMIT 1',
+                (PENDING,)).fetchone()
+            if row is not None:
+                now = time.time()
+                self.connection.execute(
+                    'UPDATE jobs SET status = ?, worker = ?, started_at = ?, '
+                    'attempts = attempts + 1, lease_until = ? '
+                    'WHERE name = ?',
+                    (STARTED, worker, now, now + self.lease_time, row[0]))
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+        return None if row is None else row[0]
+
+    def renew_lease(self, name, worker):
+        """Extend the lease of a started job.
+
+        arguments:
+            name: str   - file name of the job configuration
+            worker: str - identifier of the worker holding the lease
+
+        returns:
+            renewed: bool - False if the job is no longer leased to the
+                            worker, e.g. because the lease expired
+        """
+        cursor = self.connection.execute(
+            'UPDATE jobs SET lease_until = ? '
+            'WHERE name = ? AND worker = ? AND status = ?',
+            (time.time() + self.lease_time, name, worker, STARTED))
+        return cursor.rowcount == 1
+
+    def reclaim_expired(self, max_attempts):
+        """Make started jobs with expired leases pending again.
+
+        Jobs that have already been attempted max_attempts times are
+        marked as failed instead.
+
+        arguments:
+            max_attempts: int - number of times a job is attempted
+
+        returns:
+            pending: list(str) - names of the jobs made pending again
+            failed: list(str)  - names of the jobs marked as failed
+        """
+        self._transaction()
+        try:
+            rows = self.connection.execute(
+                'SELECT name, attempts FROM jobs '
+                'WHERE status = ? AND lease_until < ?',
+                (STARTED, time.time())).fetchall()
+            pending = [name for name, attempts in rows
+                       if attempts < max_attempts]
+            failed = [name for name, attempts in rows
+                      if attempts >= max_attempts]
+            for name in pending:
+                self._set_status(name, PENDING)
+            for name in failed:
+                self._set_status(name, FAILED,
+                                 f'Lease expired {max_attempts} times.')
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+        return pending, failed
+
+    def _set_status(self, name, status, message=None):
+        """Change the status of a job and release its lease."""
+        finished_at = time.time() if status in (DONE, FAILED) else None
+        self.connection.execute(
+            'UPDATE jobs SET status = ?, finished_at = ?, message = ?, '
+            'lease_until = NULL WHERE name = ?',
+            (status, finished_at, message, name))
+
+    def complete(self, name):
+        """Mark a job as successfully completed."""
+        self._set_status(name, DONE)
+
+    def fail(self, name, message=''):
+        """Mark a job as failed.
+
+        arguments:
+            name: str    - file name of the job configuration
+            message: str - description of the failure
+        """
+        self._set_status(name, FAILED, message)
+
+    def requeue(self, name):
+        """Make a started job pending again."""
+        self._set_status(name, PENDING)
+
+    def status_counts(self):
+        """Return the number of jobs with each status.
+
+        returns:
+            counts: dict(str, int) - number of jobs per status
+        """
+        rows = self.connection.execute(
+            'SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+
+class LeaseHeartbeat(threading.Thread):
+    """Background thread renewing the lease of a running job.
+
+    The thread uses its own database connection and renews the lease every
+    interval seconds until it is stopped. Use it as a context manager
+    around the simulation, or start and stop it around a background
+    analysis.
+
+    If the lease can not be renewed, the job may already have been
+    reclaimed by another worker. The lost event is then set, and the
+    simulation must be stopped without touching the files of the job.
+    """
+
+    def __init__(self, db_path, name, worker, lease_time, interval):
+        """Create the heartbeat thread.
+
+        arguments:
+            db_path: str       - path to the job database
+            name: str          - file name of the running job
+            worker: str        - identifier of the worker holding the lease
+            lease_time: float  - seconds each renewal extends the lease by
+            interval: float    - seconds between renewals
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.db_path = db_path
+        self.job_name = name
+        self.worker = worker
+        self.lease_time = lease_time
+        self.interval = interval
+        self._stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        """Renew the lease until the thread is stopped."""
+        with JobQueue(self.db_path, lease_time=self.lease_time) as queue:
+            while not self._stopped.wait(self.interval):
+                if not queue.renew_lease(self.job_name, self.worker):
+                    print(f'Lost the lease of {self.job_name}, stopping '
+                          'its simulation.')
+                    self.lost.set()
+                    return
+
+    def stop(self):
+        """Stop the heartbeats."""
+        self._stopped.set()
+        self.join()
+
+    def __enter__(self):
+        """Start the heartbeats."""
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop the heartbeats."""
+        self.stop()
+
+
+def get_job_costs_path(work_path):
+    """Get the path of the manifest of job costs of a workspace.
+
+    arguments:
+        work_path: str - path to simulation workspace
+
+    returns:
+        costs_path: str - path to the manifest
+    """
+    return f'{work_path.rstrip("/")}/job_costs.json'
+
+
+def write_job_costs(work_path, job_costs):
+    """Add the estimated costs of jobs to the manifest of a workspace.
+
+    The manifest is written to a temporary file that then replaces the old
+    one, so workers never read a partially written manifest.
+
+    arguments:
+        work_path: str               - path to simulation workspace
+        job_costs: dict(str, float)  - estimated cost of each job by the
+                                       file name of its configuration
+    """
+    costs_path = get_job_costs_path(work_path)
+    costs = read_job_costs(work_path)
+    costs.update(job_costs)
+    with open(costs_path + '.tmp', 'w') as f:
+        json.dump(costs, f)
+    os.replace(costs_path + '.tmp', costs_path)
+
+
+def read_job_costs(work_path):
+    """Read the manifest of job costs of a workspace.
+
+    arguments:
+        work_path: str - path to simulation workspace
+
+    returns:
+        job_costs: dict(str, float) - estimated cost of each job, empty if
+                                      there is no manifest
+    """
+    try:
+        with open(get_job_costs_path(work_path)) as f:
+            return {name: float(cost) for name, cost in json.load(f).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def open_job_queue(work_path, lease_time=600):
+    """Open the job database of a workspace if it has one.
+
+    arguments:
+        work_path: str     - path to simulation workspace
+        lease_time: float  - seconds a claimed job stays leased to its
+                             worker without a heartbeat
+
+    returns:
+        queue: JobQueue | None - the job queue or None if the workspace
+                                 uses the unbegun_simulations directory
+    """
+    db_path = get_job_queue_path(work_path)
+    if not os.path.exists(db_path):
+        return None
+    return JobQueue(db_path, lease_time=lease_time)
@@ -7,12 +7,13 @@ except ImportError:
     print("asap3 import failed. This should only happen when building docs.")
 
 
-def start_simulation(sim_info, atoms):
+def start_simulation(sim_info, atoms, abort=None):
     """Take data on the simulation and send it to the correct module.
 
     Args:
         simulation_info: Dictionary with information on the simulation.
         atoms_object: Material to be used for the simulation.
+        abort: Event that aborts the simulation when set, see run.
     """
     repeat = int(sim_info["repeat"])
     symbols = atoms.symbols
@@ -29,7 +30,7 @@ def start_simulation(sim_info, atoms):
     while True:
         try:
             print(f'Simulating for {symbols}')
-            run(sim_info, atoms)
+            run(sim_info, atoms, abort)
         except ValueError as e:
             print(f'Size error for {symbols}: {e}')
             # failsafe against automatic increase of cells becomes too
@@ -42,7 +43,7 @@ def start_simulation(sim_info, atoms):
                       'of cells')
                 sim_info["use-asap"] = "True"
                 sim_info["potential"] = "lennard-jones"
-                run(sim_info, atoms)
+                run(sim_info, atoms, abort)
             else:
                 repeat = repeat + 1
                 print('Increasing amount of cells, repeat = '+str(repeat))
@@ -52,7 +53,7 @@ def start_simulation(sim_info, atoms):
             print('Trying without ASAP3...')
             sim_info["potential"] = "lennard-jones"
             sim_info["use-asap"] = "False"
-            run(sim_info, atoms)
+            run(sim_info, atoms, abort)
             break
         # else will only be executed if there is no error
         else:
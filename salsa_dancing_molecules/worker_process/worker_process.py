@@ -2,18 +2,40 @@
 
 This program takes in a list of jobs, picks one, then moves the file and
 runs the simulation according to the data.
+
+When the workers are started as an MPI program, e.g. with srun, and mpi4py
+is installed, rank 0 instead claims all jobs and hands them out to the
+other ranks over MPI. Rank 0 also gathers the results, so only one
+temporary results file is written.
 """
 import os
 import csv
 import json
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+import signal
 import sys
+import time
 import uuid
 from datetime import datetime
+import ase.parallel
 from .infiles_handler import handle_files
 from .simulation_starter import start_simulation
+from .job_queue import (STARTED, LeaseHeartbeat, open_job_queue,
+                        read_job_costs)
+from ..simulations.simulation import (SimulationAborted,
+                                      SimulationInterrupted, request_stop,
+                                      stop_requested)
 from ..post_process.post_simulation_calculation import (
                                                 post_simulation_calculation)
 
+# Message tags and report status of the MPI dispatch mode.
+MPI_JOB_TAG = 1
+MPI_REPORT_TAG = 2
+MPI_INTERRUPTED = 'interrupted'
+# Seconds rank 0 sleeps between checks for reports from the workers.
+MPI_POLL_INTERVAL = 0.1
+
 
 def log_simulation_exception(started_path, exception):
     """Log an exception for a simulation.
@@ -32,46 +54,164 @@ def log_simulation_exception(started_path, exception):
         f.write(str(exception))
 
 
-def run_simulation_job(started_path, done_path):
+def analyse_simulation(sim_info, sim_file_name):
+    """Run the post simulation calculations of a finished simulation.
+
+    arguments:
+        sim_info: dict()    - configuration of the finished simulation
+        sim_file_name: str  - name of the simulation configuration without
+                              file extension
+
+    returns:
+        sim_results: dict() - results of the post simulation calculations
+    """
+    sim_results = post_simulation_calculation(sim_info)
+
+    # Add the name of the simulation configuration to the simulation
+    # result.
+    sim_results["file_name"] = sim_file_name
+    return sim_results
+
+
+def lower_priority():
+    """Lower the scheduling priority of the calling process."""
+    os.nice(10)
+
+
+def init_analysis_process():
+    """Prepare a background analysis process.
+
+    The process inherits the SIGTERM handler of the worker, which would
+    only request a stop that the analysis never checks. It is reset, so
+    that the process ends with the worker. The analysis also runs at lower
+    priority than the simulations.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    lower_priority()
+
+
+def run_simulation_job(started_path, done_path, analysis_pool=None,
+                       abort=None):
     """Run a single simulation job.
 
     Run a single simulation job described by the configuration pointed to by
     started_path. The simulation configuration is moved to done_path on
-    successful completion.
+    successful completion. If the configuration is already in done_path,
+    the simulation was finished by a worker that died during the analysis,
+    and only the analysis is run.
+
+    If an analysis pool is given, the post simulation calculations are
+    submitted to it and the worker can start the next simulation while
+    they run.
 
     arguments:
         started_path: str - path to simulation job configuration
         done_path: str    - path to store the job configuration when simulation
                             has successfully completed
+        analysis_pool: ProcessPoolExecutor | None - pool to run the post
+                            simulation calculations in
+        abort: threading.Event | None - aborts the simulation when set,
+                            e.g. when the lease of the job is lost
 
     returns:
-        simulation_result: list(dict()) | None - list of simulation results or
-                                                 None on error
+        simulation_result: dict() | Future | None - simulation results, a
+                            future of them when analysis_pool is given, or
+                            None on error
+
+    raises:
+        SimulationInterrupted - if the worker is stopped during the
+                                simulation
+        SimulationAborted     - if abort is set during the simulation
     """
     try:
-        sim_info, atoms_obj = handle_files(started_path)
-        start_simulation(sim_info, atoms_obj)
-
-        # Mark the simulation as completed by moving the simulation job
-        # description to the done directory.
-        os.rename(started_path, done_path)
-
-        with open(done_path) as f:
-            sim_info = json.load(f)
-
-        sim_results = post_simulation_calculation(sim_info)
+        if os.path.exists(done_path) and not os.path.exists(started_path):
+            print(f'{os.path.basename(done_path)} is already simulated, '
+                  'running its analysis.')
+            with open(done_path) as f:
+                sim_info = json.load(f)
+        else:
+            sim_info = finish_simulation(started_path, done_path, abort)
 
-        # Add the name of the simulation configuration to the simulation
-        # result.
         sim_file_name = os.path.splitext(os.path.basename(started_path))[0]
-        sim_results["file_name"] = sim_file_name
-
-        return sim_results
+        if analysis_pool is not None:
+            return analysis_pool.submit(analyse_simulation, sim_info,
+                                        sim_file_name)
+        return analyse_simulation(sim_info, sim_file_name)
+    except (SimulationInterrupted, SimulationAborted):
+        raise
     except Exception as e:
         log_simulation_exception(started_path, e)
         return None
 
 
+def finish_simulation(started_path, done_path, abort=None):
+    """Run a simulation and move its configuration to done_path.
+
+    arguments:
+        started_path: str             - path to simulation job configuration
+        done_path: str                - path to store the job configuration
+        abort: threading.Event | None - aborts the simulation when set
+
+    returns:
+        sim_info: dict() - configuration of the finished simulation
+    """
+    sim_info, atoms_obj = handle_files(started_path)
+    start_simulation(sim_info, atoms_obj, abort)
+    if abort is not None and abort.is_set():
+        raise SimulationAborted('Simulation finished after its lease was '
+                                'lost.')
+
+    # Mark the simulation as completed by moving the simulation job
+    # description to the done directory.
+    os.rename(started_path, done_path)
+
+    with open(done_path) as f:
+        done_info = json.load(f)
+
+    # The resume marker is only needed while the job is unfinished, and the
+    # steps run and the sampling intervals are recorded with the job.
+    done_info.pop("resume", None)
+    for key in ["steps-done", "stop-reason", "csv-interval",
+                "traj-interval"]:
+        if key in sim_info:
+            done_info[key] = sim_info[key]
+    with open(done_path, "w") as f:
+        json.dump(done_info, f)
+    return done_info
+
+
+def requeue_simulation(started_path, unbegun_path):
+    """Move an interrupted simulation job back to unbegun_simulations.
+
+    The job configuration gets a resume marker, and when the job is run
+    again the simulation continues from its checkpoint.
+
+    arguments:
+        started_path: str - path to the simulation job configuration
+        unbegun_path: str - path to move the job configuration to
+    """
+    with open(started_path) as f:
+        sim_info = json.load(f)
+    sim_info["resume"] = "True"
+    # Write the marker before moving the file, so that other workers never
+    # see a partially written configuration.
+    with open(started_path, "w") as f:
+        json.dump(sim_info, f)
+    os.rename(started_path, unbegun_path)
+    print(f'Requeued {os.path.basename(started_path)}')
+
+
+def handle_sigterm(signum, frame):
+    """Stop the worker gracefully when the job is terminated.
+
+    SLURM sends SIGTERM before killing the job at the time limit. The
+    running simulation writes a checkpoint and is requeued, and no new
+    simulations are started.
+    """
+    print('Received SIGTERM, stopping after checkpointing the simulation.')
+    request_stop()
+
+
 def post_process_write_temporary(work_dir, rank, sim_calc_list):
     """Write a temporary post process data file.
 
@@ -95,6 +235,32 @@ def post_process_write_temporary(work_dir, rank, sim_calc_list):
             writer.writerow(result_dict)
 
 
+def post_process_write_results(work_dir, sim_calc_list):
+    """Write the final post process results file.
+
+    arguments:
+        work_dir: str               - path to simulation workspace
+        sim_calc_list: list(dict()) - list with simulation results
+
+    returns:
+        results_file_name: str - path to the written results file
+    """
+    post_process_dir = f'{work_dir}/post_process_output'
+
+    # Create the name of the final results file.
+    now = datetime.now()
+    dt_string = now.strftime("%d-%m-%y_%H_%M_%S")
+    results_file_name = f'{post_process_dir}/post_process_{dt_string}.csv'
+
+    with open(results_file_name, "w+") as f:
+        fieldnames = sim_calc_list[0].keys()
+        writer = csv.DictWriter(f, fieldnames)
+        writer.writeheader()
+        for result_dict in sim_calc_list:
+            writer.writerow(result_dict)
+    return results_file_name
+
+
 def post_process_all_files(work_dir):
     """Post process all temporary files in work_dir/post_process_output.
 
@@ -120,18 +286,7 @@ def post_process_all_files(work_dir):
     if len(all_post_calc_info) == 0:
         return
 
-    # Create the name of the final results file.
-    now = datetime.now()
-    dt_string = now.strftime("%d-%m-%y_%H_%M_%S")
-    results_file_name = f'{post_process_dir}/post_process_{dt_string}.csv'
-
-    # Write all results to the final results file.
-    with open(results_file_name, "w+") as f:
-        fieldnames = all_post_calc_info[0].keys()
-        writer = csv.DictWriter(f, fieldnames)
-        writer.writeheader()
-        for result_dict in all_post_calc_info:
-            writer.writerow(result_dict)
+    post_process_write_results(work_dir, all_post_calc_info)
 
     # Clean all temporary files.
     for file in os.listdir(post_process_dir):
@@ -139,43 +294,488 @@ def post_process_all_files(work_dir):
             os.remove(f'{post_process_dir}/{file}')
 
 
-def start(path):
+def requeue_started_simulations(path):
+    """Move stranded simulation jobs back to unbegun_simulations.
+
+    Jobs left in started_simulations by workers that were killed, e.g. at
+    the time limit of the allocation, are made available again. When such
+    a job is run again, the simulation continues from its last checkpoint.
+    Jobs that failed with an exception are left in started_simulations.
+
+    This must not be done while other workers are running, since their
+    jobs would then be run twice.
+
+    arguments:
+        path: str - path to simulation workspace
+    """
+    path = path.rstrip("/")
+    started_dir = f'{path}/started_simulations'
+    queue = open_job_queue(path)
+    for file in os.listdir(started_dir):
+        name, extension = os.path.splitext(file)
+        if extension != ".json":
+            continue
+        if os.path.exists(f'{started_dir}/{name}_error.txt'):
+            continue
+        try:
+            requeue_simulation(f'{started_dir}/{file}',
+                               f'{path}/unbegun_simulations/{file}')
+        except FileNotFoundError as e:
+            print(e)
+        else:
+            if queue:
+                queue.requeue(file)
+    if queue:
+        queue.close()
+
+
+def print_job_status(path):
+    """Print the number of jobs with each status in the job database.
+
+    arguments:
+        path: str - path to simulation workspace
+    """
+    queue = open_job_queue(path)
+    if queue is None:
+        print(f'No job database found in {path}.')
+        return
+    with queue:
+        for status, count in sorted(queue.status_counts().items()):
+            print(f'{status}: {count}')
+
+
+def claim_from_directory(path, job_costs):
+    """Claim a simulation job by moving it to started_simulations.
+
+    Reserve a simulation job by moving the simulation specification from
+    unbegun_simulations to started_simulations. The job with the highest
+    estimated cost is claimed first. The costs are read once from the
+    manifest written by startup, jobs missing from it have cost 0. If
+    another competing worker process steals the file, an exception will be
+    raised and we try again with another file.
+
+    arguments:
+        path: str                    - path to simulation workspace
+        job_costs: dict(str, float)  - estimated costs of the jobs, read
+                                       from the manifest when empty
+
+    returns:
+        file_name: str | None - file name of the claimed job or None when
+                                there are no jobs left
+    """
+    while True:
+        list_of_files = os.listdir(path+"/unbegun_simulations")
+        if len(list_of_files) == 0:
+            return None
+        if not job_costs:
+            job_costs.update(read_job_costs(path))
+        current_file = max(list_of_files,
+                           key=lambda file: job_costs.get(file, 0))
+        try:
+            os.rename(f'{path}/unbegun_simulations/{current_file}',
+                      f'{path}/started_simulations/{current_file}')
+        except FileNotFoundError as e:
+            print(e)
+        except FileExistsError as e:
+            print(e)
+        else:
+            return current_file
+
+
+def claim_from_queue(path, queue, rank):
+    """Claim a simulation job from the job database.
+
+    The job is claimed in the database, after which no other worker will
+    touch its configuration file, which is then moved to
+    started_simulations. The configuration of a job reclaimed from a dead
+    worker is already in started_simulations, or in done_simulations if the
+    worker died during the analysis.
+
+    arguments:
+        path: str        - path to simulation workspace
+        queue: JobQueue  - job queue of the workspace
+        rank: str        - identifier of this worker
+
+    returns:
+        file_name: str | None - file name of the claimed job or None when
+                                there are no jobs left
+    """
+    while True:
+        current_file = queue.claim(rank)
+        if current_file is None:
+            return None
+        started_path = f'{path}/started_simulations/{current_file}'
+        done_path = f'{path}/done_simulations/{current_file}'
+        try:
+            os.rename(f'{path}/unbegun_simulations/{current_file}',
+                      started_path)
+        except FileNotFoundError as e:
+            if os.path.exists(started_path) or os.path.exists(done_path):
+                return current_file
+            print(e)
+            queue.fail(current_file, str(e))
+        except OSError as e:
+            print(e)
+            queue.fail(current_file, str(e))
+        else:
+            return current_file
+
+
+def reclaim_expired_jobs(path, queue, max_attempts):
+    """Reclaim the jobs of workers whose leases have expired.
+
+    The jobs are made pending again and continue from their last
+    checkpoint when claimed. Jobs that have been attempted max_attempts
+    times get an error file and are not run again.
+
+    arguments:
+        path: str          - path to simulation workspace
+        queue: JobQueue    - job queue of the workspace
+        max_attempts: int  - number of times a job is attempted
+    """
+    pending, failed = queue.reclaim_expired(max_attempts)
+    for file in pending:
+        print(f'Reclaimed {file} from a worker with an expired lease.')
+    for file in failed:
+        log_simulation_exception(
+            f'{path}/started_simulations/{file}',
+            f'The lease of {file} expired {max_attempts} times.')
+
+
+def wait_for_stragglers(queue):
+    """Wait a while if other workers are still running jobs.
+
+    Jobs of workers that die are reclaimed when their leases expire, so
+    idle workers stay around until all jobs have finished.
+
+    arguments:
+        queue: JobQueue - job queue of the workspace
+
+    returns:
+        waiting: bool - False if no jobs are running and the worker is
+                        done
+    """
+    if queue.status_counts().get(STARTED, 0) == 0:
+        return False
+    waited = 0
+    # Sleep in short steps to notice SIGTERM.
+    while waited < queue.lease_time / 3 and not stop_requested():
+        time.sleep(1)
+        waited += 1
+    return True
+
+
+def claim_job(path, queue, rank, job_costs, max_attempts):
+    """Claim the next simulation job.
+
+    arguments:
+        path: str                    - path to simulation workspace
+        queue: JobQueue | None       - job queue of the workspace
+        rank: str                    - identifier of this worker
+        job_costs: dict(str, float)  - estimated costs of the jobs, see
+                                       claim_from_directory
+        max_attempts: int            - number of times a job is attempted
+
+    returns:
+        file_name: str | None - file name of the claimed job or None when
+                                there are no jobs left
+    """
+    if queue:
+        reclaim_expired_jobs(path, queue, max_attempts)
+        return claim_from_queue(path, queue, rank)
+    return claim_from_directory(path, job_costs)
+
+
+def finish_job(queue, file_name, result):
+    """Record the outcome of a simulation job in the job database.
+
+    arguments:
+        queue: JobQueue | None      - job queue of the workspace
+        file_name: str              - file name of the job
+        result: dict() | None       - simulation result or None on error
+    """
+    if not queue:
+        return
+    if result:
+        queue.complete(file_name)
+    else:
+        queue.fail(file_name, 'See the error file of the job.')
+
+
+def get_mpi_communicator():
+    """Get the MPI communicator if the workers run as an MPI program.
+
+    returns:
+        comm: MPI.Comm | None - MPI.COMM_WORLD, or None if mpi4py is not
+                                installed or there is only one rank
+    """
+    try:
+        from mpi4py import MPI
+    except ImportError:
+        return None
+
+    # ASE starts using MPI when mpi4py is imported, but every rank runs its
+    # own simulations, so ASE must treat each rank as a serial program.
+    ase.parallel.world.comm = ase.parallel.DummyMPI()
+
+    if MPI.COMM_WORLD.Get_size() < 2:
+        return None
+    return MPI.COMM_WORLD
+
+
+def dispatch_jobs(comm, path, lease_time, max_attempts):
+    """Hand out simulation jobs to the other MPI ranks.
+
+    Rank 0 claims the jobs and sends their file names to idle ranks, which
+    report back with the results. Leases of the running jobs are renewed
+    by rank 0, so only this rank accesses the job database. When all ranks
+    are done, the gathered results are written to the final results file,
+    without temporary files.
+
+    arguments:
+        comm: MPI.Comm     - communicator of the workers
+        path: str          - path to simulation workspace
+        lease_time: float  - seconds a job stays leased without a heartbeat
+        max_attempts: int  - number of times a job is attempted
+    """
+    rank = str(uuid.uuid1())
+    queue = open_job_queue(path, lease_time)
+    job_costs = {}
+    sim_calc_list = []
+
+    # Jobs running on each rank, and ranks waiting for a job.
+    running = {}
+    idle = []
+    n_workers = comm.Get_size() - 1
+    last_renewal = time.time()
+    # When there are no jobs to claim, wait a while before trying again.
+    next_claim = 0
+
+    request = comm.irecv(tag=MPI_REPORT_TAG)
+    while n_workers > 0:
+        received, report = request.test()
+        if received:
+            request = comm.irecv(tag=MPI_REPORT_TAG)
+            file_name = running.pop(report["rank"], None)
+            if report["status"] == MPI_INTERRUPTED:
+                if queue:
+                    queue.requeue(file_name)
+            elif file_name is not None:
+                if report["result"]:
+                    sim_calc_list.append(report["result"])
+                finish_job(queue, file_name, report["result"])
+            idle.append(report["rank"])
+            next_claim = 0
+
+        while idle and not stop_requested() and time.time() >= next_claim:
+            current_file = claim_job(path, queue, rank, job_costs,
+                                     max_attempts)
+            if current_file is None:
+                next_claim = time.time() + lease_time / 3
+                break
+            worker = idle.pop()
+            running[worker] = current_file
+            comm.send(current_file, dest=worker, tag=MPI_JOB_TAG)
+
+        # Idle ranks wait for running jobs that might be reclaimed, see
+        # wait_for_stragglers, and are otherwise stopped.
+        if idle and (stop_requested() or not queue or
+                     queue.status_counts().get(STARTED, 0) == 0):
+            for worker in idle:
+                comm.send(None, dest=worker, tag=MPI_JOB_TAG)
+            n_workers -= len(idle)
+            idle = []
+
+        if queue and time.time() - last_renewal > lease_time / 3:
+            for file_name in running.values():
+                queue.renew_lease(file_name, rank)
+            last_renewal = time.time()
+
+        if not received:
+            time.sleep(MPI_POLL_INTERVAL)
+    request.cancel()
+
+    if queue:
+        queue.close()
+
+    if len(sim_calc_list) > 0:
+        post_process_write_results(path, sim_calc_list)
+
+
+def work_for_dispatcher(comm, path):
+    """Run the simulation jobs handed out by rank 0.
+
+    arguments:
+        comm: MPI.Comm - communicator of the workers
+        path: str      - path to simulation workspace
+    """
+    report = {"rank": comm.Get_rank(), "status": None, "result": None}
+    comm.send(report, dest=0, tag=MPI_REPORT_TAG)
+    while True:
+        current_file = comm.recv(source=0, tag=MPI_JOB_TAG)
+        if current_file is None:
+            break
+
+        unbegun_path = f'{path}/unbegun_simulations/{current_file}'
+        started_path = f'{path}/started_simulations/{current_file}'
+        done_path = f'{path}/done_simulations/{current_file}'
+
+        report = {"rank": comm.Get_rank(), "status": None, "result": None}
+        try:
+            report["result"] = run_simulation_job(started_path, done_path)
+        except SimulationInterrupted as e:
+            print(e)
+            requeue_simulation(started_path, unbegun_path)
+            report["status"] = MPI_INTERRUPTED
+        comm.send(report, dest=0, tag=MPI_REPORT_TAG)
+
+
+def collect_analyses(pending, queue, sim_calc_list, wait=False):
+    """Collect the results of finished background analyses.
+
+    A job is done only once its analysis is, and its lease is kept until
+    then. If the analysis process was killed, the job is requeued, and only
+    its analysis is run when it is claimed again.
+
+    arguments:
+        pending: list(tuple)          - file name, started path, future and
+                                        lease heartbeat, or None without a
+                                        job queue, of every running
+                                        analysis, the collected ones are
+                                        removed
+        queue: JobQueue | None        - job queue of the workspace
+        sim_calc_list: list(dict())   - list to add the results to
+        wait: bool                    - wait for all analyses to finish
+    """
+    if wait:
+        futures.wait([job[2] for job in pending])
+    for job in [job for job in pending if job[2].done()]:
+        pending.remove(job)
+        file_name, started_path, future, heartbeat = job
+        if heartbeat:
+            heartbeat.stop()
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            print(f'The analysis of {file_name} was stopped: {e}')
+            if queue:
+                queue.requeue(file_name)
+            continue
+        except Exception as e:
+            log_simulation_exception(started_path, e)
+            result = None
+        if result:
+            sim_calc_list.append(result)
+        finish_job(queue, file_name, result)
+
+
+def start(path, lease_time=600, max_attempts=3, analysis_workers=0):
     """
     Take a catalog containing files and folders to work on.
 
+    Jobs are claimed from the job database if the workspace has one and
+    otherwise directly from the unbegun_simulations directory, the most
+    expensive first. With a job database, jobs of dead workers are
+    reclaimed when their leases expire. Under MPI, rank 0 dispatches the
+    jobs to the other ranks.
+
     Args:
         path: The path to the working directory.
+        lease_time: Seconds a job stays leased to a worker without a
+                    heartbeat.
+        max_attempts: Number of times a job is attempted before it is
+                      marked as failed.
+        analysis_workers: Number of background processes running the post
+                          simulation calculations while the next
+                          simulation runs. With 0, they are run before
+                          the next job is claimed. Not used under MPI.
     """
     path = path.rstrip("/")
     rank = str(uuid.uuid1())
 
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    comm = get_mpi_communicator()
+    if comm is not None:
+        if comm.Get_rank() == 0:
+            dispatch_jobs(comm, path, lease_time, max_attempts)
+        else:
+            work_for_dispatcher(comm, path)
+        sys.exit(0)
+
+    queue = open_job_queue(path, lease_time)
+
     # List for storing post simulation calculation results.
     sim_calc_list = []
-
-    while len(os.listdir(path+"/unbegun_simulations")) != 0:
-        list_of_files = os.listdir(path+"/unbegun_simulations")
-        current_file = list_of_files[0]
+    # Estimated costs of the jobs in unbegun_simulations.
+    job_costs = {}
+
+    # The background analyses run at lower priority than the simulations.
+    analysis_pool = None
+    pending_analyses = []
+    if analysis_workers > 0:
+        analysis_pool = futures.ProcessPoolExecutor(
+            analysis_workers, initializer=init_analysis_process)
+
+    while not stop_requested():
+        current_file = claim_job(path, queue, rank, job_costs, max_attempts)
+        # The jobs of our own analyses are running too, they are waited for
+        # before the other workers.
+        if current_file is None and pending_analyses:
+            collect_analyses(pending_analyses, queue, sim_calc_list, wait=True)
+            continue
+        if current_file is None and queue and wait_for_stragglers(queue):
+            continue
+        if current_file is None:
+            break
 
         unbegun_path = f'{path}/unbegun_simulations/{current_file}'
         started_path = f'{path}/started_simulations/{current_file}'
         done_path = f'{path}/done_simulations/{current_file}'
 
+        # If we managed to reserve a file, we run the simulation.
         try:
-            # Reserve a simulation job by moving the simulation specification
-            # from unbegun_simulations to started_simulations. This is repeated
-            # until the simulation directory is empty.
-            #
-            # If another competing worker process steals the file, an exception
-            # will be raised and we try again with another file.
-            os.rename(unbegun_path, started_path)
-        except FileNotFoundError as e:
+            if queue:
+                with LeaseHeartbeat(queue.db_path, current_file, rank,
+                                    lease_time, lease_time / 3) as heartbeat:
+                    res = run_simulation_job(started_path, done_path,
+                                             analysis_pool, heartbeat.lost)
+            else:
+                res = run_simulation_job(started_path, done_path,
+                                         analysis_pool)
+        except SimulationInterrupted as e:
             print(e)
-        except FileExistsError as e:
+            requeue_simulation(started_path, unbegun_path)
+            if queue:
+                queue.requeue(current_file)
+            continue
+        except SimulationAborted as e:
+            # The job belongs to another worker now.
             print(e)
-        else:
-            # If we managed to reserve a file, we run the simulation.
-            if res := run_simulation_job(started_path, done_path):
-                sim_calc_list.append(res)
+            continue
+
+        # A job analysed in the background is finished when its analysis
+        # is, and its lease is renewed until then.
+        if isinstance(res, futures.Future):
+            heartbeat = None
+            if queue:
+                heartbeat = LeaseHeartbeat(queue.db_path, current_file, rank,
+                                           lease_time, lease_time / 3)
+                heartbeat.start()
+            pending_analyses.append((current_file, started_path, res,
+                                     heartbeat))
+            collect_analyses(pending_analyses, queue, sim_calc_list)
+            continue
+        finish_job(queue, current_file, res)
+        if res:
+            sim_calc_list.append(res)
+
+    if analysis_pool:
+        collect_analyses(pending_analyses, queue, sim_calc_list, wait=True)
+        analysis_pool.shutdown()
+
+    if queue:
+        queue.close()
 
     if len(sim_calc_list) > 0:
         post_process_write_temporary(path, rank, sim_calc_list)